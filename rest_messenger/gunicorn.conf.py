@@ -0,0 +1,30 @@
+import multiprocessing
+import os
+
+"""
+Gunicorn configuration of production serving through rest_messenger.asgi:application:
+
+    gunicorn -c gunicorn.conf.py rest_messenger.asgi:application
+
+Every worker is a process with its own event loop. Async views and /api/events/ wait on it without
+holding threads. Django 3.2 runs sync DRF views one at a time on a single thread of the worker
+(thread_sensitive sync_to_async), so a worker serves one sync request at a time and its core idles while
+the request waits for the database. Database connections of a worker are bounded by
+MESSENGER_ASYNC_DB_THREADS for async views and exports plus one for sync views.
+
+Workers share no memory: run events through PostgresBroker and lookup caches through
+MESSENGER_CACHE_LOCATION as docker-compose does, in-memory defaults only suit a single worker.
+"""
+
+bind = f"0.0.0.0:{os.getenv('SERVER_PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+# A worker waits for the database between sync requests, so there are more workers than cores
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# Seconds a worker may stay silent before it is restarted, event streams send keepalives meanwhile
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+# Restart workers after this number of requests to contain leaks, 0 disables restarts
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+accesslog = "-"
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class MessengerConfig(AppConfig):
     name = 'messenger'
+
+    def ready(self):
+        from messenger import signals  # noqa
+        from messenger.db.replicas import check_pins_cache
+        check_pins_cache()
@@ -0,0 +1,139 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+from messenger.utils.broker import get_broker, person_channel
+from messenger.utils.executor import run_db
+from messenger.views.messageView import validate_person
+
+EVENTS_PATH = "/api/events/"
+
+
+async def _send_error(send, status_code: int, detail) -> None:
+    body = json.dumps(detail, cls=JSONEncoder).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [(b"content-type", b"application/json")],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _format_event(event) -> bytes:
+    return f"event: {event['type']}\ndata: {json.dumps(event, cls=JSONEncoder)}\n\n".encode()
+
+
+async def event_stream(scope, receive, send):
+    """
+    Server-Sent Events stream of messages created, edited or deleted for a receiver.
+
+    :param scope: GET /api/events/?user=uuid
+    """
+    query = parse_qs(scope.get("query_string", b"").decode())
+    try:
+        person = await sync_to_async(validate_person)({"user": query.get("user", [""])[0]})
+    except ValidationError as exc:
+        await _send_error(send, exc.status_code, exc.detail)
+        return
+    except APIException as exc:
+        await _send_error(send, exc.status_code, {"detail": exc.detail})
+        return
+
+    subscription = get_broker().subscribe(person_channel(person.id))
+    disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+    next_event = None
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": b": connected\n\n", "more_body": True})
+        while not disconnected.done():
+            next_event = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait(
+                {next_event, disconnected},
+                timeout=settings.MESSENGER_EVENTS_KEEPALIVE,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if next_event not in done:
+                next_event.cancel()
+                if not disconnected.done():
+                    await send({"type": "http.response.body", "body": b": keepalive\n\n", "more_body": True})
+                continue
+            if subscription.overflowed:
+                # Client fell behind, it should catch up through messages/sync/ and reconnect
+                await send({"type": "http.response.body", "body": _format_event({"type": "overflow"})})
+                return
+            await send({"type": "http.response.body", "body": _format_event(next_event.result()), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        # A client gone while an event is awaited leaves it pending
+        if next_event is not None:
+            next_event.cancel()
+        disconnected.cancel()
+        subscription.close()
+
+
+async def _wait_disconnect(receive) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+def with_event_stream(application):
+    """
+    Serve event stream at EVENTS_PATH and pass all other connections to application.
+    """
+    async def router(scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == EVENTS_PATH:
+            await event_stream(scope, receive, send)
+        else:
+            await application(scope, receive, send)
+    return router
+
+
+class MessengerASGIHandler(ASGIHandler):
+    """
+    Django's ASGI handler which iterates streaming responses in a thread of the database pool.
+
+    Django 3.2 iterates streaming content on the event loop, where exports reading rows by a server-side
+    cursor fail with SynchronousOnlyOperation. Here a single thread of run_db's pool runs the whole
+    iteration, so the cursor stays on its connection, and hands chunks over to the loop as they come.
+    An export holds that thread until it ends.
+    """
+    async def send_response(self, response, send):
+        if not response.streaming:
+            await super().send_response(response, send)
+            return
+        headers = [
+            (header.encode("ascii"), value.encode("latin1") if isinstance(value, str) else bytes(value))
+            for header, value in response.items()
+        ]
+        headers += [(b"Set-Cookie", cookie.output(header="").encode("ascii").strip())
+                    for cookie in response.cookies.values()]
+        await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+
+        loop = asyncio.get_running_loop()
+
+        def stream():
+            try:
+                for part in response:
+                    for chunk, _ in self.chunk_bytes(part):
+                        asyncio.run_coroutine_threadsafe(
+                            send({"type": "http.response.body", "body": chunk, "more_body": True}), loop
+                        ).result()
+            finally:
+                response.close()
+
+        await run_db(stream)
+        await send({"type": "http.response.body"})
@@ -0,0 +1,64 @@
+import threading
+from typing import Any, Callable, Dict
+
+from messenger.db.pooled.pool import ConnectionPool, PoolTimeout
+
+"""
+PostgreSQL backend handing out connections from a process-wide pool.
+
+Use "messenger.db.pooled" as ENGINE of a database and configure the pool by POOL key of it:
+{"MIN_SIZE": int, "MAX_SIZE": int, "TIMEOUT": seconds, "RECYCLE": seconds or None, "PRE_PING": bool,
+"PING_IDLE": seconds, "MAX_IDLE": seconds, "RESET": SQL statement or None}. Keep CONN_MAX_AGE at 0, so connections go back to the pool at the end of every request.
+"""
+
+_pools: Dict[tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias: str, settings_dict: Dict[str, Any], connect: Callable[[], Any]) -> ConnectionPool:
+    """
+    Return pool of the database, pools are separate per connection settings,
+    so the test database gets its own one.
+    """
+    key = (alias, settings_dict["NAME"], settings_dict["HOST"], settings_dict["PORT"], settings_dict["USER"])
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                config = settings_dict.get("POOL", {})
+                pool = _pools[key] = ConnectionPool(
+                    connect,
+                    min_size=config.get("MIN_SIZE", 0),
+                    max_size=config.get("MAX_SIZE", 10),
+                    timeout=config.get("TIMEOUT", 10),
+                    recycle=config.get("RECYCLE"),
+                    pre_ping=config.get("PRE_PING", True),
+                    ping_idle=config.get("PING_IDLE", 5),
+                    max_idle=config.get("MAX_IDLE", 600),
+                    reset_sql=config.get("RESET", "DISCARD ALL"),
+                )
+    return pool
+
+
+def pool_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Statistics of pools of this process by database alias.
+    """
+    with _pools_lock:
+        pools = list(_pools.items())
+    stats = {}
+    for (alias, *_), pool in pools:
+        stats[alias] = pool.stats()
+    return stats
+
+
+def close_pools() -> None:
+    """
+    Close idle connections of all pools and forget them.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
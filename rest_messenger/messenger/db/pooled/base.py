@@ -0,0 +1,34 @@
+from django.db.backends.postgresql import base
+from django.db.backends.base.base import NO_DB_ALIAS
+
+from messenger.db.pooled import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL wrapper taking connections from messenger.db.pooled pool instead of opening them,
+    and giving them back instead of closing.
+
+    Django keeps a wrapper per thread and never shares a connection between threads, and the pool
+    hands a connection to a single wrapper at a time, so it is safe under WSGI and ASGI workers alike.
+    Connections to the maintenance database used by tests and migrations aren't pooled.
+    """
+    def _pooled(self) -> bool:
+        return self.alias != NO_DB_ALIAS
+
+    def get_new_connection(self, conn_params):
+        if not self._pooled():
+            return super().get_new_connection(conn_params)
+        # The pool keeps the first connect function, connections don't depend on the wrapper opening them
+        pool = get_pool(self.alias, self.settings_dict,
+                        lambda: base.DatabaseWrapper.get_new_connection(self, conn_params))
+        connection = pool.checkout()
+        # Set by get_new_connection of a fresh connection only, reused ones need it as well
+        self.isolation_level = self.settings_dict["OPTIONS"].get("isolation_level", connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None or not self._pooled():
+            return super()._close()
+        with self.wrap_database_errors:
+            get_pool(self.alias, self.settings_dict, None).checkin(self.connection)
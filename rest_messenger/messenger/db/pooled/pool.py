@@ -0,0 +1,233 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """
+    No connection got free within the checkout timeout. Subclass of the driver error,
+    so Django reports it as django.db.OperationalError.
+    """
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections shared by all threads of a process.
+
+    Idle connections are reused last in, first out, so the busiest ones stay warm
+    and the rest can expire. A connection idle for ping_idle seconds or longer is checked before reuse
+    if pre_ping is set, connections older than recycle seconds are replaced, idle connections above min_size
+    are closed after max_idle seconds. Session state of a returned connection is cleared by reset_sql,
+    so settings, temporary tables and prepared statements of a request don't leak into the next one.
+
+    :param connect: opens a new connection
+    :param min_size: number of connections opened on the first checkout and kept while idle
+    :param max_size: maximal number of connections, checkout waits when all of them are in use
+    :param timeout: seconds checkout waits for a free connection before PoolTimeout
+    :param recycle: maximal age of a connection in seconds, unlimited if None
+    :param pre_ping: whether to check connections by a query before handing them out
+    :param ping_idle: seconds a connection must have been idle to be checked, recently used ones are trusted
+    :param max_idle: seconds after which idle connections above min_size are closed
+    :param reset_sql: statement run in autocommit mode on every returned connection, nothing is run if None
+    """
+    def __init__(self, connect: Callable[[], Any], min_size: int = 0, max_size: int = 10, timeout: float = 10,
+                 recycle: Optional[float] = None, pre_ping: bool = True, ping_idle: float = 5,
+                 max_idle: float = 600, reset_sql: Optional[str] = "DISCARD ALL",
+                 timer: Callable[[], float] = time.monotonic):
+        if max_size < 1 or min_size > max_size:
+            raise ValueError("Pool size must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.ping_idle = ping_idle
+        self.max_idle = max_idle
+        self.reset_sql = reset_sql
+        self._timer = timer
+        self._condition = threading.Condition()
+        # (connection, created at, returned at), most recently returned last
+        self._idle = deque()
+        self._created: Dict[int, float] = {}
+        self._size = 0
+        self._waiting = 0
+        self._filled = False
+        self.stats_counters = {"checkouts": 0, "timeouts": 0, "created": 0, "closed": 0, "failed_pings": 0}
+        self.wait_time = 0.0
+
+    def checkout(self):
+        """
+        Return a usable connection, opening one if the pool isn't full.
+        """
+        if not self._filled:
+            self._fill()
+        started = self._timer()
+        deadline = started + self.timeout
+        while True:
+            connection, returned_at = self._take(deadline)
+            if connection is None:
+                connection = self._open()
+            elif self.pre_ping and self._timer() - returned_at >= self.ping_idle and not self._ping(connection):
+                with self._condition:
+                    self.stats_counters["failed_pings"] += 1
+                    self._discard(connection)
+                continue
+            with self._condition:
+                self.stats_counters["checkouts"] += 1
+                self.wait_time += self._timer() - started
+            return connection
+
+    def checkin(self, connection) -> None:
+        """
+        Give connection back, it is rolled back if left in a transaction, its session state is reset,
+        and it is closed if broken or expired.
+        """
+        reusable = self._reset(connection)
+        with self._condition:
+            if reusable and not self._expired(connection):
+                self._idle.append((connection, self._created.get(id(connection), self._timer()), self._timer()))
+            else:
+                self._discard(connection)
+            self._trim()
+            self._condition.notify()
+
+    def close(self) -> None:
+        """
+        Close idle connections, connections in use are closed when given back.
+        """
+        with self._condition:
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+            self._filled = False
+
+    def stats(self) -> Dict[str, float]:
+        with self._condition:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "waiting": self._waiting,
+                "max_size": self.max_size,
+                "wait_seconds": self.wait_time,
+                **self.stats_counters,
+            }
+
+    def _fill(self) -> None:
+        with self._condition:
+            if self._filled:
+                return
+            self._filled = True
+            missing = max(0, self.min_size - self._size)
+            self._size += missing
+        for _ in range(missing):
+            try:
+                connection = self._open()
+            except psycopg2.Error:
+                logger.exception("Failed to open connection while filling the pool")
+                continue
+            self.checkin(connection)
+
+    def _take(self, deadline: float):
+        """
+        Pop an idle connection, or reserve room for a new one and return None, waiting until deadline.
+
+        :return: the connection and the time it was returned at
+        """
+        with self._condition:
+            self._waiting += 1
+            try:
+                while True:
+                    while self._idle:
+                        connection, _, returned_at = self._idle.pop()
+                        if not self._expired(connection):
+                            return connection, returned_at
+                        self._discard(connection)
+                    if self._size < self.max_size:
+                        self._size += 1
+                        return None, None
+                    remaining = deadline - self._timer()
+                    if remaining <= 0:
+                        self.stats_counters["timeouts"] += 1
+                        raise PoolTimeout(f"No free connection within {self.timeout}s, "
+                                          f"all {self.max_size} connections are in use")
+                    self._condition.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+    def _open(self):
+        try:
+            connection = self.connect()
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._created[id(connection)] = self._timer()
+            self.stats_counters["created"] += 1
+        return connection
+
+    def _discard(self, connection) -> None:
+        # Called with the condition held
+        self._created.pop(id(connection), None)
+        self._size -= 1
+        self.stats_counters["closed"] += 1
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def _trim(self) -> None:
+        # Called with the condition held, oldest returned connections are first
+        now = self._timer()
+        while len(self._idle) > self.min_size and now - self._idle[0][2] >= self.max_idle:
+            self._discard(self._idle.popleft()[0])
+
+    def _expired(self, connection) -> bool:
+        if self.recycle is None:
+            return False
+        return self._timer() - self._created.get(id(connection), self._timer()) >= self.recycle
+
+    @staticmethod
+    def _ping(connection) -> bool:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            if not connection.autocommit:
+                connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _reset(self, connection) -> bool:
+        """
+        Bring connection back to idle state, False if it is unusable.
+        """
+        if connection.closed:
+            return False
+        try:
+            status = connection.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                return False
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            if self.reset_sql is not None:
+                # DISCARD ALL can't run inside a transaction block
+                autocommit = connection.autocommit
+                connection.autocommit = True
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(self.reset_sql)
+                finally:
+                    connection.autocommit = autocommit
+        except psycopg2.Error:
+            return False
+        return True
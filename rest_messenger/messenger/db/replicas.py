@@ -0,0 +1,259 @@
+import contextvars
+import logging
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from messenger.utils.cache import get_lookup_cache
+
+"""
+Routing of read-only endpoints to replicas of the default database.
+
+Reads go to a replica only within use_replicas(), everything else, writes and reads done by
+write endpoints included, stays on the primary. A person who has just written is pinned to the
+primary while their entry of "primary_pins" lookup cache lives, so they always read their own writes.
+Keep its ttl above MESSENGER_REPLICAS MAX_LAG, then replicas have caught up once the pin expires.
+"""
+
+logger = logging.getLogger(__name__)
+
+PINS_CACHE = "primary_pins"
+
+# Replication lag in seconds, 0 on a primary and on a replica which has replayed everything it received
+LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+# Database reads of the current request go to
+_read_alias: contextvars.ContextVar = contextvars.ContextVar("messenger_read_alias", default=None)
+
+
+def measure_lag(alias: str) -> float:
+    connection = connections[alias]
+    if connection.vendor != "postgresql":
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(LAG_SQL)
+        return float(cursor.fetchone()[0])
+
+
+class ReplicaSet:
+    """
+    Replicas of the primary with their replication lag measured at most once per check_interval.
+
+    Lags are measured by a background thread, requests meanwhile use the last measurement, so a slow
+    or unreachable replica doesn't delay them. A replica may stop replaying right after it is measured,
+    so the age of the measurement counts as lag. Replicas lagging more than max_lag seconds or failing
+    the check are left out until the next check, reads fall back to the primary when none is left,
+    which is also the case until the first measurement completes.
+
+    :param aliases: aliases of replicas in DATABASES
+    :param max_lag: maximal lag in seconds of a replica serving reads
+    :param check_interval: seconds between measurements of lag
+    :param background: measure in a background thread, in the calling one otherwise
+    """
+    def __init__(self, aliases: Iterable[str], max_lag: float = 5, check_interval: float = 1,
+                 timer: Callable[[], float] = time.monotonic, rng: random.Random = None, background: bool = True):
+        self.aliases = list(aliases)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.background = background
+        self._timer = timer
+        self._rng = rng or random.Random()
+        self._lags: Dict[str, Optional[float]] = {}
+        self._measured_at = None
+        self._checked_at = None
+        self._measuring = False
+        self._lock = threading.Lock()
+
+    def choose(self) -> str:
+        """
+        Return random healthy replica, or the primary if there is none.
+        """
+        healthy = self.healthy()
+        return self._rng.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+
+    def healthy(self) -> List[str]:
+        self.refresh()
+        now = self._timer()
+        return [alias for alias in self.aliases if self._is_healthy(alias, now)]
+
+    def stats(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        Last measured lag of replicas, None if the check failed.
+        """
+        now = self._timer()
+        return {alias: {"lag_seconds": self._lags.get(alias), "healthy": int(self._is_healthy(alias, now))}
+                for alias in self.aliases}
+
+    def refresh(self, wait: bool = False) -> None:
+        """
+        Start measuring lags if check_interval has passed since the last measurement started.
+
+        :param wait: measure in the calling thread even if background is set
+        """
+        now = self._timer()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return
+            # A measurement stuck on an unreachable replica holds back the next one for max_lag more seconds
+            if self._measuring and now - self._checked_at < self.check_interval + self.max_lag:
+                return
+            self._checked_at = now
+            self._measuring = True
+        if self.background and not wait:
+            threading.Thread(target=self._measure, args=(now, True), name="messenger-replica-lag",
+                             daemon=True).start()
+        else:
+            self._measure(now)
+
+    def _is_healthy(self, alias: str, now: float) -> bool:
+        lag = self._lags.get(alias)
+        return lag is not None and lag + max(now - self._measured_at, 0) <= self.max_lag
+
+    def _measure(self, started: float, close: bool = False) -> None:
+        lags = {}
+        try:
+            for alias in self.aliases:
+                try:
+                    lags[alias] = measure_lag(alias)
+                except DatabaseError:
+                    logger.warning("Replica %s is unavailable", alias, exc_info=True)
+                    lags[alias] = None
+                finally:
+                    # Connections of the thread would never be reused
+                    if close:
+                        connections[alias].close()
+        finally:
+            with self._lock:
+                # A measurement which has been stuck doesn't replace a later one
+                if self._measured_at is None or started >= self._measured_at:
+                    self._lags, self._measured_at = lags, started
+                if started == self._checked_at:
+                    self._measuring = False
+
+
+_replicas: Optional[ReplicaSet] = None
+_replicas_lock = threading.Lock()
+
+
+def get_replicas() -> ReplicaSet:
+    """
+    Return process-wide set of replicas configured by MESSENGER_REPLICAS.
+    """
+    global _replicas
+    if _replicas is None:
+        with _replicas_lock:
+            if _replicas is None:
+                config = settings.MESSENGER_REPLICAS
+                _replicas = ReplicaSet(config["ALIASES"], max_lag=config["MAX_LAG"],
+                                       check_interval=config["CHECK_INTERVAL"])
+    return _replicas
+
+
+def reset_replicas() -> None:
+    global _replicas
+    with _replicas_lock:
+        _replicas = None
+
+
+def check_pins_cache() -> None:
+    """
+    Refuse to run replicas with pins which workers don't share, a person would read from a replica
+    of a worker which doesn't know about their write.
+
+    :raise ImproperlyConfigured: if there are replicas and "primary_pins" lookup cache isn't shared
+    """
+    if settings.MESSENGER_REPLICAS["ALIASES"] and not get_lookup_cache(PINS_CACHE).shared:
+        raise ImproperlyConfigured(
+            f'"{PINS_CACHE}" lookup cache must be shared by workers when there are replicas, '
+            "set MESSENGER_CACHE_LOCATION"
+        )
+
+
+def _pin_key(person_id) -> Optional[str]:
+    try:
+        return str(uuid.UUID(str(person_id)))
+    except ValueError:
+        return None
+
+
+def pin_to_primary(*person_ids) -> None:
+    """
+    Send reads of given persons to the primary for a while, call it on every write of a person.
+    """
+    if not get_replicas().aliases:
+        return
+    cache = get_lookup_cache(PINS_CACHE)
+    for person_id in person_ids:
+        key = _pin_key(person_id)
+        if key is not None:
+            cache.set(key, True)
+
+
+def is_pinned(person_id) -> bool:
+    key = _pin_key(person_id)
+    return key is not None and get_lookup_cache(PINS_CACHE).get(key) is not None
+
+
+@contextmanager
+def use_replicas(person_id=None):
+    """
+    Let reads within the block go to a replica, unless the person is pinned to the primary.
+    All reads of the block go to the same database.
+
+    :param person_id: uuid of the person reading, not validated
+    :return: alias of the database serving reads
+    """
+    replicas = get_replicas()
+    if not replicas.aliases or is_pinned(person_id):
+        alias = DEFAULT_DB_ALIAS
+    else:
+        alias = replicas.choose()
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Route reads within use_replicas() to the chosen replica, the rest to the primary.
+    """
+    def db_for_read(self, model, **hints):  # noqa
+        alias = _read_alias.get()
+        # Reads of an open transaction must see its writes
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):  # noqa
+        # Objects read from replicas are written to the primary, ones of other databases to their own
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db is not None and \
+                instance._state.db not in get_replicas().aliases:
+            return None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):  # noqa
+        databases = {DEFAULT_DB_ALIAS, *get_replicas().aliases}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):  # noqa
+        # Replicas get their schema by replication
+        if db in get_replicas().aliases:
+            return False
+        return None
@@ -0,0 +1,295 @@
+import contextvars
+import functools
+import hashlib
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+"""
+Horizontal sharding of messages by person.
+
+Persons are hashed into VIRTUAL_SHARDS buckets, and buckets are assigned to databases of
+MESSENGER_SHARDS ALIASES by ShardBucket rows of the default database, a bucket without one lives
+on the first alias, so adding a shard moves nothing until `manage.py rebalance_shards` moves buckets to it.
+
+A message is stored on the shard of its receiver and copied to the shard of its
+sender, so received and sent messages of a person are read from their shard alone. Conversations are
+kept by the shard of their owner. Persons are replicated to every shard, which keeps foreign keys valid.
+Queries go to a shard within use_shard(), everything else stays on the default database.
+Groups span shards of their members, so they and their messages stay on the default database too.
+"""
+
+# Messenger models kept by the default database only
+UNSHARDED_MODELS = {"shardbucket", "group", "groupmember", "groupmessage"}
+
+# Shard queries of messenger models of the current request go to
+_shard: contextvars.ContextVar = contextvars.ContextVar("messenger_shard", default=None)
+
+
+def bucket_of(person_id, buckets: int) -> Optional[int]:
+    """
+    Stable bucket of a person, None if person_id isn't uuid.
+    """
+    try:
+        key = uuid.UUID(str(person_id)).bytes
+    except ValueError:
+        return None
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big") % buckets
+
+
+def fill_buckets(persons, buckets: int, batch_size: int = 1000) -> None:
+    """
+    Store buckets of persons saved without one, e.g. by bulk_create, a batch per transaction.
+
+    :param persons: queryset of persons of a single database
+    """
+    while True:
+        with transaction.atomic(using=persons.db):
+            batch = list(persons.filter(bucket__isnull=True).order_by("id").only("id")[:batch_size])
+            for person in batch:
+                person.bucket = bucket_of(person.id, buckets)
+            persons.bulk_update(batch, ["bucket"])
+        if len(batch) < batch_size:
+            return
+
+
+def load_assignments() -> Dict[int, Tuple[str, bool]]:
+    # Imported here, the router is built before models are ready
+    from messenger.models.shard import ShardBucket
+    return {bucket: (alias, frozen) for bucket, alias, frozen in
+            ShardBucket.objects.using(DEFAULT_DB_ALIAS).values_list("bucket", "alias", "frozen")}
+
+
+class ShardFrozen(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Messages of the person are being moved to another shard, retry later"
+    default_code = "shard_frozen"
+    # Rendered as Retry-After header
+    wait = 1
+
+
+class ShardMap:
+    """
+    Assignment of buckets to shards, reloaded from the default database at most once per refresh seconds.
+
+    :param aliases: aliases of shards in DATABASES, the first one holds unassigned buckets
+    :param buckets: number of buckets persons are hashed into, never change it once data is sharded
+    :param refresh: seconds assignments are cached by the process
+    :param load: returns {bucket: (alias, frozen)}
+    """
+    def __init__(self, aliases: Iterable[str], buckets: int = 1024, refresh: float = 5,
+                 load: Callable[[], Dict[int, Tuple[str, bool]]] = load_assignments,
+                 timer: Callable[[], float] = time.monotonic):
+        self.aliases = list(aliases)
+        self.buckets = buckets
+        self.refresh = refresh
+        self._load = load
+        self._timer = timer
+        self._assignments: Dict[int, Tuple[str, bool]] = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.aliases) > 1
+
+    def assignments(self) -> Dict[int, Tuple[str, bool]]:
+        now = self._timer()
+        with self._lock:
+            if self._loaded_at is None or now - self._loaded_at >= self.refresh:
+                self._assignments = self._load()
+                self._loaded_at = now
+            return self._assignments
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+
+    def locate(self, person_id) -> Tuple[Optional[str], bool]:
+        """
+        :return: alias of the shard of the person and whether its bucket is frozen, (None, False) for invalid id
+        """
+        bucket = bucket_of(person_id, self.buckets)
+        if bucket is None:
+            return None, False
+        return self.locate_bucket(bucket)
+
+    def locate_bucket(self, bucket: int) -> Tuple[str, bool]:
+        return self.assignments().get(bucket, (self.aliases[0], False))
+
+    def shard_of(self, person_id) -> Optional[str]:
+        return self.locate(person_id)[0]
+
+    def layout(self) -> Dict[int, str]:
+        """
+        Alias of the shard of every bucket.
+        """
+        return {bucket: self.locate_bucket(bucket)[0] for bucket in range(self.buckets)}
+
+
+def plan_moves(layout: Dict[int, str], aliases: List[str]) -> List[Tuple[int, str, str]]:
+    """
+    Plan moves of buckets which leave every shard of aliases with the same number of buckets, give or take one,
+    moving as few buckets as possible. Buckets of shards missing from aliases are moved off them.
+
+    :param layout: alias of the shard of every bucket
+    :return: (bucket, source alias, target alias) of buckets to move
+    """
+    owned = {alias: sorted(bucket for bucket, owner in layout.items() if owner == alias) for alias in aliases}
+    surplus = sorted((bucket, owner) for bucket, owner in layout.items() if owner not in owned)
+    base, rest = divmod(len(layout), len(aliases))
+    quotas = {alias: base + (1 if index < rest else 0) for index, alias in enumerate(aliases)}
+    for alias in aliases:
+        while len(owned[alias]) > quotas[alias]:
+            surplus.append((owned[alias].pop(), alias))
+
+    moves = []
+    for alias in aliases:
+        while len(owned[alias]) < quotas[alias]:
+            bucket, source = surplus.pop(0)
+            owned[alias].append(bucket)
+            moves.append((bucket, source, alias))
+    return moves
+
+
+_shard_map: Optional[ShardMap] = None
+_shard_map_lock = threading.Lock()
+
+
+def get_shard_map() -> ShardMap:
+    """
+    Return process-wide shard map configured by MESSENGER_SHARDS.
+    """
+    global _shard_map
+    if _shard_map is None:
+        with _shard_map_lock:
+            if _shard_map is None:
+                config = settings.MESSENGER_SHARDS
+                _shard_map = ShardMap(config["ALIASES"], buckets=config["VIRTUAL_SHARDS"],
+                                      refresh=config["REFRESH"])
+    return _shard_map
+
+
+def reset_shard_map() -> None:
+    global _shard_map
+    with _shard_map_lock:
+        _shard_map = None
+
+
+def shard_aliases() -> List[str]:
+    """
+    Aliases of shards, empty if sharding is disabled.
+    """
+    shard_map = get_shard_map()
+    return shard_map.aliases if shard_map.enabled else []
+
+
+def person_shard(person_id, write: bool = False) -> Optional[str]:
+    """
+    Alias of the shard of the person, None if sharding is disabled or person_id isn't uuid.
+
+    :param write: the caller is about to write messages of the person
+    :raise ShardFrozen: on write while the person is moved to another shard
+    """
+    shard_map = get_shard_map()
+    if not shard_map.enabled:
+        return None
+    alias, frozen = shard_map.locate(person_id)
+    if write and frozen:
+        raise ShardFrozen()
+    return alias
+
+
+def message_shards(sender_id, receiver_id, write: bool = False) -> List[str]:
+    """
+    Aliases of shards keeping a message, the shard of its receiver goes first. Empty if sharding is disabled.
+
+    :raise ShardFrozen: on write while the sender or the receiver is moved to another shard
+    """
+    aliases = []
+    for person_id in (receiver_id, sender_id):
+        if person_id is None:
+            continue
+        alias = person_shard(person_id, write)
+        if alias is not None and alias not in aliases:
+            aliases.append(alias)
+    return aliases
+
+
+def split_by_shard(messages) -> Dict[str, Tuple[list, set]]:
+    """
+    Group messages by shards keeping them.
+
+    :return: {alias: (messages, ids of persons whose conversations the shard keeps)} in order of
+        the first appearance, a message appears on the shard of its receiver before the one of its sender
+    :raise ShardFrozen: if a sender or a receiver is moved to another shard
+    """
+    shards = defaultdict(lambda: ([], set()))
+    for message in messages:
+        for alias in message_shards(message.sender_id, message.receiver_id, write=True):
+            shards[alias][0].append(message)
+        for person_id in (message.sender_id, message.receiver_id):
+            if person_id is not None:
+                shards[person_shard(person_id, write=True)][1].add(person_id)
+    return dict(shards)
+
+
+def current_shard() -> Optional[str]:
+    return _shard.get()
+
+
+@contextmanager
+def use_shard(alias: Optional[str]):
+    """
+    Send queries of messenger models within the block to the shard, nothing changes if alias is None.
+    """
+    token = _shard.set(alias)
+    try:
+        yield alias
+    finally:
+        _shard.reset(token)
+
+
+def on_user_shard(view):
+    """
+    Run view of the person with {"user": "uuid"} in body against their shard.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with use_shard(person_shard(request.data.get("user"))):
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ShardRouter:
+    """
+    Route queries of messenger models within use_shard() to the shard, leaves the rest to the next router.
+    """
+    def db_for_read(self, model, **hints):  # noqa
+        if model._meta.app_label != "messenger" or model._meta.model_name in UNSHARDED_MODELS:
+            return None
+        return _shard.get()
+
+    def db_for_write(self, model, **hints):  # noqa
+        return self.db_for_read(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):  # noqa
+        # Persons are replicated, a message and its persons of the same shard are related
+        if obj1._state.db == obj2._state.db:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):  # noqa
+        # Shard map lives in the default database only. Groups do too, but shards keep their empty tables,
+        # which deletion of replicated persons cascades to
+        if app_label == "messenger" and model_name == "shardbucket":
+            return db == DEFAULT_DB_ALIAS
+        return None
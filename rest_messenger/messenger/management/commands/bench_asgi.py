@@ -0,0 +1,108 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+
+from messenger.management.commands.run_benchmarks import percentile
+from messenger.models import Message
+
+# Sync path, async path, method and whether the person goes to the path or to the body
+ENDPOINTS = {
+    "ping": ("/api/ping/", "/api/async/ping/", "get", None),
+    "person": ("/api/users/{person}/", "/api/async/users/{person}/", "get", "path"),
+    "received": ("/api/messages/received/", "/api/async/messages/received/", "post", "body"),
+    "sent": ("/api/messages/sent/", "/api/async/messages/sent/", "post", "body"),
+}
+
+
+class Command(BaseCommand):
+    help = "Compare throughput of an endpoint served by sync views through WSGI handler with a fixed number " \
+           "of threads, like a sync worker, against its async version through ASGI handler, " \
+           "under many concurrent clients. Run against a database filled by seed_messages."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="received", help="Endpoint to request")
+        parser.add_argument("--clients", type=int, default=200, help="Number of concurrent clients")
+        parser.add_argument("--requests", type=int, default=2000, help="Number of requests per path")
+        parser.add_argument("--wsgi-threads", type=int, default=8, help="Number of threads serving WSGI requests")
+
+    def handle(self, *args, **options):
+        person = Message.objects.filter(receiver__isnull=False, sender__isnull=False) \
+            .values_list("receiver_id", flat=True).first()
+        if person is None:
+            raise CommandError("Database has no messages, run seed_messages first")
+        sync_path, async_path, method, person_in = ENDPOINTS[options["endpoint"]]
+        sync_path, async_path = sync_path.format(person=person), async_path.format(person=person)
+        body = {"user": str(person)} if person_in == "body" else None
+
+        wsgi_pool = ThreadPoolExecutor(options["wsgi_threads"], thread_name_prefix="bench-wsgi")
+        local = threading.local()
+
+        def wsgi_request():
+            client = getattr(local, "client", None)
+            if client is None:
+                client = local.client = Client()
+            return getattr(client, method)(sync_path, body, content_type="application/json") if body \
+                else getattr(client, method)(sync_path)
+
+        async def wsgi_call():
+            return await asyncio.get_running_loop().run_in_executor(wsgi_pool, wsgi_request)
+
+        async_client = AsyncClient()
+
+        async def asgi_call():
+            return await getattr(async_client, method)(async_path, body, content_type="application/json") if body \
+                else await getattr(async_client, method)(async_path)
+
+        # Async test client always requests "testserver" host
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+                results = {
+                    "endpoint": options["endpoint"],
+                    "clients": options["clients"],
+                    "wsgi": asyncio.run(self.drive(wsgi_call, options["clients"], options["requests"])),
+                    "asgi": asyncio.run(self.drive(asgi_call, options["clients"], options["requests"])),
+                }
+        finally:
+            wsgi_pool.shutdown()
+            connections.close_all()
+        results["speedup"] = results["asgi"]["throughput"] / results["wsgi"]["throughput"]
+        self.stdout.write(json.dumps(results, indent=2))
+
+    @staticmethod
+    async def drive(call, clients: int, requests: int):
+        """
+        Run clients each doing requests one after another until the total number is reached.
+        """
+        remaining = requests
+        latencies = []
+        errors = 0
+
+        async def client():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                response = await call()
+                latencies.append(time.perf_counter() - started)
+                errors += response.status_code >= 400
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "seconds": elapsed,
+            "throughput": len(latencies) / elapsed,
+            "latency_ms": {name: percentile(latencies, value) * 1000
+                           for name, value in (("p50", 50), ("p95", 95), ("p99", 99))},
+        }
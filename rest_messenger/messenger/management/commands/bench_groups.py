@@ -0,0 +1,102 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from messenger.management.commands.run_benchmarks import percentile
+from messenger.models import Group, GroupMember, GroupMessage, Message, Person
+from messenger.services.groupService import check_member, send_group_message
+from messenger.services.messageService import send_messages
+from messenger.utils.pagination import KeysetPaginator
+
+
+class Command(BaseCommand):
+    help = "Compare sending to a group stored once and read by every member (fan-out on read) against " \
+           "a message per receiver sent like POST /api/messages/bulk/ does (fan-out on write): latency " \
+           "of sending and of reading the first page by a member, rows and bytes stored. Rows are inserted " \
+           "into the default database and rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Numbers of members")
+        parser.add_argument("--messages", type=int, default=20, help="Number of messages sent per size and mode")
+        parser.add_argument("--reads", type=int, default=50, help="Number of first pages read per size and mode")
+        parser.add_argument("--text-length", type=int, default=100, help="Length of text of a message")
+
+    def handle(self, *args, **options):
+        text = ("Bench group message " * (options["text_length"] // 20 + 1))[:options["text_length"]]
+        results = {"database": connections[DEFAULT_DB_ALIAS].vendor, "text_length": len(text), "sizes": {}}
+        for size in options["sizes"]:
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                results["sizes"][str(size)] = self.run(size, text, options)
+                transaction.set_rollback(True, using=DEFAULT_DB_ALIAS)
+        self.stdout.write(json.dumps(results, indent=2))
+
+    @staticmethod
+    def table_size(model):
+        connection = connections[DEFAULT_DB_ALIAS]
+        if connection.vendor != "postgresql":
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_total_relation_size(%s)", [model._meta.db_table])
+            return cursor.fetchone()[0]
+
+    def run(self, size: int, text: str, options):
+        sender = Person.objects.create(name="Bench sender")
+        members = Person.objects.bulk_create([Person(name=f"Bench member {index}") for index in range(size)])
+        group = Group.objects.create(name="Bench group")
+        GroupMember.objects.bulk_create([GroupMember(group=group, person=person) for person in [sender, *members]])
+        readers = [members[index % size] for index in range(options["reads"])]
+
+        def fan_out_on_write():
+            send_messages([Message(sender=sender, receiver=member, text=text) for member in members])
+
+        def read_received(member):
+            KeysetPaginator(descending=True).paginate(Message.objects.filter(receiver_id=member.id))
+
+        def fan_out_on_read():
+            send_group_message(group.id, sender.id, text)
+
+        def read_group(member):
+            check_member(group.id, member.id)
+            KeysetPaginator(descending=True).paginate(GroupMessage.objects.filter(group_id=group.id))
+
+        result = {
+            "fan_out_on_write": self.measure(Message, fan_out_on_write, read_received, readers, options),
+            "fan_out_on_read": self.measure(GroupMessage, fan_out_on_read, read_group, readers, options),
+        }
+        result["rows_ratio"] = result["fan_out_on_write"]["rows"] / max(result["fan_out_on_read"]["rows"], 1)
+        result["send_speedup"] = result["fan_out_on_write"]["send_ms"]["p50"] / \
+            max(result["fan_out_on_read"]["send_ms"]["p50"], 1e-9)
+        return result
+
+    def measure(self, model, send, read, readers, options):
+        """
+        Send messages one by one, then read first pages of readers.
+
+        :return: latency percentiles of both, rows and bytes of texts stored, and growth of the table
+            with its indexes in bytes, None unless PostgreSQL
+        """
+        size = self.table_size(model)
+        rows = model.objects.count()
+        send_latencies = []
+        for _ in range(options["messages"]):
+            started = time.perf_counter()
+            send()
+            send_latencies.append(time.perf_counter() - started)
+        rows = model.objects.count() - rows
+
+        read_latencies = []
+        for reader in readers:
+            started = time.perf_counter()
+            read(reader)
+            read_latencies.append(time.perf_counter() - started)
+        send_latencies.sort()
+        read_latencies.sort()
+        return {
+            "rows": rows,
+            "text_bytes": rows * options["text_length"],
+            "table_growth_bytes": None if size is None else self.table_size(model) - size,
+            "send_ms": {name: percentile(send_latencies, value) * 1000 for name, value in (("p50", 50), ("p95", 95))},
+            "read_ms": {name: percentile(read_latencies, value) * 1000 for name, value in (("p50", 50), ("p95", 95))},
+        }
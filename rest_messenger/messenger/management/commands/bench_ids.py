@@ -0,0 +1,71 @@
+import json
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from messenger.models import Message, Person
+from messenger.utils.ids import uuid7
+
+GENERATORS = {
+    "uuid4": uuid.uuid4,
+    "uuid7": uuid7,
+}
+
+
+class Command(BaseCommand):
+    help = "Compare insert throughput of messages with random uuid4 and time-ordered uuid7 primary keys. " \
+           "Rows are inserted into the messages table and rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100000, help="Number of messages inserted per run")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Number of messages inserted by a query")
+        parser.add_argument("--repeat", type=int, default=3, help="Number of runs, the best one is reported")
+        parser.add_argument("--database", default="default", help="Alias of the database")
+
+    def handle(self, *args, **options):
+        results = {}
+        for name, generator in GENERATORS.items():
+            runs = [self.run(generator, options) for _ in range(options["repeat"])]
+            seconds, index_growth = min(runs, key=lambda run: run[0])
+            results[name] = {
+                "seconds": seconds,
+                "messages_per_second": options["count"] / seconds,
+                "primary_key_growth_bytes": index_growth,
+            }
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def index_size(self, database: str):
+        connection = connections[database]
+        if connection.vendor != "postgresql":
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_relation_size(%s)", [f"{Message._meta.db_table}_pkey"])
+            return cursor.fetchone()[0]
+
+    def run(self, generator, options):
+        """
+        Insert messages with ids of the generator in a transaction which is rolled back.
+
+        :return: seconds spent on inserts and growth of primary key index in bytes, None unless PostgreSQL
+        """
+        database = options["database"]
+        with transaction.atomic(using=database):
+            sender = Person.objects.using(database).create(name="Bench sender")
+            receiver = Person.objects.using(database).create(name="Bench receiver")
+            size = self.index_size(database)
+
+            elapsed = 0.0
+            for start in range(0, options["count"], options["batch_size"]):
+                messages = [
+                    Message(id=generator(), sender=sender, receiver=receiver, text=f"Message number {i}")
+                    for i in range(start, min(start + options["batch_size"], options["count"]))
+                ]
+                started = time.perf_counter()
+                Message.objects.using(database).bulk_create(messages)
+                elapsed += time.perf_counter() - started
+
+            growth = None if size is None else self.index_size(database) - size
+            transaction.set_rollback(True, using=database)
+        return elapsed, growth
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import random
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import AsyncClient, override_settings
+
+from messenger.management.commands.bench_asgi import Command as BenchAsgiCommand
+from messenger.models import Person
+from messenger.services.ingestService import get_ingest_queue
+
+# Path and whether messages go through the ingest queue
+MODES = {
+    "direct": ("/api/messages/", False),
+    "ingest": ("/api/messages/", True),
+    "ingest_async": ("/api/async/messages/", True),
+}
+
+
+class Command(BaseCommand):
+    help = "Compare commits and messages per second of sending messages through the ASGI handler one " \
+           "transaction per request, like POST /api/messages/ does by default, against group commit of " \
+           "the ingest queue by POST /api/messages/ and POST /api/async/messages/, under concurrent senders. " \
+           "Messages are inserted into the database, run it against a benchmark database filled by seed_messages."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=5000, help="Number of messages sent per mode")
+        parser.add_argument("--senders", type=int, default=50, help="Number of concurrent senders")
+        parser.add_argument("--batch-size", type=int, default=500, help="Maximal number of messages in a batch")
+        parser.add_argument("--max-delay-ms", type=float, default=5, help="Milliseconds a batch is collected")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of random choices")
+
+    def handle(self, *args, **options):
+        persons = [str(person_id) for person_id in Person.objects.values_list("id", flat=True)[:1000]]
+        if len(persons) < 2:
+            raise CommandError("Database has no persons, run seed_messages first")
+        rng = random.Random(options["seed"])
+        async_client = AsyncClient()
+
+        results = {"senders": options["senders"]}
+        try:
+            # Async test client always requests "testserver" host
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+                for mode, (path, ingest) in MODES.items():
+                    async def send(path=path):
+                        sender, receiver = rng.sample(persons, 2)
+                        return await async_client.post(path, {"sender": sender, "receiver": receiver,
+                                                              "text": "Bench message"},
+                                                       content_type="application/json")
+
+                    with override_settings(MESSENGER_INGEST={
+                        "ENABLED": ingest,
+                        "QUEUE_SIZE": options["messages"],
+                        "BATCH_SIZE": options["batch_size"],
+                        "MAX_DELAY_MS": options["max_delay_ms"],
+                        "TIMEOUT": settings.MESSENGER_INGEST["TIMEOUT"],
+                    }):
+                        results[mode] = asyncio.run(BenchAsgiCommand.drive(send, options["senders"],
+                                                                           options["messages"]))
+                        results[mode]["commits"] = get_ingest_queue().batches if ingest \
+                            else results[mode]["requests"] - results[mode]["errors"]
+        finally:
+            connections.close_all()
+
+        for mode in MODES:
+            results[mode]["commits_per_second"] = results[mode]["commits"] / results[mode]["seconds"]
+            results[mode]["messages_per_commit"] = (results[mode]["requests"] - results[mode]["errors"]) / \
+                max(results[mode]["commits"], 1)
+            results[mode]["speedup"] = results[mode]["throughput"] / results["direct"]["throughput"]
+        results["database"] = connection.vendor
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,95 @@
+import json
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from messenger.models import Message
+from messenger.serializers.fastMessageSerializers import FastMessageSerializer
+from messenger.serializers.messageSerializers import MessageSerializer
+
+
+def make_messages(count: int, persons: int = 10):
+    """
+    Build unsaved messages between a few persons, so no database is needed.
+    """
+    person_ids = [uuid.uuid4() for _ in range(persons)]
+    now = timezone.now()
+    messages = []
+    for i in range(count):
+        created_at = now - timedelta(seconds=count - i)
+        messages.append(Message(
+            id=uuid.uuid4(),
+            text=f"Message number {i}",
+            sender_id=person_ids[i % persons],
+            receiver_id=person_ids[(i + 1) % persons],
+            created_at=created_at,
+            updated_at=created_at,
+        ))
+    return messages
+
+
+def as_rows(messages):
+    return [(m.id, m.text, m.sender_id, m.receiver_id, m.created_at, m.updated_at) for m in messages]
+
+
+def model_serializer(messages, rows):  # noqa
+    return JSONRenderer().render(MessageSerializer(messages, many=True).data)
+
+
+def fast_serializer(messages, rows):  # noqa
+    return JSONRenderer().render(FastMessageSerializer().to_list(rows))
+
+
+def fast_json(messages, rows):  # noqa
+    serializer = FastMessageSerializer()
+    return ("[" + ",".join(serializer.to_json(row) for row in rows) + "]").encode()
+
+
+SERIALIZERS = {
+    "model_serializer": model_serializer,
+    "fast_serializer": fast_serializer,
+    "fast_json": fast_json,
+}
+
+
+def measure(function, messages, rows, repeat: int) -> float:
+    """
+    Best time of a call in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(messages, rows)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+class Command(BaseCommand):
+    help = "Compare serialization time of message lists by MessageSerializer and FastMessageSerializer"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000],
+                            help="Numbers of messages in a list")
+        parser.add_argument("--repeat", type=int, default=5, help="Number of runs, the best one is reported")
+
+    def handle(self, *args, **options):
+        results = []
+        for size in options["sizes"]:
+            messages = make_messages(size)
+            rows = as_rows(messages)
+            outputs = {name: json.loads(function(messages, rows)) for name, function in SERIALIZERS.items()}
+            if not all(output == outputs["model_serializer"] for output in outputs.values()):
+                raise AssertionError("Serializers produce different output")
+
+            timings = {name: measure(function, messages, rows, options["repeat"])
+                       for name, function in SERIALIZERS.items()}
+            results.append({
+                "size": size,
+                "seconds": timings,
+                "speedup": {name: timings["model_serializer"] / seconds for name, seconds in timings.items()},
+            })
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,164 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from messenger.models import Message
+from messenger.utils.partitions import partition_name, partition_month, create_partition_sql, plan_maintenance, \
+    months_between, add_months, default_partition_name, is_before_row_trigger, move_trigger_sql, \
+    PARTITIONED_BEFORE_TRIGGERS_VERSION
+
+
+class Command(BaseCommand):
+    help = "Maintain monthly partitions of messages on PostgreSQL: create future ones and detach expired ones. " \
+           "Run with --convert once to turn the messages table into a partitioned one."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--convert", action="store_true",
+                            help="Convert unpartitioned messages table, rows are copied under an exclusive lock")
+        parser.add_argument("--dry-run", action="store_true", help="Print SQL instead of executing it")
+        parser.add_argument("--database", default="default", help="Alias of the database")
+
+    def handle(self, *args, **options):
+        self.connection = connections[options["database"]]
+        if self.connection.vendor != "postgresql":
+            raise CommandError("Partitioning of messages requires PostgreSQL")
+        self.dry_run = options["dry_run"]
+        self.table = Message._meta.db_table
+        config = settings.MESSENGER_PARTITIONS
+
+        with transaction.atomic(using=options["database"]):
+            partitioned = self.is_partitioned()
+            if options["convert"]:
+                if partitioned:
+                    raise CommandError(f"{self.table} is already partitioned")
+                self.convert(config["PREMAKE_MONTHS"])
+            elif not partitioned:
+                raise CommandError(f"{self.table} is not partitioned, run with --convert first")
+            else:
+                self.maintain(config["PREMAKE_MONTHS"], config["RETENTION_MONTHS"], config["ARCHIVE"])
+
+    def execute_sql(self, sql: str, params=None) -> None:
+        if self.dry_run:
+            self.stdout.write(sql + ";")
+            return
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def fetch(self, sql: str, params=None):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def is_partitioned(self) -> bool:
+        rows = self.fetch("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [self.table])
+        return bool(rows) and rows[0][0] == "p"
+
+    def existing_partitions(self):
+        rows = self.fetch(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(%s)",
+            [self.table]
+        )
+        partitions = {}
+        for name, in rows:
+            month = partition_month(self.table, name)
+            if month is not None:
+                partitions[month] = name
+        return partitions
+
+    def partition_triggers(self):
+        """
+        Definitions of BEFORE ROW triggers which partitions must have on their own before PostgreSQL 13,
+        taken from the default partition. Empty on later versions, partitions run triggers of the table.
+        """
+        if self.connection.pg_version >= PARTITIONED_BEFORE_TRIGGERS_VERSION:
+            return []
+        rows = self.fetch(
+            "SELECT pg_get_triggerdef(oid) FROM pg_trigger WHERE tgrelid = to_regclass(%s) AND NOT tgisinternal",
+            [default_partition_name(self.table)]
+        )
+        return [definition for definition, in rows if is_before_row_trigger(definition)]
+
+    def convert(self, premake_months: int) -> None:
+        """
+        Recreate messages table partitioned by created_at with primary key (id, created_at),
+        keeping names of indexes, foreign keys and triggers, so migrations keep working.
+        Before PostgreSQL 13 BEFORE ROW triggers are created on every partition instead of the table.
+        """
+        table = self.table
+        legacy = f"{table}_unpartitioned"
+        indexes = self.fetch(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+            [table, f"{table}_pkey"]
+        )
+        foreign_keys = self.fetch(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [table]
+        )
+        triggers = self.fetch(
+            "SELECT pg_get_triggerdef(oid) FROM pg_trigger WHERE tgrelid = to_regclass(%s) AND NOT tgisinternal",
+            [table]
+        )
+        first, last = self.fetch(f'SELECT min(created_at), max(created_at) FROM "{table}"')[0]
+        today = timezone.now().date()
+        months = months_between(first or today, add_months(max(last.date() if last else today, today), premake_months))
+
+        self.execute_sql(f'LOCK TABLE "{table}" IN ACCESS EXCLUSIVE MODE')
+        self.execute_sql(f'ALTER TABLE "{table}" RENAME TO "{legacy}"')
+        for name, _ in indexes:
+            self.execute_sql(f'DROP INDEX "{name}"')
+        for name, _ in foreign_keys:
+            self.execute_sql(f'ALTER TABLE "{legacy}" DROP CONSTRAINT "{name}"')
+        self.execute_sql(f'ALTER TABLE "{legacy}" RENAME CONSTRAINT "{table}_pkey" TO "{legacy}_pkey"')
+
+        self.execute_sql(
+            f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE (created_at)'
+        )
+        self.execute_sql(f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" PRIMARY KEY (id, created_at)')
+        for month in months:
+            self.execute_sql(create_partition_sql(table, month))
+        self.execute_sql(f'CREATE TABLE "{default_partition_name(table)}" PARTITION OF "{table}" DEFAULT')
+        self.execute_sql(f'INSERT INTO "{table}" SELECT * FROM "{legacy}"')
+
+        for _, definition in indexes:
+            self.execute_sql(definition)
+        for name, definition in foreign_keys:
+            self.execute_sql(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+        self.execute_sql(f'DROP TABLE "{legacy}"')
+        partitions = [partition_name(table, month) for month in months] + [default_partition_name(table)]
+        on_partitions = self.connection.pg_version < PARTITIONED_BEFORE_TRIGGERS_VERSION
+        for definition, in triggers:
+            if on_partitions and is_before_row_trigger(definition):
+                for partition in partitions:
+                    self.execute_sql(move_trigger_sql(definition, table, partition))
+            else:
+                self.execute_sql(definition)
+        self.stdout.write(f"Converted {table} into {len(months)} monthly partitions")
+
+    def maintain(self, premake_months: int, retention_months, archive: bool) -> None:
+        existing = self.existing_partitions()
+        to_create, to_detach = plan_maintenance(existing, timezone.now().date(), premake_months, retention_months)
+
+        triggers = self.partition_triggers()
+        for month in to_create:
+            self.execute_sql(create_partition_sql(self.table, month))
+            for definition in triggers:
+                self.execute_sql(move_trigger_sql(definition, default_partition_name(self.table),
+                                                  partition_name(self.table, month)))
+        for month in to_detach:
+            name = existing[month]
+            self.execute_sql(f'ALTER TABLE "{self.table}" DETACH PARTITION "{name}"')
+            if archive:
+                archived = partition_name(f"{self.table}_archive", month)
+                self.execute_sql(f'ALTER TABLE "{name}" RENAME TO "{archived}"')
+            else:
+                self.execute_sql(f'DROP TABLE "{name}"')
+
+        self.stdout.write(
+            f"Created partitions: {[partition_name(self.table, month) for month in to_create]}, "
+            f"{'archived' if archive else 'dropped'} partitions: {[existing[month] for month in to_detach]}"
+        )
@@ -0,0 +1,95 @@
+import time
+from typing import List
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Q
+
+from messenger.db.shards import shard_aliases
+from messenger.models import Conversation, GroupMessage, Message, Person
+
+
+class Command(BaseCommand):
+    help = "Remove soft-deleted messages and persons in small batches, sleeping between them, so no long " \
+           "transaction holds locks. Messages of deleted persons lose their sender or receiver like " \
+           "on_delete=SET_NULL does, a batch at a time. Run it periodically, it is safe to interrupt."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Number of rows changed by a single query")
+        parser.add_argument("--sleep", type=float, default=0.05, help="Seconds to sleep between batches")
+
+    def handle(self, *args, **options):
+        self.batch_size = options["batch_size"]
+        self.sleep = options["sleep"]
+        # Deleting a person from the default database deletes their replicas, which must be detached first
+        aliases = sorted(shard_aliases() or [DEFAULT_DB_ALIAS], key=lambda alias: alias == DEFAULT_DB_ALIAS)
+        messages = persons = 0
+        for alias in aliases:
+            messages += self.purge_messages(alias)
+            persons += self.purge_persons(alias)
+        self.stdout.write(f"Removed {messages} messages and {persons} persons")
+
+    def throttle(self) -> None:
+        if self.sleep:
+            time.sleep(self.sleep)
+
+    def purge_messages(self, alias: str) -> int:
+        messages = Message.all_objects.using(alias)
+        deleted = messages.filter(deleted_at__isnull=False).order_by("deleted_at")
+        total = 0
+        while True:
+            batch = list(deleted.values_list("id", flat=True)[:self.batch_size])
+            if not batch:
+                return total
+            total += messages.filter(id__in=batch).delete()[0]
+            self.throttle()
+
+    def purge_persons(self, alias: str) -> int:
+        persons = Person.all_objects.using(alias)
+        total = 0
+        for person_id in persons.filter(deleted_at__isnull=False).order_by("deleted_at").values_list("id", flat=True):
+            for field, other in (("sender", "receiver"), ("receiver", "sender")):
+                while self.detach(alias, person_id, field, other):
+                    self.throttle()
+            # Groups live in the default database, memberships go with the person
+            while alias == DEFAULT_DB_ALIAS and self.detach_group_messages(person_id):
+                self.throttle()
+            conversations = Conversation.objects.using(alias).filter(Q(owner_id=person_id) | Q(peer_id=person_id))
+            while True:
+                batch = list(conversations.values_list("id", flat=True)[:self.batch_size])
+                if not batch:
+                    break
+                Conversation.objects.using(alias).filter(id__in=batch).delete()
+                self.throttle()
+            # Nothing references the person anymore, so deletion is a single-row DELETE
+            total += persons.filter(id=person_id).delete()[1].get(Person._meta.label, 0)
+        return total
+
+    def detach(self, alias: str, person_id, field: str, other: str) -> bool:
+        """
+        Null field of a batch of messages referencing the person, bumping versions of the other sides.
+
+        :return: whether there were such messages
+        """
+        messages = Message.all_objects.using(alias)
+        rows: List = list(messages.filter(**{f"{field}_id": person_id})
+                          .values_list("id", f"{other}_id")[:self.batch_size])
+        if not rows:
+            return False
+        with transaction.atomic(using=alias):
+            messages.filter(id__in=[row_id for row_id, _ in rows]).update(**{field: None})
+            Person.objects.using(alias).filter(id__in={other_id for _, other_id in rows if other_id is not None}) \
+                .update(messages_version=F("messages_version") + 1)
+        return True
+
+    def detach_group_messages(self, person_id) -> bool:
+        """
+        Null sender of a batch of group messages sent by the person.
+
+        :return: whether there were such messages
+        """
+        batch = list(GroupMessage.objects.filter(sender_id=person_id).values_list("id", flat=True)[:self.batch_size])
+        if not batch:
+            return False
+        GroupMessage.objects.filter(id__in=batch).update(sender=None)
+        return True
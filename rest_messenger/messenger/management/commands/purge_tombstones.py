@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from messenger.db.shards import shard_aliases
+from messenger.models import MessageTombstone
+
+
+class Command(BaseCommand):
+    help = "Remove tombstones of deleted messages older than MESSENGER_SYNC_TOMBSTONE_RETENTION from every shard"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10000,
+                            help="Number of tombstones removed by a single query")
+
+    def handle(self, *args, **options):
+        threshold = timezone.now() - timedelta(seconds=settings.MESSENGER_SYNC_TOMBSTONE_RETENTION)
+        total = 0
+        for alias in shard_aliases() or [DEFAULT_DB_ALIAS]:
+            tombstones = MessageTombstone.objects.using(alias)
+            expired = tombstones.filter(deleted_at__lt=threshold).order_by("deleted_at")
+            while True:
+                batch = list(expired.values_list("id", flat=True)[:options["batch_size"]])
+                if not batch:
+                    break
+                total += tombstones.filter(id__in=batch).delete()[0]
+        self.stdout.write(f"Removed {total} tombstones")
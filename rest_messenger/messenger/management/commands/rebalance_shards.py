@@ -0,0 +1,200 @@
+import time
+from collections import defaultdict
+from typing import Iterable, List, Set
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from messenger.db.shards import fill_buckets, get_shard_map, plan_moves
+from messenger.models import Conversation, Message, MessageTombstone, Person, ShardBucket
+from messenger.services.messageService import insert_messages
+
+
+class Command(BaseCommand):
+    help = "Move buckets of persons between shards while the service is running. Without --bucket buckets " \
+           "are spread evenly over MESSENGER_SHARDS ALIASES, run it after adding a shard. A step copies data " \
+           "of its buckets to the target, freezes them, which answers writes of their persons by 503 for a few " \
+           "seconds, copies what changed meanwhile, switches the buckets and removes moved data from the source."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bucket", type=int, action="append", help="Bucket to move, repeat for several")
+        parser.add_argument("--to", help="Alias of the shard --bucket goes to")
+        parser.add_argument("--step", type=int, default=8, help="Number of buckets moved at once")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Number of rows copied by a query")
+        parser.add_argument("--grace", type=float, default=1,
+                            help="Seconds to wait after MESSENGER_SHARDS REFRESH for writes in flight to finish")
+        parser.add_argument("--dry-run", action="store_true", help="Print planned moves only")
+
+    def handle(self, *args, **options):
+        self.shard_map = get_shard_map()
+        if not self.shard_map.enabled:
+            raise CommandError("Messages aren't sharded, set POSTGRES_SHARD_DATABASES")
+        self.batch_size = options["batch_size"]
+        self.pause = self.shard_map.refresh + options["grace"]
+        self.shard_map.invalidate()
+        layout = self.shard_map.layout()
+
+        if options["bucket"]:
+            if options["to"] not in self.shard_map.aliases:
+                raise CommandError(f"--to must be one of {', '.join(self.shard_map.aliases)}")
+            if any(not 0 <= bucket < self.shard_map.buckets for bucket in options["bucket"]):
+                raise CommandError(f"Buckets are numbered from 0 to {self.shard_map.buckets - 1}")
+            moves = [(bucket, layout[bucket], options["to"]) for bucket in sorted(set(options["bucket"]))
+                     if layout[bucket] != options["to"]]
+        else:
+            moves = plan_moves(layout, self.shard_map.aliases)
+
+        steps = defaultdict(list)
+        for bucket, source, target in moves:
+            steps[(source, target)].append(bucket)
+        for (source, target), buckets in steps.items():
+            self.stdout.write(f"{len(buckets)} buckets from {source} to {target}")
+        if options["dry_run"] or not moves:
+            return
+
+        for target in {target for _, _, target in moves}:
+            self.replicate_persons(target)
+        for (source, target), buckets in steps.items():
+            for start in range(0, len(buckets), options["step"]):
+                self.move(buckets[start:start + options["step"]], source, target)
+        self.stdout.write(self.style.SUCCESS(f"Moved {len(moves)} buckets"))
+
+    def move(self, buckets: List[int], source: str, target: str) -> None:
+        started = timezone.now()
+        persons = self.persons_of(buckets)
+        self.copy(source, target, persons)
+
+        # Processes pick up the freeze within REFRESH seconds, then the source doesn't change anymore
+        self.assign(buckets, source, frozen=True)
+        time.sleep(self.pause)
+        created = self.persons_of(buckets) - persons
+        self.copy(source, target, created)
+        self.copy_changes(source, target, persons, started)
+        self.assign(buckets, target, frozen=False)
+
+        # Processes keep reading the source until they pick up the switch
+        time.sleep(self.pause)
+        self.shard_map.invalidate()
+        self.cleanup(source, persons | created)
+        self.stdout.write(f"Moved {len(buckets)} buckets from {source} to {target}")
+
+    def replicate_persons(self, target: str) -> None:
+        """
+        Copy persons missing from a shard added after they were created.
+        """
+        persons = Person.all_objects.using(DEFAULT_DB_ALIAS).order_by("id")
+        last = None
+        while True:
+            batch = list((persons.filter(id__gt=last) if last else persons)[:self.batch_size])
+            if not batch:
+                return
+            Person.all_objects.using(target).bulk_create(
+                [Person(id=person.id, name=person.name, deleted_at=person.deleted_at, bucket=person.bucket)
+                 for person in batch],
+                ignore_conflicts=True
+            )
+            last = batch[-1].id
+
+    def persons_of(self, buckets: Iterable[int]) -> Set:
+        persons = Person.all_objects.using(DEFAULT_DB_ALIAS)
+        fill_buckets(persons, self.shard_map.buckets, self.batch_size)
+        return set(persons.filter(bucket__in=buckets).values_list("id", flat=True).iterator(self.batch_size))
+
+    def chunks(self, persons: Set):
+        persons = sorted(persons)
+        for start in range(0, len(persons), self.batch_size):
+            yield persons[start:start + self.batch_size]
+
+    @staticmethod
+    def messages_of(chunk) -> Q:
+        # The shard of a person keeps messages received and sent by them
+        return Q(receiver_id__in=chunk) | Q(sender_id__in=chunk)
+
+    @staticmethod
+    def involving(chunk) -> Q:
+        return Q(receiver__in=chunk) | Q(sender__in=chunk)
+
+    def copy_messages(self, messages, target: str, replace: bool = False) -> None:
+        batch = []
+        for message in messages.iterator(self.batch_size):
+            batch.append(message)
+            if len(batch) == self.batch_size:
+                self.write_messages(batch, target, replace)
+                batch = []
+        if batch:
+            self.write_messages(batch, target, replace)
+
+    @staticmethod
+    def write_messages(messages: List[Message], target: str, replace: bool) -> None:
+        with transaction.atomic(using=target):
+            if replace:
+                Message.all_objects.using(target).filter(id__in=[message.id for message in messages]).delete()
+            insert_messages(messages, target, ignore_conflicts=not replace)
+
+    def copy(self, source: str, target: str, persons: Set) -> None:
+        """
+        Copy messages, conversations and tombstones of persons, rows copied before are skipped.
+        """
+        for chunk in self.chunks(persons):
+            self.copy_messages(Message.all_objects.using(source).filter(self.messages_of(chunk)), target)
+            Conversation.objects.using(target).bulk_create(
+                Conversation.objects.using(source).filter(owner_id__in=chunk), ignore_conflicts=True
+            )
+            MessageTombstone.objects.using(target).bulk_create(
+                MessageTombstone.objects.using(source).filter(self.involving(chunk)), ignore_conflicts=True
+            )
+
+    def copy_changes(self, source: str, target: str, persons: Set, since) -> None:
+        """
+        Bring the target up to date with changes made on the source by persons since the first copy.
+        """
+        for chunk in self.chunks(persons):
+            self.copy_messages(Message.all_objects.using(source).filter(self.messages_of(chunk), updated_at__gte=since),
+                               target, replace=True)
+            deleted = list(MessageTombstone.objects.using(source).filter(self.involving(chunk),
+                                                                         deleted_at__gte=since))
+            with transaction.atomic(using=target):
+                MessageTombstone.objects.using(target).bulk_create(deleted, ignore_conflicts=True)
+                Message.all_objects.using(target).filter(id__in=[tombstone.id for tombstone in deleted]).delete()
+                # Conversations are small, they are copied again instead of tracking their changes
+                Conversation.objects.using(target).filter(owner_id__in=chunk).delete()
+                Conversation.objects.using(target).bulk_create(
+                    Conversation.objects.using(source).filter(owner_id__in=chunk)
+                )
+                # Versions only grow, so ETags issued by the source don't match lists of the target
+                versions = defaultdict(list)
+                for person_id, version in Person.all_objects.using(source).filter(id__in=chunk) \
+                        .values_list("id", "messages_version"):
+                    versions[version].append(person_id)
+                for version, ids in versions.items():
+                    Person.all_objects.using(target).filter(id__in=ids).update(messages_version=version + 1)
+
+    @staticmethod
+    def assign(buckets: List[int], alias: str, frozen: bool) -> None:
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            ShardBucket.objects.using(DEFAULT_DB_ALIAS).filter(bucket__in=buckets).delete()
+            ShardBucket.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+                [ShardBucket(bucket=bucket, alias=alias, frozen=frozen) for bucket in buckets]
+            )
+
+    def cleanup(self, source: str, persons: Set) -> None:
+        """
+        Remove rows of moved persons which the source doesn't keep for persons staying on it.
+        """
+        def kept(sender_id, receiver_id) -> bool:
+            return any(person_id is not None and self.shard_map.shard_of(person_id) == source
+                       for person_id in (sender_id, receiver_id))
+
+        for chunk in self.chunks(persons):
+            # Soft-deleted messages move too, so they are removed through the manager which doesn't hide them
+            for rows, fields in (
+                (Message.all_objects.using(source).filter(self.involving(chunk)), ("id", "sender_id", "receiver_id")),
+                (MessageTombstone.objects.using(source).filter(self.involving(chunk)), ("id", "sender", "receiver")),
+            ):
+                moved = [row_id for row_id, sender_id, receiver_id in
+                         rows.values_list(*fields).iterator(self.batch_size) if not kept(sender_id, receiver_id)]
+                for start in range(0, len(moved), self.batch_size):
+                    rows.filter(id__in=moved[start:start + self.batch_size]).delete()
+            Conversation.objects.using(source).filter(owner_id__in=chunk).delete()
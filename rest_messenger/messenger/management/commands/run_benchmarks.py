@@ -0,0 +1,320 @@
+import json
+import math
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.test import Client
+
+from messenger.middleware import capture_queries
+from messenger.models import Conversation, Message, Person
+from messenger.services.groupService import add_members, create_group
+
+"""
+Scenarios drive endpoints of messenger/urls.py. A scenario prepares whatever its request needs
+outside of the measurement and returns a callable doing the request.
+"""
+
+
+def ping(client, data):  # noqa
+    return lambda: client.get("/api/ping/")
+
+
+def users_create(client, data):
+    return lambda: client.post("/api/users/", {"name": f"Bench {data.rng.randrange(10 ** 6)}"})
+
+
+def users_retrieve(client, data):
+    person = data.person()
+    return lambda: client.get(f"/api/users/{person}/")
+
+
+def users_batch(client, data):
+    body = {"ids": [data.person() for _ in range(20)]}
+    return lambda: client.post("/api/users/batch/", body, content_type="application/json")
+
+
+def users_search(client, data):
+    query = data.rng.choice(["a", "ka", "ma", "sa", "va"])
+    return lambda: client.post("/api/users/search/", {"query": query})
+
+
+def messages_create(client, data):
+    sender, receiver = data.person(), data.person()
+    return lambda: client.post("/api/messages/", {"sender": sender, "receiver": receiver, "text": "Bench message"})
+
+
+def messages_update(client, data):
+    message, sender = data.message()
+    return lambda: client.patch(f"/api/messages/{message}/", {"sender": sender, "text": "Edited bench message"},
+                                content_type="application/json")
+
+
+def messages_bulk(client, data):
+    body = {"sender": data.person(), "text": "Bench broadcast", "receivers": [data.person() for _ in range(10)]}
+    return lambda: client.post("/api/messages/bulk/", body, content_type="application/json")
+
+
+def messages_received(client, data):
+    person = data.person()
+    return lambda: client.post("/api/messages/received/", {"user": person})
+
+
+def messages_received_unchanged(client, data):
+    person = data.person()
+    etag = client.post("/api/messages/received/", {"user": person})["ETag"]
+    return lambda: client.post("/api/messages/received/", {"user": person}, HTTP_IF_NONE_MATCH=etag)
+
+
+def messages_sent(client, data):
+    person = data.person()
+    return lambda: client.post("/api/messages/sent/", {"user": person})
+
+
+def messages_received_export(client, data):
+    person = data.person()
+    return lambda: client.post("/api/messages/received/export/", {"user": person, "format": "ndjson"})
+
+
+def messages_sent_export(client, data):
+    person = data.person()
+    return lambda: client.post("/api/messages/sent/export/", {"user": person, "format": "ndjson"})
+
+
+def messages_sync(client, data):
+    person = data.person()
+    return lambda: client.post("/api/messages/sync/", {"user": person})
+
+
+def messages_search(client, data):
+    person = data.person()
+    query = data.rng.choice(["hello", "pizza", "meeting tomorrow", "call me", "weekend plans"])
+    return lambda: client.post("/api/messages/search/", {"user": person, "query": query})
+
+
+def messages_dialog(client, data):
+    person, peer = data.conversation()
+    return lambda: client.post("/api/messages/dialog/", {"user": person, "peer": peer})
+
+
+def messages_destroy(client, data):
+    sender = data.person()
+    message = Message.objects.create(sender_id=sender, receiver_id=data.person(), text="Bench message to delete")
+    return lambda: client.post(f"/api/messages/destroy/{message.id}/", {"user": sender})
+
+
+def conversations(client, data):
+    person = data.person()
+    return lambda: client.post("/api/conversations/", {"user": person})
+
+
+def conversations_ack(client, data):
+    person, peer = data.conversation()
+    return lambda: client.post("/api/conversations/ack/", {"user": person, "peer": peer})
+
+
+def groups_create(client, data):
+    body = {"user": data.person(), "name": "Bench group", "members": [data.person() for _ in range(10)]}
+    return lambda: client.post("/api/groups/", body, content_type="application/json")
+
+
+def groups_members(client, data):
+    group, member = data.group()
+    body = {"user": member, "members": [data.person()]}
+    return lambda: client.post(f"/api/groups/{group}/members/", body, content_type="application/json")
+
+
+def groups_leave(client, data):
+    group, _ = data.group()
+    # A new person, so creators stay in their groups
+    person = Person.objects.create(name="Bench leaver")
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        add_members(group, [person.id])
+    return lambda: client.post(f"/api/groups/{group}/leave/", {"user": person.id})
+
+
+def groups_messages(client, data):
+    group, member = data.group()
+    return lambda: client.post(f"/api/groups/{group}/messages/", {"user": member, "text": "Bench group message"})
+
+
+def groups_history(client, data):
+    group, member = data.group()
+    return lambda: client.post(f"/api/groups/{group}/history/", {"user": member})
+
+
+def groups_ack(client, data):
+    group, member = data.group()
+    return lambda: client.post(f"/api/groups/{group}/ack/", {"user": member})
+
+
+def async_ping(client, data):  # noqa
+    return lambda: client.get("/api/async/ping/")
+
+
+def async_users_retrieve(client, data):
+    person = data.person()
+    return lambda: client.get(f"/api/async/users/{person}/")
+
+
+def async_messages_create(client, data):
+    body = {"sender": data.person(), "receiver": data.person(), "text": "Bench message"}
+    return lambda: client.post("/api/async/messages/", body, content_type="application/json")
+
+
+def async_messages_received(client, data):
+    body = {"user": data.person()}
+    return lambda: client.post("/api/async/messages/received/", body, content_type="application/json")
+
+
+def async_messages_sent(client, data):
+    body = {"user": data.person()}
+    return lambda: client.post("/api/async/messages/sent/", body, content_type="application/json")
+
+
+SCENARIOS = {scenario.__name__: scenario for scenario in [
+    ping, users_create, users_retrieve, users_batch, users_search, messages_create, messages_update, messages_bulk,
+    messages_received, messages_received_unchanged, messages_sent, messages_received_export, messages_sent_export,
+    messages_sync, messages_search, messages_dialog, messages_destroy, conversations, conversations_ack,
+    groups_create, groups_members, groups_leave, groups_messages, groups_history, groups_ack, async_ping,
+    async_users_retrieve, async_messages_create, async_messages_received, async_messages_sent,
+]}
+
+
+class BenchmarkData:
+    """
+    Sample of existing persons, messages and conversations scenarios pick from.
+    Groups aren't seeded, GROUPS groups of GROUP_SIZE sampled persons are created on first use.
+    """
+    GROUPS = 10
+    GROUP_SIZE = 10
+
+    def __init__(self, sample: int, seed: int):
+        self.rng = random.Random(seed)
+        self.persons = list(Person.objects.values_list("id", flat=True)[:sample])
+        self.messages = list(Message.objects.values_list("id", "sender_id").filter(sender__isnull=False)[:sample])
+        self.conversations = list(Conversation.objects.values_list("owner_id", "peer_id")[:sample])
+        if not self.persons or not self.messages or not self.conversations:
+            raise CommandError("Database has no persons, messages or conversations, run seed_messages first")
+        self.groups = []
+
+    def person(self):
+        return str(self.rng.choice(self.persons))
+
+    def message(self):
+        message, sender = self.rng.choice(self.messages)
+        return str(message), str(sender)
+
+    def conversation(self):
+        owner, peer = self.rng.choice(self.conversations)
+        return str(owner), str(peer)
+
+    def group(self):
+        """
+        :return: uuids of a group and of its creator, who never leaves it
+        """
+        if not self.groups:
+            for index in range(self.GROUPS):
+                creator, *members = (self.person() for _ in range(self.GROUP_SIZE))
+                group, _ = create_group(f"Bench group {index}", creator, members)
+                self.groups.append((str(group.id), creator))
+        return self.rng.choice(self.groups)
+
+
+def percentile(values, percent: float) -> float:
+    """
+    Nearest-rank percentile of sorted values.
+    """
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+class Command(BaseCommand):
+    help = "Drive API endpoints in process and report latency percentiles, throughput and queries per request " \
+           "as JSON. Requests go through the whole Django stack except for the HTTP server; " \
+           "threads share the GIL, so concurrency mostly measures database contention."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=sorted(SCENARIOS),
+                            help="Scenarios to run, all by default")
+        parser.add_argument("--requests", type=int, default=200, help="Number of measured requests per scenario")
+        parser.add_argument("--warmup", type=int, default=10, help="Number of unmeasured requests per scenario")
+        parser.add_argument("--concurrency", type=int, default=1, help="Number of threads doing requests")
+        parser.add_argument("--sample", type=int, default=1000,
+                            help="Number of persons, messages and conversations to pick from")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of random choices")
+        parser.add_argument("--output", help="Write results to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        self.data = BenchmarkData(options["sample"], options["seed"])
+        results = {}
+        for name in options["scenarios"]:
+            scenario = SCENARIOS[name]
+            self.run_worker(scenario, options["warmup"])
+            results[name] = self.measure(scenario, options["requests"], options["concurrency"])
+
+        report = json.dumps({
+            "database": connection.vendor,
+            "requests": options["requests"],
+            "concurrency": options["concurrency"],
+            "scenarios": results,
+        }, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(report)
+        else:
+            self.stdout.write(report)
+
+    def measure(self, scenario, requests: int, concurrency: int):
+        shares = [requests // concurrency + (worker < requests % concurrency) for worker in range(concurrency)]
+        started = time.perf_counter()
+        if concurrency == 1:
+            samples = self.run_worker(scenario, requests)
+        else:
+            with ThreadPoolExecutor(concurrency) as executor:
+                samples = [sample for worker in executor.map(self.run_thread, [scenario] * concurrency, shares)
+                           for sample in worker]
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for latency, _, _ in samples)
+        return {
+            "requests": len(samples),
+            "errors": sum(1 for _, status, _ in samples if status >= 400),
+            "seconds": elapsed,
+            "throughput": len(samples) / elapsed if elapsed else 0.0,
+            "latency_ms": {
+                "mean": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+                "p50": percentile(latencies, 50) * 1000,
+                "p95": percentile(latencies, 95) * 1000,
+                "p99": percentile(latencies, 99) * 1000,
+                "max": latencies[-1] * 1000 if latencies else 0.0,
+            },
+            "queries_per_request": sum(queries for _, _, queries in samples) / len(samples) if samples else 0.0,
+        }
+
+    def run_thread(self, scenario, requests: int):
+        try:
+            return self.run_worker(scenario, requests)
+        finally:
+            connections.close_all()
+
+    def run_worker(self, scenario, requests: int):
+        """
+        :return: latency in seconds, status code and number of queries of every request
+        """
+        client = Client(HTTP_HOST="localhost")
+        samples = []
+        for _ in range(requests):
+            request = scenario(client, self.data)
+            with capture_queries() as queries:
+                started = time.perf_counter()
+                response = request()
+                if response.streaming:
+                    for _ in response.streaming_content:
+                        pass
+                latency = time.perf_counter() - started
+            samples.append((latency, response.status_code, len(queries)))
+        return samples
@@ -0,0 +1,150 @@
+import csv
+import io
+import itertools
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from messenger.db.shards import shard_aliases, split_by_shard
+from messenger.models import Conversation, Message, Person
+from messenger.utils.ids import uuid7
+
+SYLLABLES = ["al", "an", "ar", "da", "el", "ia", "ka", "le", "li", "ma", "mi", "na", "ni", "ol", "ra", "sa", "ta",
+             "va", "ya", "zo"]
+WORDS = ["hi", "hello", "how", "are", "you", "fine", "thanks", "see", "tomorrow", "today", "meeting", "call", "me",
+         "later", "ok", "sure", "lunch", "pizza", "coffee", "where", "when", "what", "time", "great", "yes", "no",
+         "maybe", "send", "file", "please", "done", "work", "home", "weekend", "plans", "sorry", "late", "on",
+         "my", "way", "the", "a", "to", "at", "in", "is", "it", "this", "that", "and"]
+
+
+@contextmanager
+def explicit_timestamps(model):
+    """
+    Let generated created_at and updated_at be saved instead of the current time.
+    """
+    fields = [field for field in model._meta.concrete_fields if getattr(field, "auto_now", False) or
+              getattr(field, "auto_now_add", False)]
+    flags = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, flags):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = "Generate persons and messages for benchmarks. Activity of persons follows Zipf's law, " \
+           "each person writes to a few contacts, messages are spread over the last --days days."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--persons", type=int, default=1000, help="Number of persons")
+        parser.add_argument("--messages", type=int, default=100000, help="Number of messages")
+        parser.add_argument("--contacts", type=int, default=20, help="Mean number of contacts of a person")
+        parser.add_argument("--days", type=int, default=365, help="Messages are created within this number of days")
+        parser.add_argument("--batch-size", type=int, default=10000, help="Number of rows inserted at once")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of random generator, same seeds give same data")
+        parser.add_argument("--copy", action="store_true", help="Insert messages by COPY, PostgreSQL only")
+        parser.add_argument("--skip-conversations", action="store_true",
+                            help="Don't fill conversations, inbox endpoints will be empty")
+        parser.add_argument("--database", default="default",
+                            help="Alias of the database, ignored if messages are sharded")
+
+    def handle(self, *args, **options):
+        # Persons go to every shard, messages to the shards of their receivers and senders
+        self.databases = shard_aliases() or [options["database"]]
+        self.batch_size = options["batch_size"]
+        if options["copy"] and any(connections[alias].vendor != "postgresql" for alias in self.databases):
+            raise CommandError("--copy requires PostgreSQL")
+        if options["persons"] < 2:
+            raise CommandError("At least 2 persons are required")
+        rng = random.Random(options["seed"])
+        started = time.perf_counter()
+        end = timezone.now()
+        start = end - timedelta(days=options["days"])
+
+        person_ids = self.seed_persons(rng, options["persons"], start)
+        # Zipf's law: activity of a person is inversely proportional to its rank
+        weights = list(itertools.accumulate(1 / rank for rank in range(1, len(person_ids) + 1)))
+        contacts = [self.pick_contacts(rng, index, person_ids, weights, options["contacts"])
+                    for index in range(len(person_ids))]
+
+        step = (end - start) / max(options["messages"], 1)
+        for offset in range(0, options["messages"], self.batch_size):
+            messages = []
+            for i in range(offset, min(offset + self.batch_size, options["messages"])):
+                sender = rng.choices(range(len(person_ids)), cum_weights=weights)[0]
+                created_at = start + step * (i + rng.random())
+                messages.append(Message(
+                    id=uuid7(int(created_at.timestamp() * 1000)),
+                    text=" ".join(rng.choices(WORDS, k=max(1, int(rng.lognormvariate(2, 0.7)))))[:1024],
+                    sender_id=person_ids[sender],
+                    receiver_id=rng.choice(contacts[sender]),
+                    created_at=created_at,
+                    updated_at=created_at,
+                ))
+            shards = split_by_shard(messages) if shard_aliases() else {self.databases[0]: (messages, None)}
+            for alias, (stored, owners) in shards.items():
+                with transaction.atomic(using=alias):
+                    if options["copy"]:
+                        self.copy_messages(stored, alias)
+                    else:
+                        with explicit_timestamps(Message):
+                            Message.objects.using(alias).bulk_create(stored)
+                    if not options["skip_conversations"]:
+                        Conversation.objects.db_manager(alias).record_messages(messages, owners)
+            self.stdout.write(f"Inserted {offset + len(messages)} of {options['messages']} messages")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(person_ids)} persons and {options['messages']} messages in {elapsed:.1f}s "
+            f"({options['messages'] / elapsed:.0f} messages/s)"
+        ))
+
+    def seed_persons(self, rng: random.Random, count: int, start):
+        start_ms = int(start.timestamp() * 1000)
+        person_ids = []
+        for offset in range(0, count, self.batch_size):
+            persons = [
+                Person(id=uuid7(start_ms + i), name="".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))).title())
+                for i in range(offset, min(offset + self.batch_size, count))
+            ]
+            for alias in self.databases:
+                Person.objects.using(alias).bulk_create(persons)
+            person_ids.extend(person.id for person in persons)
+        return person_ids
+
+    @staticmethod
+    def pick_contacts(rng: random.Random, index: int, person_ids, weights, mean: int):
+        """
+        Contacts of a person, popular persons are contacts of many.
+        """
+        count = min(len(person_ids) - 1, max(1, int(rng.expovariate(1 / mean))))
+        contacts = set()
+        while len(contacts) < count:
+            contact = rng.choices(range(len(person_ids)), cum_weights=weights)[0]
+            if contact != index:
+                contacts.add(contact)
+        return [person_ids[contact] for contact in sorted(contacts)]
+
+    @staticmethod
+    def copy_messages(messages, alias: str) -> None:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for message in messages:
+            writer.writerow([message.id, message.text, message.sender_id, message.receiver_id,
+                             message.created_at.isoformat(), message.updated_at.isoformat()])
+        buffer.seek(0)
+
+        connection = connections[alias]
+        qn = connection.ops.quote_name
+        columns = ", ".join(qn(Message._meta.get_field(name).column)
+                            for name in ("id", "text", "sender", "receiver", "created_at", "updated_at"))
+        with connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {qn(Message._meta.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from messenger.utils.metrics import get_metrics
+
+slow_query_logger = logging.getLogger("messenger.slow_queries")
+
+
+class RequestTimings:
+    """
+    Time of database queries and rendering of a single request.
+
+    Queries are timed by record_query, which finds timings of the request in current_timings
+    in whichever thread they run. Queries of streamed responses, which run after the view returns, are not counted.
+    Render time covers DRF's rendering and blocks of views serializing responses themselves within timed_render().
+    """
+    def __init__(self, slow_query_seconds: Optional[float]):
+        self.slow_query_seconds = slow_query_seconds
+        self.view = None
+        self.db_time = 0.0
+        self.db_queries = 0
+        self.slow_queries = 0
+        self.render_started = None
+        self.render_time = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.db_time += elapsed
+            self.db_queries += 1
+            if self.slow_query_seconds is not None and elapsed >= self.slow_query_seconds:
+                self.slow_queries += 1
+                slow_query_logger.warning("Slow query of %s took %.1fms: %s", self.view, elapsed * 1000, sql)
+
+    def rendered(self, response):
+        self.add_render_time(time.perf_counter() - self.render_started)
+
+    def add_render_time(self, seconds: float) -> None:
+        self.render_time = (self.render_time or 0.0) + seconds
+
+
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("current_timings", default=None)
+
+captured_queries: ContextVar[Optional[List[Dict[str, str]]]] = ContextVar("captured_queries", default=None)
+
+
+@contextmanager
+def capture_queries() -> Iterator[List[Dict[str, str]]]:
+    """
+    Collect "sql" and "alias" of queries run in the current context, in whichever thread and on whichever
+    database they run. CaptureQueriesContext sees a single connection of the current thread,
+    so queries of shards, replicas and threads of async views would go uncounted.
+    """
+    queries = []
+    token = captured_queries.set(queries)
+    try:
+        yield queries
+    finally:
+        captured_queries.reset(token)
+
+
+@contextmanager
+def timed_render() -> Iterator[None]:
+    """
+    Count the block as rendering of the current request, for views which serialize responses
+    without DRF's serializers and renderers.
+    """
+    timings = current_timings.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.add_render_time(time.perf_counter() - started)
+
+
+def timed_stream(content: Iterable[bytes], labels) -> Iterator[bytes]:
+    """
+    Pass chunks of a streamed response through, recording the time spent producing them
+    and their total size by labels once the stream ends.
+    """
+    iterator = iter(content)
+    render_time = 0.0
+    size = 0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                render_time += time.perf_counter() - started
+            size += len(chunk)
+            yield chunk
+    finally:
+        metrics = get_metrics()
+        metrics.render_duration.observe(render_time, labels)
+        metrics.response_size.observe(size, labels)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every database connection by messenger.signals.
+    """
+    captured = captured_queries.get()
+    if captured is not None:
+        captured.append({"sql": sql, "alias": context["connection"].alias})
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings(execute, sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Record duration, database time and number of queries, render time and response size of every request
+    by resolved view into messenger.utils.metrics histograms, served at /api/metrics/,
+    and report them in Server-Timing header.
+
+    Configured by MESSENGER_METRICS setting, must be the first middleware to cover the others.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        config = settings.MESSENGER_METRICS
+        if not config["ENABLED"]:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.server_timing = config["SERVER_TIMING"]
+        self.slow_query_seconds = config["SLOW_QUERY_MS"] / 1000 if config["SLOW_QUERY_MS"] is not None else None
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Mark the instance as coroutine function, as Django's MiddlewareMixin does
+            self._is_coroutine = asyncio.coroutines._is_coroutine  # noqa
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timings = RequestTimings(self.slow_query_seconds)
+        request.timings = timings
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        timings = RequestTimings(self.slow_query_seconds)
+        request.timings = timings
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings, time.perf_counter() - started)
+
+    def finish(self, request, response, timings: RequestTimings, duration: float):
+        self.record(request, response, timings, duration)
+        if self.server_timing:
+            response["Server-Timing"] = self.server_timing_header(timings, duration)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):  # noqa
+        request.timings.view = request.resolver_match.view_name
+
+    def process_template_response(self, request, response):  # noqa
+        # Called right before rendering, DRF responses are serialized to JSON there
+        request.timings.render_started = time.perf_counter()
+        response.add_post_render_callback(request.timings.rendered)
+        return response
+
+    @staticmethod
+    def record(request, response, timings: RequestTimings, duration: float) -> None:
+        metrics = get_metrics()
+        labels = (("view", timings.view or "unresolved"), ("method", request.method))
+        metrics.requests.inc(labels + (("status", str(response.status_code)),))
+        metrics.duration.observe(duration, labels)
+        metrics.db_duration.observe(timings.db_time, labels)
+        metrics.db_queries.observe(timings.db_queries, labels)
+        if response.streaming:
+            # The body is produced after the middleware returns, it is recorded once it ends
+            response.streaming_content = timed_stream(response.streaming_content, labels)
+        else:
+            if timings.render_time is not None:
+                metrics.render_duration.observe(timings.render_time, labels)
+            metrics.response_size.observe(len(response.content), labels)
+        if timings.slow_queries:
+            metrics.slow_queries.inc(labels[:1], timings.slow_queries)
+
+    @staticmethod
+    def server_timing_header(timings: RequestTimings, duration: float) -> str:
+        parts = [
+            f"total;dur={duration * 1000:.1f}",
+            f'db;dur={timings.db_time * 1000:.1f};desc="{timings.db_queries} queries"',
+        ]
+        if timings.render_time is not None:
+            parts.append(f"render;dur={timings.render_time * 1000:.1f}")
+        return ", ".join(parts)
@@ -0,0 +1,74 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+PREVIEW_LENGTH = 100
+
+
+# Random uuid in the format UUIDField stores it by vendor, PostgreSQL before 13 has no gen_random_uuid()
+NEW_UUID = {
+    "postgresql": "md5(random()::text || clock_timestamp()::text)::uuid",
+    "sqlite": "lower(hex(randomblob(16)))",
+}
+
+
+def fill_conversations(apps, schema_editor):
+    """
+    Create conversations of existing messages by a single INSERT ... SELECT, history is considered read.
+    Every message is a candidate for both sides of its conversation, the latest one of each side is taken.
+    """
+    Message = apps.get_model("messenger", "Message")
+    Conversation = apps.get_model("messenger", "Conversation")
+    qn = schema_editor.quote_name
+    messages = qn(Message._meta.db_table)
+    field = Message._meta.get_field
+    message_id, text, created_at = (qn(field(name).column) for name in ("id", "text", "created_at"))
+    sender, receiver = qn(field("sender").column), qn(field("receiver").column)
+    columns = ", ".join(qn(Conversation._meta.get_field(name).column) for name in (
+        "id", "owner", "peer", "last_message_id", "last_message_preview", "last_message_at", "unread_count"))
+    sides = " UNION ALL ".join(
+        f"SELECT {owner} AS owner_id, {peer} AS peer_id, {message_id} AS id, {text} AS text, "
+        f"{created_at} AS created_at FROM {messages} WHERE {sender} IS NOT NULL AND {receiver} IS NOT NULL"
+        for owner, peer in ((sender, receiver), (receiver, sender))
+    )
+    schema_editor.execute(
+        f"INSERT INTO {qn(Conversation._meta.db_table)} ({columns}) "
+        f"SELECT {NEW_UUID[schema_editor.connection.vendor]}, owner_id, peer_id, id, "
+        f"SUBSTR(text, 1, {PREVIEW_LENGTH}), created_at, 0 FROM ("
+        f"SELECT *, ROW_NUMBER() OVER (PARTITION BY owner_id, peer_id ORDER BY created_at DESC, id DESC) AS position "
+        f"FROM ({sides}) sides"
+        f") latest WHERE position = 1"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messenger', '0003_message_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('last_message_id', models.UUIDField(null=True)),
+                ('last_message_preview', models.CharField(blank=True, max_length=100)),
+                ('last_message_at', models.DateTimeField(null=True)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to='messenger.person')),
+                ('peer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='messenger.person')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['owner', 'last_message_at', 'id'], name='conversation_inbox_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(fields=('owner', 'peer'), name='conversation_owner_peer_unique'),
+        ),
+        migrations.RunPython(fill_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messenger', '0004_conversation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_delivered_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_read_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='peer_delivered_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='peer_read_at',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
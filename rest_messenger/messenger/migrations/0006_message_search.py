@@ -0,0 +1,77 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:10
+
+from django.db import migrations
+
+"""
+Full-text search vector of message text, PostgreSQL only.
+
+The column isn't a model field: it is filled by a trigger on insert and on update of text,
+and only read by messenger.utils.search. Text search configuration must match SEARCH_CONFIG there.
+PostgreSQL before 13 can't have the trigger on a partitioned table, then every partition gets it,
+partition_messages adds it to partitions created later.
+"""
+
+FORWARD = [
+    'ALTER TABLE "messenger_message" ADD COLUMN "search_vector" tsvector',
+    'CREATE FUNCTION "messenger_message_search_vector"() RETURNS trigger AS $$ '
+    "BEGIN NEW.search_vector := to_tsvector('simple', coalesce(NEW.text, '')); RETURN NEW; END "
+    '$$ LANGUAGE plpgsql',
+    "UPDATE \"messenger_message\" SET \"search_vector\" = to_tsvector('simple', coalesce(\"text\", ''))",
+    'CREATE INDEX "message_search_idx" ON "messenger_message" USING GIN ("search_vector")',
+]
+
+CREATE_TRIGGER = 'CREATE TRIGGER "message_search_vector_update" BEFORE INSERT OR UPDATE OF "text" ON "{table}" ' \
+                 'FOR EACH ROW EXECUTE FUNCTION "messenger_message_search_vector"()'
+
+DROP_TRIGGER = 'DROP TRIGGER IF EXISTS "message_search_vector_update" ON "{table}"'
+
+BACKWARD = [
+    'DROP INDEX "message_search_idx"',
+    'DROP FUNCTION "messenger_message_search_vector"()',
+    'ALTER TABLE "messenger_message" DROP COLUMN "search_vector"',
+]
+
+
+def trigger_tables(connection):
+    """
+    Messages table, or its partitions if it is partitioned and PostgreSQL is older than 13.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", ["messenger_message"])
+        if cursor.fetchone()[0] != "p" or connection.pg_version >= 130000:
+            return ["messenger_message"]
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(%s)",
+            ["messenger_message"]
+        )
+        return [name for name, in cursor.fetchall()]
+
+
+def forward(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for statement in FORWARD:
+        schema_editor.execute(statement)
+    for table in trigger_tables(schema_editor.connection):
+        schema_editor.execute(CREATE_TRIGGER.format(table=table))
+
+
+def backward(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table in trigger_tables(schema_editor.connection):
+        schema_editor.execute(DROP_TRIGGER.format(table=table))
+    for statement in BACKWARD:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messenger', '0005_conversation_receipts'),
+    ]
+
+    operations = [
+        migrations.RunPython(forward, backward),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:15
+
+from django.db import migrations, models
+import messenger.utils.ids
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messenger', '0006_message_search'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='conversation',
+            name='id',
+            field=models.UUIDField(default=messenger.utils.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='id',
+            field=models.UUIDField(default=messenger.utils.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='person',
+            name='id',
+            field=models.UUIDField(default=messenger.utils.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
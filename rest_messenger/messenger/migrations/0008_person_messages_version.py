@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messenger', '0007_time_ordered_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='messages_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
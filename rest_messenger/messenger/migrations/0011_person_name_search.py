@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:02
+
+from django.db import migrations
+
+"""
+Indexes of lowercased person names for messenger.utils.search.search_persons, PostgreSQL only.
+
+text_pattern_ops serves prefix matches by LIKE regardless of collation, trigram GIN serves similarity.
+Creating pg_trgm extension requires a privileged role, create it beforehand otherwise.
+"""
+
+FORWARD = [
+    'CREATE INDEX "person_name_prefix_idx" ON "messenger_person" (lower("name") text_pattern_ops)',
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX "person_name_trgm_idx" ON "messenger_person" USING GIN (lower("name") gin_trgm_ops)',
+]
+
+BACKWARD = [
+    'DROP INDEX "person_name_trgm_idx"',
+    'DROP INDEX "person_name_prefix_idx"',
+]
+
+
+def run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messenger', '0010_soft_delete'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_postgresql(FORWARD), run_on_postgresql(BACKWARD)),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:52
+
+from django.db import migrations, models, transaction
+import messenger.models.message
+
+# Messages whose dialog keys are set by a single transaction
+BATCH_SIZE = 10000
+
+
+def fill_dialog_keys(apps, schema_editor):
+    """
+    Set dialog keys of existing messages in batches of BATCH_SIZE ids, uuids compare the same way in the database
+    and in Python. The migration isn't atomic, every batch commits on its own, so rows are locked
+    for a batch only and an interrupted backfill goes on with messages still missing keys.
+    """
+    alias = schema_editor.connection.alias
+    Message = apps.get_model("messenger", "Message")
+    messages = Message.objects.using(alias).filter(sender__isnull=False, receiver__isnull=False,
+                                                   person_low__isnull=True)
+    last_id = None
+    while True:
+        batch = messages if last_id is None else messages.filter(id__gt=last_id)
+        ids = list(batch.order_by("id").values_list("id", flat=True)[:BATCH_SIZE])
+        if not ids:
+            return
+        last_id = ids[-1]
+        batch = messages.filter(id__gte=ids[0], id__lte=last_id)
+        with transaction.atomic(using=alias):
+            batch.filter(sender_id__lte=models.F("receiver_id")).update(person_low=models.F("sender_id"),
+                                                                         person_high=models.F("receiver_id"))
+            batch.filter(sender_id__gt=models.F("receiver_id")).update(person_low=models.F("receiver_id"),
+                                                                        person_high=models.F("sender_id"))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('messenger', '0011_person_name_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='person_high',
+            field=messenger.models.message.DialogKeyField(editable=False, high=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='person_low',
+            field=messenger.models.message.DialogKeyField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_dialog_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['person_low', 'person_high', 'created_at', 'id'], name='message_dialog_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messenger', '0013_groups'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='message',
+            name='message_receiver_created_idx',
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_read_id',
+            field=models.UUIDField(null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='peer_read_id',
+            field=models.UUIDField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['receiver', 'created_at', 'id'], include=('sender',), name='message_receiver_created_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+from messenger.db.shards import fill_buckets
+
+# Persons whose buckets are set by a single transaction
+BATCH_SIZE = 10000
+
+
+def fill_person_buckets(apps, schema_editor):
+    """
+    Set buckets of existing persons. The migration isn't atomic, every batch commits on its own,
+    so an interrupted backfill goes on with persons still missing buckets.
+    """
+    Person = apps.get_model("messenger", "Person")
+    fill_buckets(Person.objects.using(schema_editor.connection.alias), settings.MESSENGER_SHARDS["VIRTUAL_SHARDS"],
+                 BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('messenger', '0014_conversation_read_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='bucket',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_person_buckets, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='person',
+            index=models.Index(fields=['bucket'], name='person_bucket_idx'),
+        ),
+    ]
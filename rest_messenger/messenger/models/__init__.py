@@ -1,2 +1,6 @@
 from .message import *
 from .person import *
+from .tombstone import *
+from .conversation import *
+from .shard import *
+from .group import *
@@ -0,0 +1,212 @@
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Collection, List, Optional
+
+from django.db import models, connections, router
+from django.db.models import Q, F, Value, Subquery, OuterRef, Count
+from django.db.models.functions import Greatest, Coalesce
+
+from messenger.models.message import Message
+from messenger.models.person import Person
+from messenger.utils.ids import uuid7
+
+PREVIEW_LENGTH = 100
+# Conversations upserted by a single query, keeps number of query parameters within limits of backends
+UPSERT_BATCH_SIZE = 500
+
+
+class ConversationManager(models.Manager):
+    """
+    Keeps conversations up to date with messages, must be called within the transaction writing messages.
+    """
+    def record_messages(self, messages: List[Message], owners: Optional[Collection] = None) -> None:
+        """
+        Make each message the last one of both sides of its conversation and count it as unread by receiver.
+        Conversations touched by the messages are upserted by batches of UPSERT_BATCH_SIZE in a query.
+
+        :param owners: ids of persons whose sides are recorded, all if not passed
+        """
+        latest = {}
+        unread = defaultdict(int)
+        for message in messages:
+            if message.sender_id is None or message.receiver_id is None:
+                continue
+            for owner, peer in ((message.sender_id, message.receiver_id), (message.receiver_id, message.sender_id)):
+                if owners is not None and owner not in owners:
+                    continue
+                key = (str(owner), str(peer))
+                if key not in latest or (message.created_at, str(message.id)) > \
+                        (latest[key].created_at, str(latest[key].id)):
+                    latest[key] = message
+            unread[(str(message.receiver_id), str(message.sender_id))] += 1
+        rows = [(owner, peer, message, unread[(owner, peer)]) for (owner, peer), message in latest.items()]
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            self._upsert(rows[start:start + UPSERT_BATCH_SIZE])
+
+    def _upsert(self, rows) -> None:
+        """
+        Insert conversations or update existing ones, ORM can't express updates on conflict.
+        """
+        connection = connections[self._db or router.db_for_write(self.model)]
+        meta = self.model._meta
+        qn = connection.ops.quote_name
+        table = qn(meta.db_table)
+        fields = [meta.get_field(name) for name in
+                  ("id", "owner", "peer", "last_message_id", "last_message_preview", "last_message_at", "unread_count")]
+        columns = [qn(field.column) for field in fields]
+        params = []
+        for owner, peer, message, unread_count in rows:
+            values = (uuid7(), owner, peer, message.id, message.text[:PREVIEW_LENGTH],
+                      message.created_at, unread_count)
+            params.extend(field.get_db_prep_value(field.to_python(value), connection)
+                          for field, value in zip(fields, values))
+
+        newer = f"{table}.{columns[5]} IS NULL OR EXCLUDED.{columns[5]} >= {table}.{columns[5]}"
+        latest_columns = ", ".join(
+            f"{column} = CASE WHEN {newer} THEN EXCLUDED.{column} ELSE {table}.{column} END"
+            for column in columns[3:6]
+        )
+        placeholders = ", ".join(["(" + ", ".join(["%s"] * len(columns)) + ")"] * len(rows))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES {placeholders} "
+                f"ON CONFLICT ({columns[1]}, {columns[2]}) DO UPDATE SET {latest_columns}, "
+                f"{columns[6]} = {table}.{columns[6]} + EXCLUDED.{columns[6]}",
+                params
+            )
+
+    @staticmethod
+    def _read_before(field: str, until: datetime, until_id: Optional[uuid.UUID]) -> Q:
+        """
+        Condition selecting conversations whose read mark in field_at and field_id is before (until, until_id).
+        """
+        at, pk = f"{field}_at", f"{field}_id"
+        before = Q(**{f"{at}__isnull": True}) | Q(**{f"{at}__lt": until})
+        if until_id is None:
+            return before | Q(**{at: until, f"{pk}__isnull": False})
+        return before | Q(**{at: until, f"{pk}__lt": until_id})
+
+    @staticmethod
+    def _sides(message: Message) -> Q:
+        return Q(owner_id=message.sender_id, peer_id=message.receiver_id) | \
+            Q(owner_id=message.receiver_id, peer_id=message.sender_id)
+
+    def record_edit(self, message: Message) -> None:
+        """
+        Refresh preview of conversations whose last message is edited.
+        """
+        if message.sender_id is None or message.receiver_id is None:
+            return
+        self.filter(self._sides(message), last_message_id=message.id).update(
+            last_message_preview=message.text[:PREVIEW_LENGTH]
+        )
+
+    def record_deletion(self, message: Message) -> None:
+        """
+        Uncount the message and replace it by the previous one if it was the last message of the conversation.
+        """
+        if message.sender_id is None or message.receiver_id is None:
+            return
+        self.filter(
+            self._read_before("last_read", message.created_at, message.id),
+            owner_id=message.receiver_id,
+            peer_id=message.sender_id,
+        ).update(unread_count=Greatest(F("unread_count") - 1, Value(0)))
+
+        conversations = list(self.select_for_update().filter(self._sides(message), last_message_id=message.id))
+        if not conversations:
+            return
+        previous = Message.objects.filter(
+            Q(sender_id=message.sender_id, receiver_id=message.receiver_id) |
+            Q(sender_id=message.receiver_id, receiver_id=message.sender_id)
+        ).exclude(id=message.id).order_by("-created_at", "-id").first()
+        self.filter(id__in=[conversation.id for conversation in conversations]).update(
+            last_message_id=previous.id if previous else None,
+            last_message_preview=previous.text[:PREVIEW_LENGTH] if previous else "",
+            last_message_at=previous.created_at if previous else None,
+        )
+
+    def acknowledge(self, owner_id, peer_id, until: datetime, until_id: Optional[uuid.UUID] = None,
+                    state: str = "read") -> None:
+        """
+        Mark messages received by owner from peer up to a moment as read or delivered.
+
+        Only high-water marks of both sides of the conversation are moved, so acknowledgement
+        takes two single-row updates regardless of the number of messages. Unread counter is
+        recounted over the messages after the mark, which is an index range scan.
+        Own side is locked before it is recounted: the recount then sees messages whose transactions
+        held the lock to count them, and later ones wait for the lock to add themselves to the new count.
+
+        :param until: creation time of the last acknowledged message
+        :param until_id: id of the last acknowledged message, all messages created at `until` if not passed
+        :param state: "read" or "delivered"
+        """
+        if state != "read":
+            field = f"last_{state}_at"
+            self.filter(Q(**{f"{field}__isnull": True}) | Q(**{f"{field}__lt": until}),
+                        owner_id=owner_id, peer_id=peer_id).update(**{field: until})
+            self.filter(Q(**{f"peer_{state}_at__isnull": True}) | Q(**{f"peer_{state}_at__lt": until}),
+                        owner_id=peer_id, peer_id=owner_id).update(**{f"peer_{state}_at": until})
+            return
+
+        own = list(self.select_for_update().filter(self._read_before("last_read", until, until_id),
+                                                   owner_id=owner_id, peer_id=peer_id).values_list("id", flat=True))
+        if own:
+            after = Q(created_at__gt=until)
+            if until_id is not None:
+                after |= Q(created_at=until, id__gt=until_id)
+            unread = Message.objects.filter(after, receiver_id=OuterRef("owner_id"), sender_id=OuterRef("peer_id")) \
+                .order_by().values("receiver_id").annotate(count=Count("id")).values("count")
+            self.filter(id__in=own).update(last_read_at=until, last_read_id=until_id,
+                                           unread_count=Coalesce(Subquery(unread), Value(0)))
+        self.filter(self._read_before("peer_read", until, until_id), owner_id=peer_id, peer_id=owner_id) \
+            .update(peer_read_at=until, peer_read_id=until_id)
+
+
+class Conversation(models.Model):
+    """
+    Dialog of owner with peer as seen by owner, each pair of persons has two of them.
+    Denormalized from messages to build inbox without scanning them.
+    """
+    id = models.UUIDField(
+        primary_key=True,
+        editable=False,
+        default=uuid7
+    )
+    owner = models.ForeignKey(
+        Person,
+        on_delete=models.CASCADE,
+        related_name="conversations"
+    )
+    peer = models.ForeignKey(
+        Person,
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+    last_message_id = models.UUIDField(null=True)
+    last_message_preview = models.CharField(
+        max_length=PREVIEW_LENGTH,
+        blank=True
+    )
+    last_message_at = models.DateTimeField(null=True)
+    unread_count = models.PositiveIntegerField(default=0)
+    # High-water marks of messages received by owner from peer, and of messages received by peer from owner.
+    # Read marks are keys (created_at, id) of the last read message, without id they cover every message
+    # created at their time
+    last_read_at = models.DateTimeField(null=True)
+    last_read_id = models.UUIDField(null=True)
+    last_delivered_at = models.DateTimeField(null=True)
+    peer_read_at = models.DateTimeField(null=True)
+    peer_read_id = models.UUIDField(null=True)
+    peer_delivered_at = models.DateTimeField(null=True)
+
+    objects = ConversationManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "peer"], name="conversation_owner_peer_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["owner", "last_message_at", "id"], name="conversation_inbox_idx"),
+        ]
@@ -0,0 +1,10 @@
+from django.db import models
+
+
+class AliveManager(models.Manager):
+    """
+    Hides soft-deleted rows, they stay in the table until purge_deleted removes them.
+    Use all_objects of a model to see them.
+    """
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
@@ -0,0 +1,86 @@
+from django.db import models
+
+from messenger.models.person import Person
+from messenger.utils.ids import uuid7
+
+
+class Group(models.Model):
+    """
+    Conversation of many persons. Its messages are stored once and read by every member (fan-out on read).
+    """
+    id = models.UUIDField(
+        primary_key=True,
+        editable=False,
+        default=uuid7
+    )
+    name = models.CharField(
+        max_length=100,
+        null=False
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class GroupMember(models.Model):
+    """
+    Membership of person in group with their read cursor, the key of the last message they have read.
+    """
+    id = models.UUIDField(
+        primary_key=True,
+        editable=False,
+        default=uuid7
+    )
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name="members"
+    )
+    person = models.ForeignKey(
+        Person,
+        on_delete=models.CASCADE,
+        related_name="group_memberships"
+    )
+    joined_at = models.DateTimeField(auto_now_add=True)
+    last_read_at = models.DateTimeField(null=True)
+    last_read_id = models.UUIDField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["group", "person"], name="group_member_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["person", "group"], name="group_member_person_idx"),
+        ]
+
+
+class GroupMessage(models.Model):
+    """
+    Message sent to every member of a group, a single row whatever the size of the group.
+    """
+    id = models.UUIDField(
+        primary_key=True,
+        editable=False,
+        default=uuid7
+    )
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name="messages"
+    )
+    sender = models.ForeignKey(
+        Person,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=False,
+        related_name="group_messages"
+    )
+    text = models.TextField(
+        max_length=1024,
+        null=False
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["group", "created_at", "id"], name="group_message_created_idx"),
+        ]
@@ -1,15 +1,57 @@
 import uuid
+from typing import Optional, Tuple
 
 from django.db import models
+from django.db.models import Q
 
+from messenger.models.deletion import AliveManager
 from messenger.models.person import Person
+from messenger.utils.ids import uuid7
+
+
+def dialog_key(person_id, other_id) -> Tuple[Optional[uuid.UUID], Optional[uuid.UUID]]:
+    """
+    Normalized (person_low, person_high) key of the dialog between two persons, the same for both directions.
+
+    :return: pair of uuids in ascending order, (None, None) if a person is missing
+    """
+    if person_id is None or other_id is None:
+        return None, None
+    person_id, other_id = uuid.UUID(str(person_id)), uuid.UUID(str(other_id))
+    return (person_id, other_id) if person_id <= other_id else (other_id, person_id)
+
+
+class DialogKeyField(models.UUIDField):
+    """
+    Side of dialog_key of sender and receiver, set on insert like auto_now_add.
+    Like timestamps it isn't set by raw inserts, which copy it from the message.
+
+    :param high: store the higher uuid of the pair instead of the lower one
+    """
+    def __init__(self, *args, high: bool = False, **kwargs):
+        self.high = high
+        kwargs.setdefault("null", True)
+        kwargs.setdefault("editable", False)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.high:
+            kwargs["high"] = True
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        if add:
+            setattr(model_instance, self.attname,
+                    dialog_key(model_instance.sender_id, model_instance.receiver_id)[self.high])
+        return super().pre_save(model_instance, add)
 
 
 class Message(models.Model):
     id = models.UUIDField(
         primary_key=True,
         editable=False,
-        default=uuid.uuid4
+        default=uuid7
     )
     text = models.TextField(
         max_length=1024,
@@ -28,5 +70,28 @@ class Message(models.Model):
         null=True,
         blank=False,
         related_name="received_messages")
+    # Dialog of sender and receiver regardless of direction, kept when purge_deleted detaches a person
+    person_low = DialogKeyField()
+    person_high = DialogKeyField(high=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set by deletion of the message, purge_deleted removes the row later
+    deleted_at = models.DateTimeField(
+        null=True,
+        editable=False
+    )
+
+    objects = AliveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            # Sender is included for recounts of unread messages from a peer by index-only scans on PostgreSQL
+            models.Index(fields=["receiver", "created_at", "id"], include=["sender"],
+                         name="message_receiver_created_idx"),
+            models.Index(fields=["sender", "created_at", "id"], name="message_sender_created_idx"),
+            models.Index(fields=["receiver", "updated_at", "id"], name="message_receiver_updated_idx"),
+            models.Index(fields=["sender", "updated_at", "id"], name="message_sender_updated_idx"),
+            models.Index(fields=["person_low", "person_high", "created_at", "id"], name="message_dialog_idx"),
+            models.Index(fields=["deleted_at"], condition=Q(deleted_at__isnull=False), name="message_deleted_idx"),
+        ]
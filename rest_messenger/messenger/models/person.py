@@ -1,15 +1,49 @@
-import uuid
-
+from django.conf import settings
 from django.db import models
+from django.db.models import Q
+
+from messenger.db.shards import bucket_of
+from messenger.models.deletion import AliveManager
+from messenger.utils.ids import uuid7
 
 
 class Person(models.Model):
     id = models.UUIDField(
         primary_key=True,
         editable=False,
-        default=uuid.uuid4
+        default=uuid7
     )
     name = models.CharField(
         max_length=25,
         null=False
     )
+    # Bumped whenever messages sent or received by the person change, ETags of their message lists derive from it
+    messages_version = models.PositiveBigIntegerField(
+        default=0,
+        editable=False
+    )
+    # Set by deletion of the person, purge_deleted detaches their messages and removes the row later
+    deleted_at = models.DateTimeField(
+        null=True,
+        editable=False
+    )
+    # Shard bucket of the id, rebalance_shards selects persons of buckets by it. Rows saved by bulk_create
+    # get it from fill_buckets
+    bucket = models.PositiveIntegerField(
+        null=True,
+        editable=False
+    )
+
+    objects = AliveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["deleted_at"], condition=Q(deleted_at__isnull=False), name="person_deleted_idx"),
+            models.Index(fields=["bucket"], name="person_bucket_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.bucket is None:
+            self.bucket = bucket_of(self.id, settings.MESSENGER_SHARDS["VIRTUAL_SHARDS"])
+        super().save(*args, **kwargs)
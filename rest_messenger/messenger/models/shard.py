@@ -0,0 +1,12 @@
+from django.db import models
+
+
+class ShardBucket(models.Model):
+    """
+    Assignment of a bucket of persons to a shard, kept in the default database.
+    Buckets without an assignment live on the first shard.
+    """
+    bucket = models.PositiveIntegerField(primary_key=True)
+    alias = models.CharField(max_length=100)
+    # Writes of persons of a frozen bucket are rejected while it moves to another shard
+    frozen = models.BooleanField(default=False)
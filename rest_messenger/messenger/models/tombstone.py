@@ -0,0 +1,23 @@
+from django.db import models
+from django.utils import timezone
+
+
+class MessageTombstone(models.Model):
+    """
+    Trace of a deleted message, lets synchronizing clients drop their copy.
+    Tombstones older than MESSENGER_SYNC_TOMBSTONE_RETENTION are purged.
+    """
+    id = models.UUIDField(
+        primary_key=True,
+        editable=False
+    )
+    sender = models.UUIDField(null=True)
+    receiver = models.UUIDField(null=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["receiver", "deleted_at", "id"], name="tombstone_receiver_deleted_idx"),
+            models.Index(fields=["sender", "deleted_at", "id"], name="tombstone_sender_deleted_idx"),
+            models.Index(fields=["deleted_at"], name="tombstone_deleted_idx"),
+        ]
@@ -0,0 +1,43 @@
+from rest_framework import serializers
+
+from messenger.models import Conversation
+from messenger.serializers.messageSerializers import MessagePageSerializer
+from messenger.serializers.personSerializers import UserAuthenticationSerializer
+
+
+class ConversationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Conversation
+        fields = ["peer", "last_message_id", "last_message_preview", "last_message_at", "unread_count",
+                  "last_read_at", "last_read_id", "last_delivered_at", "peer_read_at", "peer_read_id",
+                  "peer_delivered_at"]
+
+
+class ConversationPageResponseSerializer(serializers.Serializer):  # noqa
+    """
+    Page of conversations from the latest one with cursors to adjacent pages
+    """
+    next = serializers.CharField(allow_null=True)
+    previous = serializers.CharField(allow_null=True)
+    results = ConversationSerializer(many=True)
+
+
+class InboxSerializer(MessagePageSerializer):  # noqa
+    """
+    Authenticate person and select page of conversations
+    """
+
+
+class AcknowledgeSerializer(UserAuthenticationSerializer):  # noqa
+    """
+    Acknowledge messages received from peer up to the message, the cursor or all of them if neither is passed
+    """
+    peer = serializers.UUIDField()
+    message = serializers.UUIDField(required=False)
+    cursor = serializers.CharField(required=False)
+    state = serializers.ChoiceField(choices=["read", "delivered"], default="read")
+
+    def validate(self, attrs):
+        if "message" in attrs and "cursor" in attrs:
+            raise serializers.ValidationError("Pass either message or cursor")
+        return attrs
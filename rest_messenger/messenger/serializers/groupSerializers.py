@@ -0,0 +1,98 @@
+from django.conf import settings
+from rest_framework import serializers
+
+from messenger.models import Group, GroupMessage
+from messenger.serializers.messageSerializers import MessagePageSerializer
+from messenger.serializers.personSerializers import UserAuthenticationSerializer
+
+
+class GroupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Group
+        fields = ["id", "name", "created_at"]
+
+
+class GroupCreateSerializer(UserAuthenticationSerializer):  # noqa
+    """
+    Authenticate person creating group of them and the members
+    """
+    name = serializers.CharField(max_length=100)
+    members = serializers.ListField(child=serializers.UUIDField(), required=False, default=list,
+                                    max_length=settings.MESSENGER_GROUP_MAX_MEMBERS)
+
+
+class GroupCreateResponseSerializer(GroupSerializer):
+    """
+    Created group with uuids of requested members which don't exist
+    """
+    missing = serializers.ListField(child=serializers.UUIDField())
+
+    class Meta(GroupSerializer.Meta):
+        fields = GroupSerializer.Meta.fields + ["missing"]
+
+
+class GroupMembersSerializer(UserAuthenticationSerializer):  # noqa
+    """
+    Authenticate member adding persons to the group
+    """
+    members = serializers.ListField(child=serializers.UUIDField(), allow_empty=False,
+                                    max_length=settings.MESSENGER_GROUP_MAX_MEMBERS)
+
+
+class GroupMembersResponseSerializer(serializers.Serializer):  # noqa
+    """
+    Uuids of requested members which don't exist
+    """
+    missing = serializers.ListField(child=serializers.UUIDField())
+
+
+class GroupMessageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GroupMessage
+        fields = ["id", "group", "sender", "text", "created_at", "updated_at"]
+
+
+class GroupMessageCreateSerializer(UserAuthenticationSerializer):  # noqa
+    """
+    Authenticate member sending message to the group
+    """
+    text = serializers.CharField(max_length=1024)
+
+
+class GroupHistorySerializer(MessagePageSerializer):  # noqa
+    """
+    Authenticate member and select page of messages of the group
+    """
+
+
+class GroupHistoryResponseSerializer(serializers.Serializer):  # noqa
+    """
+    Page of messages of the group from the latest one with cursors to adjacent pages, and names of senders
+    by uuid if requested
+    """
+    next = serializers.CharField(allow_null=True)
+    previous = serializers.CharField(allow_null=True)
+    results = GroupMessageSerializer(many=True)
+    persons = serializers.DictField(child=serializers.CharField(), required=False)
+
+
+class GroupAcknowledgeSerializer(UserAuthenticationSerializer):  # noqa
+    """
+    Mark messages of the group read up to the message, the cursor or all of them if neither is passed
+    """
+    message = serializers.UUIDField(required=False)
+    cursor = serializers.CharField(required=False)
+
+    def validate(self, attrs):
+        if "message" in attrs and "cursor" in attrs:
+            raise serializers.ValidationError("Pass either message or cursor")
+        return attrs
+
+
+class GroupReadStateSerializer(serializers.Serializer):  # noqa
+    """
+    Read cursor of the member and number of messages of other members after it
+    """
+    last_read_at = serializers.DateTimeField(allow_null=True)
+    last_read_id = serializers.UUIDField(allow_null=True)
+    unread_count = serializers.IntegerField()
@@ -1,8 +1,10 @@
+from django.conf import settings
 from rest_framework import serializers, status
 from rest_framework.exceptions import NotAuthenticated
 from rest_framework.response import Response
 
-from messenger.models import Message
+from messenger.models import Message, MessageTombstone
+from messenger.serializers.personSerializers import UserAuthenticationSerializer
 
 
 class MessageSerializer(serializers.ModelSerializer):
@@ -11,15 +13,141 @@ class MessageSerializer(serializers.ModelSerializer):
         fields = ["id", "text", "sender", "receiver", "created_at", "updated_at"]
 
 
+class MessagePageSerializer(UserAuthenticationSerializer):  # noqa
+    """
+    Authenticate person and select page of messages, optionally with names of their senders and receivers
+    """
+    cursor = serializers.CharField(required=False, allow_blank=True)
+    limit = serializers.IntegerField(required=False, min_value=1)
+    persons = serializers.BooleanField(required=False, default=False)
+
+
+class MessageDialogSerializer(MessagePageSerializer):  # noqa
+    """
+    Authenticate person and select page of their dialog with the peer
+    """
+    peer = serializers.UUIDField()
+
+
+class MessagePageResponseSerializer(serializers.Serializer):  # noqa
+    """
+    Page of messages with cursors to adjacent pages, and names of persons by uuid if requested
+    """
+    next = serializers.CharField(allow_null=True)
+    previous = serializers.CharField(allow_null=True)
+    results = MessageSerializer(many=True)
+    persons = serializers.DictField(child=serializers.CharField(), required=False)
+
+
+class MessageExportSerializer(UserAuthenticationSerializer):  # noqa
+    """
+    Authenticate person and choose format of streamed message history
+    """
+    format = serializers.ChoiceField(choices=["json", "ndjson"], default="json")
+
+
+class MessageTombstoneSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MessageTombstone
+        fields = ["id", "deleted_at"]
+
+
+class MessageSyncSerializer(UserAuthenticationSerializer):  # noqa
+    """
+    Authenticate person and select position in the change feed
+    """
+    token = serializers.CharField(required=False, allow_blank=True)
+    limit = serializers.IntegerField(required=False, min_value=1)
+
+
+class MessageSyncResponseSerializer(serializers.Serializer):  # noqa
+    """
+    Messages created or edited and messages deleted since the passed token
+    """
+    messages = MessageSerializer(many=True)
+    deleted = MessageTombstoneSerializer(many=True)
+    token = serializers.CharField()
+    has_more = serializers.BooleanField()
+
+
+class MessageSearchSerializer(UserAuthenticationSerializer):  # noqa
+    """
+    Authenticate person and select page of messages matching the query
+    """
+    query = serializers.CharField(max_length=256)
+    offset = serializers.IntegerField(required=False, min_value=0, default=0)
+    limit = serializers.IntegerField(required=False, min_value=1)
+    highlight = serializers.BooleanField(required=False, default=False)
+
+
+class MessageSearchResultSerializer(MessageSerializer):
+    """
+    Message with relevance and snippet of matches, both are null if database has no full-text search
+    """
+    rank = serializers.FloatField(allow_null=True)
+    headline = serializers.CharField(allow_null=True)
+
+    class Meta(MessageSerializer.Meta):
+        fields = MessageSerializer.Meta.fields + ["rank", "headline"]
+
+
+class MessageSearchResponseSerializer(serializers.Serializer):  # noqa
+    """
+    Page of found messages with offset of the next page
+    """
+    next = serializers.IntegerField(allow_null=True)
+    results = MessageSearchResultSerializer(many=True)
+
+
+class MessageBulkItemSerializer(serializers.Serializer):  # noqa
+    receiver = serializers.UUIDField()
+    text = serializers.CharField(max_length=1024)
+
+
+class MessageBulkCreateSerializer(serializers.Serializer):  # noqa
+    """
+    Messages of a single sender: either the same text to every receiver or a list of messages
+    """
+    sender = serializers.UUIDField()
+    text = serializers.CharField(max_length=1024, required=False)
+    receivers = serializers.ListField(child=serializers.UUIDField(), required=False, allow_empty=False)
+    messages = MessageBulkItemSerializer(many=True, required=False, allow_empty=False)
+
+    def validate(self, attrs):
+        if "messages" in attrs:
+            if "receivers" in attrs or "text" in attrs:
+                raise serializers.ValidationError("Pass either messages or text and receivers")
+            items = attrs["messages"]
+        elif "receivers" in attrs and "text" in attrs:
+            items = [{"receiver": receiver, "text": attrs["text"]} for receiver in attrs["receivers"]]
+        else:
+            raise serializers.ValidationError("Pass either messages or text and receivers")
+
+        if len(items) > settings.MESSENGER_BULK_MAX_MESSAGES:
+            raise serializers.ValidationError(f"At most {settings.MESSENGER_BULK_MAX_MESSAGES} messages are allowed")
+        return {"sender": attrs["sender"], "messages": items}
+
+
+class MessageBulkResultSerializer(serializers.Serializer):  # noqa
+    """
+    Outcome of a single message of bulk creation: either created message or errors
+    """
+    receiver = serializers.UUIDField()
+    status = serializers.IntegerField()
+    message = MessageSerializer(required=False)
+    errors = serializers.DictField(required=False)
+
+
 class MessageUpdateSerializer(serializers.ModelSerializer):
     """
     Serializer for partial update.
     Update message if appropriate sender is passed
     """
     def update(self, instance, validated_data):
-        if instance.sender == validated_data["sender"]:
+        # Compare keys, comparing instances would load the sender of the message
+        if instance.sender_id == validated_data["sender"].pk:
             instance.text = validated_data["text"]
-            instance.save()
+            instance.save(update_fields=["text", "updated_at"])
             return instance
         else:
             raise NotAuthenticated(
@@ -38,7 +166,7 @@ class MessageDestroySerializer(serializers.ModelSerializer):
     """
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
-        if instance.sender == self.validated_data["sender"]:
+        if instance.sender_id == self.validated_data["sender"].pk:
             self.perform_destroy(instance)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 
 from messenger.models.person import Person
@@ -14,3 +15,37 @@ class UserAuthenticationSerializer(serializers.Serializer):  # noqa
     Serialize person by uuid
     """
     user = serializers.UUIDField()
+
+
+class PersonBatchSerializer(serializers.Serializer):  # noqa
+    """
+    Uuids of persons to resolve at once
+    """
+    ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False,
+                                max_length=settings.MESSENGER_PERSON_BATCH_SIZE)
+
+
+class PersonBatchResponseSerializer(serializers.Serializer):  # noqa
+    """
+    Found persons in order of request and uuids of unknown ones
+    """
+    results = PersonSerializer(many=True)
+    missing = serializers.ListField(child=serializers.UUIDField())
+
+
+class PersonSearchSerializer(serializers.Serializer):  # noqa
+    """
+    Select page of persons whose name starts with the query, or resembles it if fuzzy
+    """
+    query = serializers.CharField(max_length=25)
+    fuzzy = serializers.BooleanField(required=False, default=False)
+    offset = serializers.IntegerField(required=False, min_value=0, default=0)
+    limit = serializers.IntegerField(required=False, min_value=1)
+
+
+class PersonSearchResponseSerializer(serializers.Serializer):  # noqa
+    """
+    Page of found persons with offset of the next one
+    """
+    next = serializers.IntegerField(allow_null=True)
+    results = PersonSerializer(many=True)
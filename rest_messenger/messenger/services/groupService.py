@@ -0,0 +1,133 @@
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, ValidationError
+
+from messenger.db.replicas import pin_to_primary
+from messenger.models import Group, GroupMember, GroupMessage, Person
+from messenger.utils.cache import get_lookup_cache
+
+"""
+Groups store a message once and let every member read it (fan-out on read), so sending costs
+a single insert whatever the size of the group. Each member keeps a read cursor, the key of the last
+message they have read, unread messages are counted by a range scan of the group's messages after it.
+
+Memberships are checked on every request, "group_members" lookup cache keeps that off the database.
+Only memberships are cached, so a person added to a group gets access at once in every worker.
+"""
+
+
+def _member_key(group_id, person_id) -> str:
+    return f"{group_id}:{person_id}"
+
+
+def is_member(group_id, person_id) -> bool:
+    """
+    Check membership of person in group, served from "group_members" lookup cache if it is known.
+    """
+    cache = get_lookup_cache("group_members")
+    key = _member_key(group_id, person_id)
+    if cache.get(key):
+        return True
+    if not GroupMember.objects.filter(group_id=group_id, person_id=person_id).exists():
+        return False
+    cache.set(key, True)
+    return True
+
+
+def check_member(group_id, person_id) -> None:
+    """
+    :raise NotFound: if person isn't a member of group, hiding whether the group exists
+    """
+    if not is_member(group_id, person_id):
+        raise NotFound(detail="Group with given uuid doesn't exist")
+
+
+def add_members(group_id, person_ids: Iterable) -> List:
+    """
+    Add existing persons to group, persons who are members already are skipped.
+    Read cursors of new members start at the moment they join, earlier history is considered read.
+    Must be called within a transaction, the group is locked against concurrent additions.
+
+    :param person_ids: uuids of persons
+    :return: uuids of persons which don't exist
+    :raise ValidationError: if the group would exceed MESSENGER_GROUP_MAX_MEMBERS
+    """
+    list(Group.objects.select_for_update().filter(id=group_id).values_list("id"))
+    requested = list(dict.fromkeys(person_ids))
+    existing = set(Person.objects.filter(id__in=requested).values_list("id", flat=True))
+    members = GroupMember.objects.filter(group_id=group_id)
+    joining = existing - set(members.filter(person_id__in=existing).values_list("person_id", flat=True))
+    if members.count() + len(joining) > settings.MESSENGER_GROUP_MAX_MEMBERS:
+        raise ValidationError({"members": f"At most {settings.MESSENGER_GROUP_MAX_MEMBERS} members are allowed"})
+    now = timezone.now()
+    GroupMember.objects.bulk_create(
+        [GroupMember(group_id=group_id, person_id=person_id, last_read_at=now) for person_id in joining],
+        batch_size=settings.MESSENGER_BULK_BATCH_SIZE, ignore_conflicts=True,
+    )
+    cache = get_lookup_cache("group_members")
+    for person_id in joining:
+        cache.set(_member_key(group_id, person_id), True)
+    return [person_id for person_id in requested if person_id not in existing]
+
+
+def create_group(name: str, creator_id, member_ids: Iterable) -> Tuple[Group, List]:
+    """
+    Create group of creator and other persons.
+
+    :return: the group and uuids of requested members which don't exist
+    """
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        group = Group.objects.create(name=name)
+        missing = add_members(group.id, [creator_id, *member_ids])
+    return group, missing
+
+
+def remove_member(group_id, person_id) -> bool:
+    """
+    :return: whether person was a member of group
+    """
+    get_lookup_cache("group_members").delete(_member_key(group_id, person_id))
+    return GroupMember.objects.filter(group_id=group_id, person_id=person_id).delete()[0] > 0
+
+
+def send_group_message(group_id, sender_id, text: str) -> GroupMessage:
+    """
+    Store message to every member of group by a single insert, sender must be a member.
+    """
+    message = GroupMessage.objects.create(group_id=group_id, sender_id=sender_id, text=text)
+    pin_to_primary(sender_id)
+    return message
+
+
+def acknowledge_group(group_id, person_id, until: datetime, until_id) -> None:
+    """
+    Move read cursor of member to the message, a cursor past it stays.
+
+    :param until: creation time of the last read message
+    :param until_id: id of the last read message
+    """
+    behind = Q(last_read_at__isnull=True) | Q(last_read_at__lt=until) | \
+        Q(last_read_at=until, last_read_id__isnull=True) | Q(last_read_at=until, last_read_id__lt=until_id)
+    GroupMember.objects.filter(
+        behind,
+        group_id=group_id,
+        person_id=person_id,
+    ).update(last_read_at=until, last_read_id=until_id)
+
+
+def unread_count(group_id, person_id, last_read_at: Optional[datetime], last_read_id) -> int:
+    """
+    Count messages of group after the read cursor which are sent by other persons, an index range scan.
+    """
+    messages = GroupMessage.objects.filter(group_id=group_id)
+    if last_read_at is not None:
+        after = Q(created_at__gt=last_read_at)
+        if last_read_id is not None:
+            after |= Q(created_at=last_read_at, id__gt=last_read_id)
+        messages = messages.filter(after)
+    return messages.exclude(sender_id=person_id).count()
@@ -0,0 +1,247 @@
+import asyncio
+import functools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from messenger.models import Message
+from messenger.services.messageService import deliver_messages
+
+"""
+Write-behind ingestion of messages with group commit.
+
+Requests put validated messages on a bounded queue and wait, a single writer thread takes them
+in batches of up to BATCH_SIZE, waiting at most MAX_DELAY_MS for a batch to fill, and inserts
+a batch by one transaction. A request is answered once the transaction of its message has committed,
+so nothing acknowledged is lost, while a burst of N messages costs about N / BATCH_SIZE commits.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueueFull(Exception):
+    """
+    Queue holds its maximal number of messages, the writer falls behind.
+    """
+
+
+class IngestTimeout(APIException):
+    """
+    Message hasn't been written in time, it is withdrawn from the queue.
+    """
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Messages are being written slowly, retry later"
+    default_code = "ingest_timeout"
+    # Rendered as Retry-After header
+    wait = 1
+
+
+# Detail of IngestTimeout of a message whose transaction is still running
+WRITING_DETAIL = "Message is still being written and may have been committed, check before sending it again"
+
+
+class IngestQueue:
+    """
+    Bounded queue of messages written by a background thread in batches.
+
+    A failed batch is retried message by message, so a bad message fails its own request only.
+    Messages whose futures are cancelled before the writer takes them are not written.
+
+    :param write: saves a batch of messages in a single transaction per database, deliver_messages by default
+    :param queue_size: maximal number of messages waiting to be written
+    :param batch_size: maximal number of messages written by one transaction
+    :param max_delay: seconds the writer waits for more messages after the first one of a batch
+    :param rewrite: saves a message of a failed batch, skipping what the batch has committed on some shards;
+        deliver_messages resuming the delivery if write is deliver_messages, write otherwise
+    """
+    def __init__(self, write: Callable[[List[Message]], List[Message]] = deliver_messages, queue_size: int = 10000,
+                 batch_size: int = 500, max_delay: float = 0.005,
+                 rewrite: Optional[Callable[[List[Message]], List[Message]]] = None):
+        self.write = write
+        if rewrite is None:
+            rewrite = functools.partial(deliver_messages, resume=True) if write is deliver_messages else write
+        self.rewrite = rewrite
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.batches = 0
+        self.written = 0
+        self._queue = queue.Queue(queue_size)
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="messenger-ingest", daemon=True)
+        self._thread.start()
+
+    def submit(self, message: Message) -> Future:
+        """
+        Queue message for writing.
+
+        :return: future resolved by the saved message once its transaction has committed
+        :raise IngestQueueFull: if the queue is full
+        """
+        if self._stopped:
+            raise RuntimeError("Ingest queue is stopped")
+        future = Future()
+        try:
+            self._queue.put_nowait((message, future))
+        except queue.Full:
+            raise IngestQueueFull(f"{self._queue.maxsize} messages are waiting to be written")
+        return future
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": self._queue.qsize(), "batches": self.batches, "written": self.written}
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Write messages queued so far and stop the writer.
+        """
+        self._stopped = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            batch, stop = self._collect()
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as exc:  # noqa
+                    # The writer must outlive any failure, or requests would wait forever
+                    logger.exception("Ingest writer failed")
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(exc)
+                finally:
+                    close_old_connections()
+            if stop:
+                return
+
+    def _collect(self):
+        """
+        Block until a message arrives, then take more until the batch is full or max_delay has passed.
+
+        :return: batch of (message, future) and whether the writer has to stop
+        """
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first] if first[1].set_running_or_notify_cancel() else []
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            # Requests which have given up waiting cancel their futures
+            if item[1].set_running_or_notify_cancel():
+                batch.append(item)
+        return batch, False
+
+    def _write(self, batch) -> None:
+        messages = [message for message, _ in batch]
+        try:
+            self.write(messages)
+        except Exception:  # noqa
+            logger.warning("Batch of %d messages failed, writing them one by one", len(batch), exc_info=True)
+            for message, future in batch:
+                try:
+                    self.rewrite([message])
+                except Exception as exc:  # noqa
+                    future.set_exception(exc)
+                else:
+                    self._done(1)
+                    future.set_result(message)
+            return
+        self._done(len(batch))
+        for message, future in batch:
+            future.set_result(message)
+
+    def _done(self, count: int) -> None:
+        self.batches += 1
+        self.written += count
+
+
+_ingest_queue: Optional[IngestQueue] = None
+_ingest_queue_lock = threading.Lock()
+
+
+def get_ingest_queue() -> IngestQueue:
+    """
+    Return process-wide ingest queue configured by MESSENGER_INGEST, its writer starts on the first call.
+    """
+    global _ingest_queue
+    if _ingest_queue is None:
+        with _ingest_queue_lock:
+            if _ingest_queue is None:
+                config = settings.MESSENGER_INGEST
+                _ingest_queue = IngestQueue(queue_size=config["QUEUE_SIZE"], batch_size=config["BATCH_SIZE"],
+                                            max_delay=config["MAX_DELAY_MS"] / 1000)
+    return _ingest_queue
+
+
+def reset_ingest_queue() -> None:
+    """
+    Write queued messages and build the queue from settings on the next call.
+    """
+    global _ingest_queue
+    with _ingest_queue_lock:
+        ingest_queue, _ingest_queue = _ingest_queue, None
+    if ingest_queue is not None:
+        ingest_queue.stop()
+
+
+def ingest_stats() -> Dict[str, int]:
+    """
+    Statistics of the ingest queue, empty if it hasn't been started by this process.
+    """
+    ingest_queue = _ingest_queue
+    return ingest_queue.stats() if ingest_queue is not None else {}
+
+
+def ingest_message(message: Message) -> Message:
+    """
+    Write message through the ingest queue and wait until it is committed.
+    Blocks the calling thread, under ASGI use ingest_message_async.
+
+    :raise IngestQueueFull: if the queue is full
+    :raise IngestTimeout: if the message is still queued after MESSENGER_INGEST TIMEOUT seconds,
+        it is not written then, or still being written after twice that, it may have been committed then
+    """
+    future = get_ingest_queue().submit(message)
+    timeout = settings.MESSENGER_INGEST["TIMEOUT"]
+    try:
+        return future.result(timeout)
+    except FutureTimeoutError:
+        if future.cancel():
+            raise IngestTimeout()
+    # A message taken by the writer is being written, its request waits for the outcome a while longer
+    try:
+        return future.result(timeout)
+    except FutureTimeoutError:
+        raise IngestTimeout(detail=WRITING_DETAIL)
+
+
+async def ingest_message_async(message: Message) -> Message:
+    """
+    ingest_message waiting on the event loop without holding a thread.
+    """
+    future = get_ingest_queue().submit(message)
+    timeout = settings.MESSENGER_INGEST["TIMEOUT"]
+    try:
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+    except asyncio.TimeoutError:
+        if future.cancel():
+            raise IngestTimeout()
+    try:
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+    except asyncio.TimeoutError:
+        raise IngestTimeout(detail=WRITING_DETAIL)
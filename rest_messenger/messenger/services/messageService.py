@@ -0,0 +1,171 @@
+from typing import Collection, Dict, List, Optional
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from messenger.db.replicas import pin_to_primary
+from messenger.db.shards import message_shards, shard_aliases, split_by_shard, use_shard
+from messenger.models import Message, MessageTombstone, Conversation, Person
+from messenger.models.message import dialog_key
+from messenger.serializers.messageSerializers import MessageSerializer
+from messenger.utils.broker import person_channel, publish_on_commit
+
+"""
+Side effects of sending, editing and deleting messages shared by all the ways messages are written.
+"""
+
+
+def publish_message_event(event_type: str, message: Message, data: Dict) -> None:
+    """
+    Notify receiver of the message listening to /api/events/ once the transaction is committed.
+
+    :param event_type: "message.created", "message.updated" or "message.deleted"
+    :param message: Message the event is about
+    :param data: serialized message
+    """
+    if message.receiver_id is not None:
+        publish_on_commit(person_channel(message.receiver_id), {"type": event_type, "message": data},
+                          using=router.db_for_write(Message))
+
+
+def bump_messages_versions(messages: List[Message], owners: Optional[Collection] = None) -> None:
+    """
+    Increment messages_version of senders and receivers of messages by a single query,
+    which invalidates ETags of their message lists. Rows are locked in the order of ids, so concurrent
+    sends between the same persons in opposite directions wait for each other instead of deadlocking.
+
+    :param owners: ids of persons to bump among them, all if not passed
+    """
+    persons = {person_id for message in messages for person_id in (message.sender_id, message.receiver_id)
+               if person_id is not None and (owners is None or person_id in owners)}
+    if persons:
+        locked = Person.objects.filter(id__in=persons).order_by("id").select_for_update().values("id")
+        Person.objects.filter(id__in=locked).update(messages_version=F("messages_version") + 1)
+
+
+def on_messages_created(messages: List[Message], owners: Optional[Collection] = None, notify: bool = True) -> None:
+    """
+    Must be called within the transaction which inserted messages.
+
+    :param owners: ids of persons whose conversations and versions are kept by the database, all if not passed
+    :param notify: publish events, done once per message when it is written to several shards
+    """
+    Conversation.objects.record_messages(messages, owners)
+    bump_messages_versions(messages, owners)
+    if notify:
+        notify_created(messages)
+
+
+def notify_created(messages: List[Message]) -> None:
+    pin_to_primary(*{message.sender_id for message in messages})
+    serializer = MessageSerializer()
+    for message in messages:
+        publish_message_event("message.created", message, serializer.to_representation(message))
+
+
+def on_message_updated(message: Message, notify: bool = True) -> None:
+    """
+    Must be called within the transaction which updated message.
+    """
+    Conversation.objects.record_edit(message)
+    bump_messages_versions([message])
+    if notify:
+        pin_to_primary(message.sender_id)
+        publish_message_event("message.updated", message, MessageSerializer(message).data)
+
+
+def send_messages(messages: List[Message], owners: Optional[Collection] = None) -> List[Message]:
+    """
+    Insert messages by batches of MESSENGER_BULK_BATCH_SIZE in a single transaction.
+
+    :param messages: unsaved messages with existing sender and receiver
+    :param owners: passed to on_messages_created
+    :return: saved messages
+    """
+    with transaction.atomic(using=router.db_for_write(Message)):
+        Message.objects.bulk_create(messages, batch_size=settings.MESSENGER_BULK_BATCH_SIZE)
+        on_messages_created(messages, owners)
+    return messages
+
+
+def insert_messages(messages: List[Message], alias: str, ignore_conflicts: bool = False) -> None:
+    """
+    Insert messages into the database keeping their timestamps, unlike bulk_create, so copies of a message
+    on different shards are equal.
+
+    :param ignore_conflicts: skip messages which are in the database already
+    """
+    fields = Message._meta.concrete_fields
+    batch_size = settings.MESSENGER_BULK_BATCH_SIZE
+    for start in range(0, len(messages), batch_size):
+        Message.objects.using(alias)._insert(messages[start:start + batch_size], fields=fields, using=alias, raw=True,
+                                             ignore_conflicts=ignore_conflicts)
+    for message in messages:
+        if message._state.adding:
+            message._state.adding = False
+            message._state.db = alias
+
+
+def deliver_messages(messages: List[Message], resume: bool = False) -> List[Message]:
+    """
+    Send messages by send_messages, or to the shards of their receivers and senders if sharding is enabled.
+    Every shard is written by its own transaction, the one of the receiver first.
+
+    :param messages: unsaved messages with existing sender and receiver
+    :param resume: retry a delivery which has failed, shards which have committed a message already skip it.
+        Without sharding a failed delivery has written nothing.
+    :return: saved messages
+    :raise ShardFrozen: if a sender or a receiver is moved to another shard, nothing is written then
+    """
+    if not shard_aliases():
+        return send_messages(messages)
+
+    shards = split_by_shard(messages)
+    now = timezone.now()
+    for message in messages:
+        # A retried message keeps the timestamps of its copies written by the failed delivery
+        if message.created_at is None:
+            message.created_at = message.updated_at = now
+        message.person_low, message.person_high = dialog_key(message.sender_id, message.receiver_id)
+    for alias, (stored, owners) in shards.items():
+        with use_shard(alias), transaction.atomic(using=alias):
+            if resume:
+                committed = set(Message.all_objects.using(alias).filter(id__in=[message.id for message in stored])
+                                .values_list("id", flat=True))
+                stored = [message for message in stored if message.id not in committed]
+            insert_messages(stored, alias)
+            on_messages_created(stored, owners, notify=False)
+    notify_created(messages)
+    return messages
+
+
+def edit_message_copies(message: Message) -> None:
+    """
+    Copy the text of message updated on its current shard to its other shards.
+    """
+    for alias in message_shards(message.sender_id, message.receiver_id):
+        if alias == message._state.db:
+            continue
+        with use_shard(alias), transaction.atomic(using=alias):
+            Message.objects.filter(id=message.id).update(text=message.text, updated_at=message.updated_at)
+            on_message_updated(message, notify=False)
+
+
+def delete_message(message: Message) -> None:
+    """
+    Delete message leaving a tombstone for synchronizing clients, on every shard keeping it.
+    The message is only marked deleted by a single-row update, purge_deleted removes it later.
+    """
+    deleted_at = timezone.now()
+    aliases = message_shards(message.sender_id, message.receiver_id, write=True) or [None]
+    for position, alias in enumerate(aliases):
+        with use_shard(alias), transaction.atomic(using=router.db_for_write(Message)):
+            MessageTombstone.objects.create(id=message.id, sender=message.sender_id, receiver=message.receiver_id)
+            Conversation.objects.record_deletion(message)
+            bump_messages_versions([message])
+            if position == 0:
+                pin_to_primary(message.sender_id)
+                publish_message_event("message.deleted", message, {"id": message.id})
+            Message.objects.filter(id=message.id).update(deleted_at=deleted_at)
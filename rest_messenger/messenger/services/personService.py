@@ -0,0 +1,57 @@
+from typing import Dict, Iterable
+
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from messenger.db.replicas import pin_to_primary
+from messenger.db.shards import shard_aliases
+from messenger.models.person import Person
+from messenger.utils.cache import get_lookup_cache
+
+"""
+Lookups and deletion of persons.
+"""
+
+
+def delete_person(person_id) -> bool:
+    """
+    Mark person deleted by a single-row update per database, so the request takes the same time
+    regardless of the number of their messages. Their messages keep them as sender or receiver
+    until purge_deleted detaches them in batches.
+
+    :return: whether the person existed
+    """
+    deleted_at = timezone.now()
+    if not Person.objects.using(DEFAULT_DB_ALIAS).filter(id=person_id).update(deleted_at=deleted_at):
+        return False
+    for alias in shard_aliases():
+        if alias != DEFAULT_DB_ALIAS:
+            Person.objects.using(alias).filter(id=person_id).update(deleted_at=deleted_at)
+    get_lookup_cache("persons").delete(str(person_id))
+    pin_to_primary(person_id)
+    return True
+
+
+def person_names(person_ids: Iterable) -> Dict[str, str]:
+    """
+    Resolve names of persons, served from "persons" lookup cache if workers share it, persons missing
+    from it are fetched by a single IN query and cached. A cache of one worker would still name
+    a person deleted through another one.
+
+    :param person_ids: uuids of persons, None and duplicates are skipped
+    :return: {"uuid": "name"} of existing persons
+    """
+    cache = get_lookup_cache("persons")
+    names = {}
+    missing = []
+    for person_id in dict.fromkeys(str(person_id) for person_id in person_ids if person_id is not None):
+        name = cache.get(person_id) if cache.shared else None
+        if name is None:
+            missing.append(person_id)
+        else:
+            names[person_id] = name
+    if missing:
+        for person_id, name in Person.objects.filter(id__in=missing).values_list("id", "name"):
+            names[str(person_id)] = name
+            cache.set(str(person_id), name)
+    return names
@@ -0,0 +1,75 @@
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.signals import connection_created
+from django.db.models import F, Q
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from messenger.db.replicas import reset_replicas
+from messenger.db.shards import reset_shard_map, shard_aliases
+from messenger.middleware import record_query
+from messenger.models import Message
+from messenger.models.person import Person
+from messenger.services.ingestService import reset_ingest_queue
+from messenger.utils.broker import reset_broker
+from messenger.utils.cache import get_lookup_cache, reset_lookup_caches
+from messenger.utils.executor import reset_db_executor
+
+
+@receiver(post_save, sender=Person)
+@receiver(post_delete, sender=Person)
+def invalidate_person_cache(sender, instance, **kwargs):  # noqa
+    get_lookup_cache("persons").delete(str(instance.id))
+
+
+@receiver(post_save, sender=Person)
+def replicate_person(sender, instance, using, raw=False, **kwargs):  # noqa
+    # Every shard keeps all persons, messages and conversations of its persons reference their counterparts
+    if using != DEFAULT_DB_ALIAS or raw:
+        return
+    for alias in shard_aliases():
+        if alias != using:
+            Person.all_objects.using(alias).update_or_create(
+                id=instance.id, defaults={"name": instance.name, "deleted_at": instance.deleted_at}
+            )
+
+
+@receiver(post_delete, sender=Person)
+def delete_person_replicas(sender, instance, using, **kwargs):  # noqa
+    if using != DEFAULT_DB_ALIAS:
+        return
+    for alias in shard_aliases():
+        if alias != using:
+            Person.all_objects.using(alias).filter(id=instance.id).delete()
+
+
+@receiver(pre_delete, sender=Person)
+def bump_counterparts_versions(sender, instance, **kwargs):  # noqa
+    # Messages of the person lose their sender or receiver, which changes message lists of their counterparts
+    Person.objects.using(kwargs["using"]).filter(
+        Q(id__in=Message.objects.filter(sender_id=instance.id).values("receiver_id")) |
+        Q(id__in=Message.objects.filter(receiver_id=instance.id).values("sender_id"))
+    ).update(messages_version=F("messages_version") + 1)
+
+
+@receiver(setting_changed)
+def reset_caches_on_setting_change(setting, **kwargs):  # noqa
+    if setting == "MESSENGER_CACHES":
+        reset_lookup_caches()
+    elif setting == "MESSENGER_BROKER":
+        reset_broker()
+    elif setting == "MESSENGER_ASYNC_DB_THREADS":
+        reset_db_executor()
+    elif setting == "MESSENGER_REPLICAS":
+        reset_replicas()
+    elif setting == "MESSENGER_INGEST":
+        reset_ingest_queue()
+    elif setting == "MESSENGER_SHARDS":
+        reset_shard_map()
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):  # noqa
+    # Goes first, so execute_wrapper() blocks opened before the connection still pop their own wrappers
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
@@ -0,0 +1,18 @@
+from django.test.runner import DiscoverRunner
+
+"""
+Test runner of the project, see TEST_RUNNER.
+"""
+
+# Tests timing code against stored baselines, they depend on the machine and its load
+BENCHMARK_TAG = "benchmark"
+
+
+class MessengerTestRunner(DiscoverRunner):
+    """
+    Leave out benchmarks unless they are asked for by --tag benchmark.
+    """
+    def __init__(self, *args, tags=None, exclude_tags=None, **kwargs):
+        if BENCHMARK_TAG not in (tags or []):
+            exclude_tags = [*(exclude_tags or []), BENCHMARK_TAG]
+        super().__init__(*args, tags=tags, exclude_tags=exclude_tags, **kwargs)
@@ -0,0 +1,143 @@
+import json
+
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.test import Client, TransactionTestCase, override_settings
+from rest_framework import status
+
+from messenger.models import Message
+from messenger.models.person import Person
+from messenger.utils.executor import reset_db_executor
+from rest_messenger.asgi import application
+
+client = Client()
+
+
+class AsyncViewsTest(TransactionTestCase):
+    """
+    Database work of async views runs in other threads, so test data has to be committed.
+    """
+    def setUp(self):
+        self.sender = Person.objects.create(id="965c9bf5-be59-40e7-980a-d4008faba9d0", name='Petya')
+        self.receiver = Person.objects.create(id="d7970bd9-2be2-4f8b-8d9f-c2bd31fba483", name='Vanya')
+        for i in range(3):
+            Message.objects.create(sender=self.sender, receiver=self.receiver, text=f"Message {i}")
+
+    def tearDown(self):
+        reset_db_executor()
+
+    async def test_ping(self):
+        resp = await self.async_client.get("/api/async/ping/")
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json(), {"pong": True})
+
+    async def test_person(self):
+        resp = await self.async_client.get(f"/api/async/users/{self.sender.id}/")
+        missing = await self.async_client.get("/api/async/users/00000000-0000-0000-0000-000000000000/")
+
+        self.assertEqual(resp.json(), {"id": str(self.sender.id), "name": "Petya"})
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_received_equals_sync(self):
+        data = {"user": str(self.receiver.id), "limit": 2}
+        resp = async_to_sync(self.async_client.post)("/api/async/messages/received/", data,
+                                                     content_type="application/json")
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        expected = client.post("/api/messages/received/", data).json()
+        self.assertEqual(resp.json(), expected)
+
+    def test_not_modified(self):
+        # Async test client of Django 3.2 takes extra headers by their names
+        data = {"user": str(self.receiver.id)}
+        etag = client.post("/api/messages/received/", data)["ETag"]
+        resp = async_to_sync(self.async_client.post)("/api/async/messages/received/", data,
+                                                     content_type="application/json",
+                                                     **{"If-None-Match": etag})
+        person = async_to_sync(self.async_client.get)(f"/api/async/users/{self.sender.id}/")
+
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(person["ETag"], client.get(f"/api/users/{self.sender.id}/")["ETag"])
+
+    async def test_sent_form(self):
+        resp = await self.async_client.post("/api/async/messages/sent/", f"user={self.sender.id}",
+                                            content_type="application/x-www-form-urlencoded")
+
+        self.assertEqual(len(resp.json()["results"]), 3)
+
+    async def test_errors(self):
+        unknown = await self.async_client.post("/api/async/messages/sent/",
+                                               {"user": "00000000-0000-0000-0000-000000000000"},
+                                               content_type="application/json")
+        invalid = await self.async_client.post("/api/async/messages/sent/", {"user": "nope"},
+                                               content_type="application/json")
+        method = await self.async_client.get("/api/async/messages/sent/")
+
+        self.assertEqual(unknown.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("user", invalid.json())
+        self.assertEqual(method.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def test_queries_are_measured(self):
+        resp = await self.async_client.post("/api/async/messages/received/", {"user": str(self.receiver.id)},
+                                            content_type="application/json")
+
+        self.assertIn('desc="', resp["Server-Timing"])
+        self.assertNotIn('desc="0 queries"', resp["Server-Timing"])
+
+
+class AsgiExportTest(TransactionTestCase):
+    """
+    Exports stream through the ASGI application served in production, not through the test client.
+    """
+    def setUp(self):
+        self.sender = Person.objects.create(id="965c9bf5-be59-40e7-980a-d4008faba9d0", name='Petya')
+        self.receiver = Person.objects.create(id="d7970bd9-2be2-4f8b-8d9f-c2bd31fba483", name='Vanya')
+        for i in range(3):
+            Message.objects.create(sender=self.sender, receiver=self.receiver, text=f"Message {i}")
+
+    def tearDown(self):
+        reset_db_executor()
+
+    async def export(self, path, data):
+        body = json.dumps(data).encode()
+        communicator = ApplicationCommunicator(application, {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": path,
+            "query_string": b"",
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                        (b"host", b"testserver")],
+            "server": ("testserver", 80),
+            "client": ("127.0.0.1", 12345),
+        })
+        await communicator.send_input({"type": "http.request", "body": body})
+        start = await communicator.receive_output(5)
+        body = b""
+        while True:
+            message = await communicator.receive_output(5)
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        await communicator.wait(5)
+        return start["status"], body
+
+    @override_settings(MESSENGER_EXPORT_CHUNK_SIZE=2)
+    def test_received(self):
+        status_code, body = async_to_sync(self.export)("/api/messages/received/export/",
+                                                       {"user": str(self.receiver.id)})
+
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        self.assertEqual([message["text"] for message in json.loads(body)],
+                         ["Message 0", "Message 1", "Message 2"])
+
+    def test_sent_ndjson(self):
+        status_code, body = async_to_sync(self.export)("/api/messages/sent/export/",
+                                                       {"user": str(self.sender.id), "format": "ndjson"})
+
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        self.assertEqual(len(body.splitlines()), 3)
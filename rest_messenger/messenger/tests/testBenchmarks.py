@@ -0,0 +1,68 @@
+import json
+from io import StringIO
+from unittest import skipIf
+
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
+
+from messenger.models import Conversation, Message, Person
+from messenger.management.commands.run_benchmarks import SCENARIOS, percentile
+from messenger.utils.executor import reset_db_executor
+
+
+class SeedMessagesTest(TestCase):
+    def test_seed(self):
+        call_command("seed_messages", persons=20, messages=500, batch_size=200, days=10, stdout=StringIO())
+
+        self.assertEqual(Person.objects.count(), 20)
+        self.assertEqual(Message.objects.count(), 500)
+        self.assertTrue(Conversation.objects.exists())
+        self.assertFalse(Message.objects.filter(sender_id=F("receiver_id")).exists())
+        first, last = Message.objects.order_by("created_at")[0], Message.objects.order_by("-created_at")[0]
+        self.assertGreater((last.created_at - first.created_at).days, 8)
+
+    def test_same_seed_same_texts(self):
+        call_command("seed_messages", persons=5, messages=50, stdout=StringIO())
+        texts = list(Message.objects.order_by("created_at").values_list("text", flat=True))
+        Message.objects.all().delete()
+        call_command("seed_messages", persons=5, messages=50, stdout=StringIO())
+
+        self.assertEqual(list(Message.objects.order_by("created_at").values_list("text", flat=True)), texts)
+
+    @skipIf(connection.vendor == "postgresql", "COPY is available on PostgreSQL")
+    def test_copy_requires_postgresql(self):
+        with self.assertRaises(CommandError):
+            call_command("seed_messages", copy=True, stdout=StringIO())
+
+
+class RunBenchmarksTest(TransactionTestCase):
+    """
+    Database work of async scenarios runs in other threads, so seeded data has to be committed.
+    """
+    def tearDown(self):
+        reset_db_executor()
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_empty_database(self):
+        with self.assertRaises(CommandError):
+            call_command("run_benchmarks", stdout=StringIO())
+
+    def test_all_scenarios(self):
+        call_command("seed_messages", persons=10, messages=200, stdout=StringIO())
+        out = StringIO()
+        call_command("run_benchmarks", requests=3, warmup=1, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report["scenarios"]), set(SCENARIOS))
+        for name, result in report["scenarios"].items():
+            self.assertEqual(result["requests"], 3)
+            self.assertEqual(result["errors"], 0, name)
+            self.assertGreaterEqual(result["latency_ms"]["p99"], result["latency_ms"]["p50"])
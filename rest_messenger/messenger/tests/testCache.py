@@ -0,0 +1,94 @@
+import uuid
+
+from django.conf import settings
+from django.test import Client, TestCase, SimpleTestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+
+from messenger.models.person import Person
+from messenger.utils.cache import DjangoLookupCache, LocalLookupCache, get_lookup_cache
+
+client = Client()
+
+# Persons cached by a single process serving requests
+SHARED_PERSONS = {
+    **settings.MESSENGER_CACHES,
+    "persons": {"BACKEND": "messenger.utils.cache.LocalLookupCache", "OPTIONS": {"shared": True}},
+}
+
+
+class LocalLookupCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.now = 0
+        self.cache = LocalLookupCache(max_size=2, ttl=10, timer=lambda: self.now)
+
+    def test_hit_and_miss(self):
+        self.cache.set("a", "A")
+
+        self.assertEqual(self.cache.get("a"), "A")
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1})
+
+    def test_expiration(self):
+        self.cache.set("a", "A")
+        self.now = 10
+
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_least_recently_used_evicted(self):
+        self.cache.set("a", "A")
+        self.cache.set("b", "B")
+        self.cache.get("a")
+        self.cache.set("c", "C")
+
+        self.assertEqual(self.cache.get("a"), "A")
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("c"), "C")
+
+
+class PersonCacheTest(TestCase):
+    def setUp(self):
+        get_lookup_cache("persons").clear()
+        self.person = Person.objects.create(id="965c9bf5-be59-40e7-980a-d4008faba9d0", name='Petya')
+
+    @override_settings(MESSENGER_CACHES=SHARED_PERSONS)
+    def test_lookup_cached(self):
+        # Message lists read the person for its messages_version, the inbox relies on the cache
+        client.post("/api/conversations/", data={"user": self.person.id})
+
+        with self.assertNumQueries(1):
+            resp = client.post("/api/conversations/", data={"user": self.person.id})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_invalidated_on_delete(self):
+        person_id = self.person.id
+        client.post("/api/messages/received/", data={"user": person_id})
+        self.person.delete()
+
+        resp = client.post("/api/messages/received/", data={"user": person_id})
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_local_cache_not_trusted(self):
+        client.post("/api/conversations/", data={"user": self.person.id})
+        # Deleted through another worker, which evicts the person from its own cache only
+        Person.objects.filter(id=self.person.id).update(deleted_at=timezone.now())
+
+        for path in ("/api/conversations/", "/api/messages/sync/", f"/api/groups/{uuid.uuid4()}/history/"):
+            resp = client.post(path, data={"user": self.person.id})
+            self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(MESSENGER_CACHES={
+    name: {"BACKEND": "messenger.utils.cache.DjangoLookupCache", "OPTIONS": {"max_size": 10, "ttl": 60}}
+    for name in ("persons", "primary_pins")
+})
+class DjangoLookupCacheTest(SimpleTestCase):
+    def test_options_of_local_cache_accepted(self):
+        self.assertIsInstance(get_lookup_cache("persons"), DjangoLookupCache)
+
+    def test_caches_separated(self):
+        get_lookup_cache("persons").set("965c9bf5-be59-40e7-980a-d4008faba9d0", "Petya")
+
+        self.assertIsNone(get_lookup_cache("primary_pins").get("965c9bf5-be59-40e7-980a-d4008faba9d0"))
+        get_lookup_cache("persons").delete("965c9bf5-be59-40e7-980a-d4008faba9d0")
@@ -0,0 +1,125 @@
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+
+from messenger.middleware import capture_queries
+from messenger.models import Message
+from messenger.models.person import Person
+from messenger.tests.testCache import SHARED_PERSONS
+from messenger.utils.cache import get_lookup_cache
+from messenger.utils.conditional import etag_matches, make_etag
+
+client = Client()
+
+
+class EtagTest(SimpleTestCase):
+    def test_matches(self):
+        etag = make_etag("messages", 1)
+
+        self.assertTrue(etag_matches(etag, etag))
+        self.assertTrue(etag_matches(f'"other", W/{etag}', etag))
+        self.assertTrue(etag_matches("*", etag))
+        self.assertFalse(etag_matches(make_etag("messages", 2), etag))
+        self.assertFalse(etag_matches(None, etag))
+
+
+class MessageListConditionalTest(TestCase):
+    def setUp(self):
+        get_lookup_cache("persons").clear()
+        self.sender = Person.objects.create(id="965c9bf5-be59-40e7-980a-d4008faba9d0", name='Petya')
+        self.receiver = Person.objects.create(id="d7970bd9-2be2-4f8b-8d9f-c2bd31fba483", name='Vanya')
+        client.post("/api/messages/", data={"sender": self.sender.id, "receiver": self.receiver.id, "text": "Hi"})
+
+    def received(self, etag=None, **data):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return client.post("/api/messages/received/", data={"user": self.receiver.id, **data}, **headers)
+
+    def test_not_modified(self):
+        etag = self.received()["ETag"]
+
+        with self.assertNumQueries(1):
+            resp = self.received(etag)
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(resp["ETag"], etag)
+        self.assertEqual(resp.content, b"")
+
+    def test_modified_by_new_message(self):
+        etag = self.received()["ETag"]
+        sent_etag = client.post("/api/messages/sent/", data={"user": self.sender.id})["ETag"]
+        client.post("/api/messages/", data={"sender": self.sender.id, "receiver": self.receiver.id, "text": "Hey"})
+
+        resp = self.received(etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(resp["ETag"], etag)
+        self.assertEqual(len(resp.json()["results"]), 2)
+        sent = client.post("/api/messages/sent/", data={"user": self.sender.id}, HTTP_IF_NONE_MATCH=sent_etag)
+        self.assertEqual(sent.status_code, status.HTTP_200_OK)
+
+    def test_modified_by_edit_and_deletion(self):
+        message = Message.objects.get()
+        etag = self.received()["ETag"]
+        client.patch(f"/api/messages/{message.id}/", {"sender": self.sender.id, "text": "Edited"},
+                     content_type="application/json")
+        edited_etag = self.received(etag)["ETag"]
+        self.assertNotEqual(edited_etag, etag)
+
+        client.post(f"/api/messages/destroy/{message.id}/", data={"user": self.sender.id})
+        self.assertEqual(self.received(edited_etag).status_code, status.HTTP_200_OK)
+
+    def test_modified_by_counterpart_deletion(self):
+        etag = self.received()["ETag"]
+        self.sender.delete()
+
+        self.assertEqual(self.received(etag).status_code, status.HTTP_200_OK)
+
+    def test_versions_locked_in_order(self):
+        with capture_queries() as queries:
+            client.post("/api/messages/", data={"sender": self.receiver.id, "receiver": self.sender.id, "text": "Hey"})
+
+        bump, = [query["sql"] for query in queries if query["sql"].startswith('UPDATE "messenger_person"')]
+        self.assertIn('ORDER BY U0."id" ASC', bump)
+        if connection.features.has_select_for_update:
+            self.assertIn("FOR UPDATE", bump)
+
+    def test_etag_of_page(self):
+        first = self.received(limit=1)
+        self.assertNotEqual(first["ETag"], self.received()["ETag"])
+        self.assertEqual(self.received(first["ETag"], limit=1).status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class PersonConditionalTest(TestCase):
+    def setUp(self):
+        get_lookup_cache("persons").clear()
+        self.person = Person.objects.create(id="965c9bf5-be59-40e7-980a-d4008faba9d0", name='Petya')
+
+    @override_settings(MESSENGER_CACHES=SHARED_PERSONS)
+    def test_not_modified(self):
+        resp = client.get(f"/api/users/{self.person.id}/")
+        self.assertEqual(resp.json(), {"id": str(self.person.id), "name": "Petya"})
+
+        with self.assertNumQueries(0):
+            cached = client.get(f"/api/users/{self.person.id}/", HTTP_IF_NONE_MATCH=resp["ETag"])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_modified(self):
+        etag = client.get(f"/api/users/{self.person.id}/")["ETag"]
+        self.person.name = "Pyotr"
+        self.person.save()
+
+        resp = client.get(f"/api/users/{self.person.id}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json()["name"], "Pyotr")
+
+    def test_deleted_through_another_worker(self):
+        etag = client.get(f"/api/users/{self.person.id}/")["ETag"]
+        # Cache of this worker isn't told about the deletion
+        Person.objects.filter(id=self.person.id).update(deleted_at=timezone.now())
+
+        resp = client.get(f"/api/users/{self.person.id}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_missing(self):
+        resp = client.get("/api/users/00000000-0000-0000-0000-000000000000/", HTTP_IF_NONE_MATCH='"etag"')
+
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
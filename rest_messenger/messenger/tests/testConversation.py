@@ -0,0 +1,148 @@
+from django.test import Client, TestCase
+from rest_framework import status
+
+from messenger.models import Message, Conversation
+from messenger.models.person import Person
+
+client = Client()
+
+
+class ConversationTest(TestCase):
+    def setUp(self):
+        self.sender = Person.objects.create(id="965c9bf5-be59-40e7-980a-d4008faba9d0", name='Petya')
+        self.receiver = Person.objects.create(id="d7970bd9-2be2-4f8b-8d9f-c2bd31fba483", name='Vanya')
+        self.other = Person.objects.create(id="093474d3-bcb5-4587-b4db-8e63c8a68565", name='Sanya')
+
+    def send(self, sender, receiver, text):
+        resp = client.post("/api/messages/", data={"text": text, "sender": sender.id, "receiver": receiver.id})
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        return resp.data["id"]
+
+    def inbox(self, person, **data):
+        resp = client.post("/api/conversations/", data={"user": person.id, **data})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.data
+
+    def test_both_sides_updated(self):
+        self.send(self.sender, self.receiver, "First")
+        last = self.send(self.sender, self.receiver, "Second")
+
+        sender_side = Conversation.objects.get(owner=self.sender, peer=self.receiver)
+        receiver_side = Conversation.objects.get(owner=self.receiver, peer=self.sender)
+        self.assertEqual(str(sender_side.last_message_id), last)
+        self.assertEqual(receiver_side.last_message_preview, "Second")
+        self.assertEqual(sender_side.unread_count, 0)
+        self.assertEqual(receiver_side.unread_count, 2)
+
+    def test_inbox_ordered_by_last_message(self):
+        self.send(self.sender, self.receiver, "To Vanya")
+        self.send(self.other, self.receiver, "From Sanya")
+
+        with self.assertNumQueries(2):  # person, conversations
+            data = self.inbox(self.receiver, limit=1)
+        self.assertEqual([str(c["peer"]) for c in data["results"]], [self.other.id])
+        data = self.inbox(self.receiver, cursor=data["next"])
+        self.assertEqual([str(c["peer"]) for c in data["results"]], [self.sender.id])
+
+    def test_edit_last_message(self):
+        message_id = self.send(self.sender, self.receiver, "Text")
+        client.patch(f"/api/messages/{message_id}/", data={
+            "text": "Edited",
+            "sender": self.sender.id,
+        }, content_type="application/json")
+
+        previews = Conversation.objects.values_list("last_message_preview", flat=True)
+        self.assertEqual(list(previews), ["Edited", "Edited"])
+
+    def test_delete_last_message(self):
+        first = self.send(self.sender, self.receiver, "First")
+        second = self.send(self.receiver, self.sender, "Second")
+        client.post(f"/api/messages/destroy/{second}/", data={"user": self.receiver.id}, content_type='application/json')
+
+        for conversation in Conversation.objects.all():
+            self.assertEqual(str(conversation.last_message_id), first)
+            self.assertEqual(conversation.last_message_preview, "First")
+        self.assertEqual(Conversation.objects.get(owner=self.sender).unread_count, 0)
+        self.assertEqual(Conversation.objects.get(owner=self.receiver).unread_count, 1)
+
+    def test_delete_only_message(self):
+        message = Message.objects.create(sender=self.sender, receiver=self.receiver, text="Text")
+        Conversation.objects.record_messages([message])
+        client.post(f"/api/messages/destroy/{message.id}/", data={"user": self.sender.id}, content_type='application/json')
+
+        self.assertEqual(self.inbox(self.receiver)["results"], [])
+        self.assertEqual(Conversation.objects.get(owner=self.receiver).unread_count, 0)
+
+    def acknowledge(self, person, peer, **data):
+        return client.post("/api/conversations/ack/", data={"user": person.id, "peer": peer.id, **data})
+
+    def test_read_up_to_message(self):
+        first = self.send(self.sender, self.receiver, "First")
+        self.send(self.sender, self.receiver, "Second")
+
+        # person, message, savepoint, own side lock, own side, peer side, release, conversation
+        with self.assertNumQueries(8):
+            resp = self.acknowledge(self.receiver, self.sender, message=first)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["unread_count"], 1)
+        self.assertIsNotNone(Conversation.objects.get(owner=self.sender).peer_read_at)
+
+    def test_read_mark_keeps_message_id(self):
+        earlier, later = sorted([self.send(self.sender, self.receiver, "First"),
+                                 self.send(self.sender, self.receiver, "Second")])
+        # Messages created at the same moment are told apart by their ids
+        Message.objects.filter(id=later).update(created_at=Message.objects.get(id=earlier).created_at)
+
+        resp = self.acknowledge(self.receiver, self.sender, message=earlier)
+        self.assertEqual((resp.data["unread_count"], str(resp.data["last_read_id"])), (1, earlier))
+        resp = self.acknowledge(self.receiver, self.sender, message=later)
+        self.assertEqual((resp.data["unread_count"], str(resp.data["last_read_id"])), (0, later))
+        self.assertEqual(str(Conversation.objects.get(owner=self.sender).peer_read_id), later)
+
+    def test_read_all(self):
+        for i in range(3):
+            self.send(self.sender, self.receiver, f"Message {i}")
+
+        resp = self.acknowledge(self.receiver, self.sender)
+        self.assertEqual(resp.data["unread_count"], 0)
+
+        self.send(self.sender, self.receiver, "New")
+        self.assertEqual(self.inbox(self.receiver)["results"][0]["unread_count"], 1)
+
+    def test_read_up_to_cursor(self):
+        for i in range(3):
+            self.send(self.sender, self.receiver, f"Message {i}")
+        page = client.post("/api/messages/received/", data={"user": self.receiver.id, "limit": 2}).data
+
+        resp = self.acknowledge(self.receiver, self.sender, cursor=page["next"])
+        self.assertEqual(resp.data["unread_count"], 1)
+
+    def test_mark_does_not_move_back(self):
+        first = self.send(self.sender, self.receiver, "First")
+        self.send(self.sender, self.receiver, "Second")
+        self.acknowledge(self.receiver, self.sender)
+
+        resp = self.acknowledge(self.receiver, self.sender, message=first)
+        self.assertEqual(resp.data["unread_count"], 0)
+
+    def test_delivered(self):
+        self.send(self.sender, self.receiver, "First")
+
+        resp = self.acknowledge(self.receiver, self.sender, state="delivered")
+        self.assertEqual(resp.data["unread_count"], 1)
+        self.assertIsNotNone(resp.data["last_delivered_at"])
+        self.assertIsNotNone(Conversation.objects.get(owner=self.sender).peer_delivered_at)
+
+    def test_delete_read_message(self):
+        message_id = self.send(self.sender, self.receiver, "First")
+        self.acknowledge(self.receiver, self.sender)
+        self.send(self.sender, self.receiver, "Second")
+        client.post(f"/api/messages/destroy/{message_id}/", data={"user": self.sender.id}, content_type='application/json')
+
+        self.assertEqual(Conversation.objects.get(owner=self.receiver).unread_count, 1)
+
+    def test_acknowledge_foreign_message(self):
+        message_id = self.send(self.sender, self.other, "First")
+
+        resp = self.acknowledge(self.receiver, self.sender, message=message_id)
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
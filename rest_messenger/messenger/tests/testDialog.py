@@ -0,0 +1,83 @@
+from django.test import Client, TestCase, override_settings
+from rest_framework import status
+
+from messenger.models import Message
+from messenger.models.message import dialog_key
+from messenger.models.person import Person
+from messenger.services.messageService import send_messages
+
+client = Client()
+
+
+class DialogTest(TestCase):
+    def setUp(self):
+        self.petya = Person.objects.create(id="965c9bf5-be59-40e7-980a-d4008faba9d0", name="Petya")
+        self.vasya = Person.objects.create(id="d7970bd9-2be2-4f8b-8d9f-c2bd31fba483", name="Vasya")
+        self.sanya = Person.objects.create(id="093474d3-bcb5-4587-b4db-8e63c8a68565", name="Sanya")
+        self.first = Message.objects.create(sender=self.petya, receiver=self.vasya, text="Hi")
+        self.foreign = Message.objects.create(sender=self.sanya, receiver=self.petya, text="Hi from Sanya")
+        self.reply = Message.objects.create(sender=self.vasya, receiver=self.petya, text="Hi, Petya")
+        self.last = Message.objects.create(sender=self.petya, receiver=self.vasya, text="How are you?")
+
+    def dialog(self, user, peer, **data):
+        resp = client.post("/api/messages/dialog/", data={"user": user.id, "peer": peer.id, **data})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.json()
+
+    def test_key_normalized(self):
+        self.assertEqual((self.first.person_low, self.first.person_high), (self.reply.person_low,
+                                                                           self.reply.person_high))
+        self.assertEqual((self.first.person_low, self.first.person_high), dialog_key(self.vasya.id, self.petya.id))
+
+    def test_key_on_bulk_insert(self):
+        message, = send_messages([Message(sender_id=self.vasya.id, receiver_id=self.sanya.id, text="Hello")])
+
+        stored = Message.objects.get(id=message.id)
+        self.assertEqual((stored.person_low, stored.person_high), dialog_key(self.sanya.id, self.vasya.id))
+
+    def test_interleaved_latest_first(self):
+        for user, peer in ((self.petya, self.vasya), (self.vasya, self.petya)):
+            data = self.dialog(user, peer)
+
+            self.assertEqual([message["id"] for message in data["results"]],
+                             [str(self.last.id), str(self.reply.id), str(self.first.id)])
+            self.assertIsNone(data["next"])
+
+    @override_settings(MESSENGER_PAGE_SIZE=2)
+    def test_pages(self):
+        first = self.dialog(self.petya, self.vasya)
+        second = self.dialog(self.petya, self.vasya, cursor=first["next"])
+
+        self.assertEqual([message["text"] for message in first["results"]], ["How are you?", "Hi, Petya"])
+        self.assertEqual([message["text"] for message in second["results"]], ["Hi"])
+        self.assertIsNone(second["next"])
+        previous = self.dialog(self.petya, self.vasya, cursor=second["previous"])
+        self.assertEqual(previous["results"], first["results"])
+
+    def test_single_query(self):
+        # The person lookup and one range scan of the dialog
+        with self.assertNumQueries(2):
+            self.dialog(self.petya, self.sanya)
+
+    def test_deleted_hidden(self):
+        client.post(f"/api/messages/destroy/{self.reply.id}/", data={"user": self.vasya.id})
+
+        data = self.dialog(self.petya, self.vasya)
+        self.assertEqual([message["id"] for message in data["results"]], [str(self.last.id), str(self.first.id)])
+
+    def test_not_modified(self):
+        resp = client.post("/api/messages/dialog/", data={"user": self.petya.id, "peer": self.vasya.id})
+        etag = resp["ETag"]
+
+        resp = client.post("/api/messages/dialog/", data={"user": self.petya.id, "peer": self.vasya.id},
+                           HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        send_messages([Message(sender=self.vasya, receiver=self.petya, text="Fine")])
+        resp = client.post("/api/messages/dialog/", data={"user": self.petya.id, "peer": self.vasya.id},
+                           HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_peer_required(self):
+        resp = client.post("/api/messages/dialog/", data={"user": self.petya.id})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
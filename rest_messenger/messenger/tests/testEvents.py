@@ -0,0 +1,163 @@
+import asyncio
+import json
+import threading
+from unittest import mock
+
+from django.db import transaction
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from rest_framework import status
+
+from messenger.asgi import event_stream
+from messenger.models import Message
+from messenger.models.person import Person
+from messenger.utils.broker import InMemoryBroker, get_broker, person_channel
+
+client = Client()
+
+published = []
+
+
+class RecordingBroker(InMemoryBroker):
+    def publish(self, channel, event):
+        published.append((channel, event))
+        super().publish(channel, event)
+
+
+class BrokerTest(SimpleTestCase):
+    def test_publish_from_other_thread(self):
+        broker = InMemoryBroker()
+
+        async def consume():
+            subscription = broker.subscribe("channel")
+            threading.Thread(target=broker.publish, args=("channel", {"type": "test"})).start()
+            try:
+                return await asyncio.wait_for(subscription.get(), 1)
+            finally:
+                subscription.close()
+
+        self.assertEqual(asyncio.run(consume()), {"type": "test"})
+        self.assertEqual(broker._subscriptions, {})
+
+    def test_overflow(self):
+        broker = InMemoryBroker(queue_size=1)
+
+        async def consume():
+            subscription = broker.subscribe("channel")
+            broker.publish("channel", {"type": "first"})
+            broker.publish("channel", {"type": "second"})
+            await asyncio.sleep(0)
+            return subscription
+
+        self.assertTrue(asyncio.run(consume()).overflowed)
+
+
+@override_settings(MESSENGER_BROKER={"BACKEND": "messenger.tests.testEvents.RecordingBroker"})
+class MessageEventsTest(TestCase):
+    def setUp(self):
+        published.clear()
+        self.sender = Person.objects.create(id="965c9bf5-be59-40e7-980a-d4008faba9d0", name='Petya')
+        self.receiver = Person.objects.create(id="d7970bd9-2be2-4f8b-8d9f-c2bd31fba483", name='Vanya')
+
+    def test_events_published(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = client.post("/api/messages/", data={
+                "text": "Some text",
+                "sender": self.sender.id,
+                "receiver": self.receiver.id,
+            })
+        message_id = resp.data["id"]
+        with self.captureOnCommitCallbacks(execute=True):
+            client.patch(f"/api/messages/{message_id}/", data={
+                "text": "Other text",
+                "sender": self.sender.id,
+            }, content_type="application/json")
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(f"/api/messages/destroy/{message_id}/", data={
+                "user": self.sender.id
+            }, content_type='application/json')
+
+        channel = person_channel(self.receiver.id)
+        self.assertEqual(
+            [(c, e["type"], str(e["message"]["id"])) for c, e in published],
+            [
+                (channel, "message.created", message_id),
+                (channel, "message.updated", message_id),
+                (channel, "message.deleted", message_id),
+            ]
+        )
+        self.assertEqual(published[1][1]["message"]["text"], "Other text")
+
+    def test_not_published_on_rollback(self):
+        message = Message.objects.create(sender=self.sender, receiver=self.receiver, text="Some text")
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                client.patch(f"/api/messages/{message.id}/", data={
+                    "text": "Other text",
+                    "sender": self.sender.id,
+                }, content_type="application/json")
+                raise RuntimeError("rolled back")
+
+        self.assertEqual(callbacks, [])
+        self.assertEqual(published, [])
+        self.assertEqual(Message.objects.get(id=message.id).text, "Some text")
+
+
+class EventStreamTest(SimpleTestCase):
+    person = Person(id="d7970bd9-2be2-4f8b-8d9f-c2bd31fba483", name='Vanya')
+
+    async def run_stream(self, query_string, events):
+        sent = []
+        disconnect = asyncio.Event()
+
+        async def receive():
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if message["type"] == "http.response.start" and message["status"] == status.HTTP_200_OK:
+                for event in events:
+                    get_broker().publish(person_channel(self.person.id), event)
+            if len([m for m in sent if m.get("body", b"").startswith(b"event:")]) == len(events):
+                disconnect.set()
+
+        await asyncio.wait_for(event_stream({"type": "http", "query_string": query_string}, receive, send), 1)
+        return sent
+
+    def test_invalid_user(self):
+        sent = asyncio.run(self.run_stream(b"user=garbage", []))
+
+        self.assertEqual(sent[0]["status"], status.HTTP_400_BAD_REQUEST)
+
+    def test_events_streamed(self):
+        event = {"type": "message.created", "message": {"text": "Some text"}}
+        with mock.patch("messenger.asgi.validate_person", return_value=self.person):
+            sent = asyncio.run(self.run_stream(f"user={self.person.id}".encode(), [event]))
+
+        self.assertEqual(sent[0]["status"], status.HTTP_200_OK)
+        body = b"".join(m.get("body", b"") for m in sent[1:]).decode()
+        self.assertIn(f"event: message.created\ndata: {json.dumps(event)}\n\n", body)
+
+    def test_cancelled_stream_cleans_up(self):
+        async def stream():
+            connected = asyncio.Event()
+
+            async def receive():
+                await asyncio.Event().wait()
+
+            async def send(message):
+                connected.set()
+
+            with mock.patch("messenger.asgi.validate_person", return_value=self.person):
+                task = asyncio.ensure_future(event_stream({"type": "http", "query_string": b""}, receive, send))
+                await connected.wait()
+                # The server cancels the application of a client gone while it waits for an event
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+            await asyncio.sleep(0)
+            return [other for other in asyncio.all_tasks() if other is not asyncio.current_task()]
+
+        self.assertEqual(asyncio.run(stream()), [])
+        self.assertEqual(get_broker()._subscriptions, {})
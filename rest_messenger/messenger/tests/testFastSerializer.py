@@ -0,0 +1,37 @@
+import json
+from datetime import datetime
+
+import pytz
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from messenger.management.commands.bench_serializers import make_messages, as_rows
+from messenger.serializers.fastMessageSerializers import FastMessageSerializer
+from messenger.serializers.messageSerializers import MessageSerializer
+
+
+class FastMessageSerializerTest(SimpleTestCase):
+    def assert_same_output(self, messages):
+        expected = json.loads(json.dumps(MessageSerializer(messages, many=True).data, default=str))
+        serializer = FastMessageSerializer()
+        rows = as_rows(messages)
+
+        self.assertEqual(serializer.to_list(rows), expected)
+        self.assertEqual([json.loads(serializer.to_json(row)) for row in rows], expected)
+
+    def test_same_as_model_serializer(self):
+        self.assert_same_output(make_messages(50))
+
+    def test_missing_persons_and_whole_seconds(self):
+        messages = make_messages(2)
+        messages[0].sender_id = None
+        messages[1].receiver_id = None
+        messages[1].created_at = messages[1].updated_at = datetime(2020, 4, 16, 16, 6, tzinfo=pytz.utc)
+        self.assert_same_output(messages)
+
+    def test_timezone_transition(self):
+        messages = make_messages(2)
+        messages[0].created_at = datetime(2010, 3, 27, 22, 59, 59, tzinfo=pytz.utc)
+        messages[1].created_at = datetime(2010, 3, 27, 23, 0, 0, tzinfo=pytz.utc)
+        with timezone.override("Europe/Moscow"):
+            self.assert_same_output(messages)
@@ -0,0 +1,183 @@
+import json
+import uuid
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from rest_framework import status
+
+from messenger.models import Group, GroupMember, GroupMessage
+from messenger.models.person import Person
+from messenger.services.groupService import unread_count
+from messenger.tests.testCache import SHARED_PERSONS
+from messenger.utils.cache import get_lookup_cache
+from messenger.utils.pagination import KeysetPaginator
+
+client = Client()
+
+
+class GroupTest(TestCase):
+    def setUp(self):
+        get_lookup_cache("persons").clear()
+        get_lookup_cache("group_members").clear()
+        self.petya = Person.objects.create(name="Petya")
+        self.vasya = Person.objects.create(name="Vasya")
+        self.sanya = Person.objects.create(name="Sanya")
+        self.outsider = Person.objects.create(name="Kolya")
+        resp = client.post("/api/groups/", data={"user": self.petya.id, "name": "Friends",
+                                                 "members": [str(self.vasya.id), str(self.sanya.id)]},
+                           content_type="application/json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.group_id = resp.json()["id"]
+
+    def send(self, user, text):
+        resp = client.post(f"/api/groups/{self.group_id}/messages/", data={"user": user.id, "text": text})
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        return resp.json()
+
+    def history(self, user, **data):
+        return client.post(f"/api/groups/{self.group_id}/history/", data={"user": user.id, **data})
+
+    def ack(self, user, **data):
+        resp = client.post(f"/api/groups/{self.group_id}/ack/", data={"user": user.id, **data})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.json()
+
+    def test_created(self):
+        self.assertEqual(set(GroupMember.objects.filter(group_id=self.group_id).values_list("person_id", flat=True)),
+                         {self.petya.id, self.vasya.id, self.sanya.id})
+
+    def test_missing_members(self):
+        unknown = "093474d3-bcb5-4587-b4db-8e63c8a68565"
+
+        resp = client.post("/api/groups/", data={"user": self.petya.id, "name": "Others", "members": [unknown]},
+                           content_type="application/json")
+
+        self.assertEqual(resp.json()["missing"], [unknown])
+        self.assertEqual(GroupMember.objects.filter(group_id=resp.json()["id"]).count(), 1)
+
+    def test_stored_once(self):
+        message = self.send(self.petya, "Hello all")
+
+        self.assertEqual(GroupMessage.objects.count(), 1)
+        for member in (self.petya, self.vasya, self.sanya):
+            results = self.history(member).json()["results"]
+            self.assertEqual([item["id"] for item in results], [message["id"]])
+
+    @override_settings(MESSENGER_CACHES=SHARED_PERSONS)
+    def test_send_single_query(self):
+        self.send(self.vasya, "Warm up caches")
+
+        with self.assertNumQueries(1):
+            self.send(self.vasya, "Hello")
+
+    @override_settings(MESSENGER_CACHES=SHARED_PERSONS)
+    def test_history_single_query(self):
+        self.history(self.vasya)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.history(self.vasya).status_code, status.HTTP_200_OK)
+
+    @override_settings(MESSENGER_PAGE_SIZE=2)
+    def test_history_pages(self):
+        for text in ("One", "Two", "Three"):
+            self.send(self.petya, text)
+
+        first = self.history(self.sanya).json()
+        second = self.history(self.sanya, cursor=first["next"], persons=True).json()
+
+        self.assertEqual([item["text"] for item in first["results"]], ["Three", "Two"])
+        self.assertEqual([item["text"] for item in second["results"]], ["One"])
+        self.assertEqual(second["persons"], {str(self.petya.id): "Petya"})
+
+    def test_outsider(self):
+        resp = client.post(f"/api/groups/{self.group_id}/messages/", data={"user": self.outsider.id, "text": "Hi"})
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.history(self.outsider).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_add_and_leave(self):
+        resp = client.post(f"/api/groups/{self.group_id}/members/",
+                           data={"user": self.vasya.id, "members": [str(self.outsider.id)]},
+                           content_type="application/json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.history(self.outsider).status_code, status.HTTP_200_OK)
+
+        resp = client.post(f"/api/groups/{self.group_id}/leave/", data={"user": self.outsider.id})
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.history(self.outsider).status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(MESSENGER_GROUP_MAX_MEMBERS=3)
+    def test_max_members(self):
+        resp = client.post(f"/api/groups/{self.group_id}/members/",
+                           data={"user": self.petya.id, "members": [str(self.outsider.id)]},
+                           content_type="application/json")
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(GroupMember.objects.filter(person=self.outsider).exists())
+
+    def test_read_cursors(self):
+        first = self.send(self.petya, "One")
+        self.send(self.petya, "Two")
+        self.send(self.vasya, "Three")
+
+        self.assertEqual(self.ack(self.sanya, message=first["id"])["unread_count"], 2)
+        self.assertEqual(self.ack(self.vasya, message=first["id"])["unread_count"], 1)
+        state = self.ack(self.sanya)
+        self.assertEqual(state["unread_count"], 0)
+        # The cursor doesn't go back
+        self.assertEqual(self.ack(self.sanya, message=first["id"])["last_read_id"], state["last_read_id"])
+
+    def test_history_before_joining_read(self):
+        self.send(self.petya, "Before")
+        client.post(f"/api/groups/{self.group_id}/members/",
+                    data={"user": self.petya.id, "members": [str(self.outsider.id)]}, content_type="application/json")
+        self.send(self.petya, "After")
+
+        member = GroupMember.objects.get(person=self.outsider)
+        self.assertEqual(unread_count(self.group_id, self.outsider.id, member.last_read_at, member.last_read_id), 1)
+
+    @override_settings(MESSENGER_PAGE_SIZE=1)
+    def test_acknowledge_cursor(self):
+        self.send(self.petya, "One")
+        self.send(self.petya, "Two")
+        page = self.history(self.vasya).json()
+
+        self.assertEqual(self.ack(self.vasya, cursor=page["next"])["unread_count"], 0)
+        resp = client.post(f"/api/groups/{self.group_id}/ack/", data={"user": self.vasya.id, "cursor": "bad"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_acknowledge_forged_cursor(self):
+        message = self.send(self.petya, "One")
+        self.send(self.petya, "Two")
+        future = datetime(2100, 1, 1, tzinfo=timezone.utc)
+
+        forged = KeysetPaginator.encode_cursor("f", (future, uuid.UUID(message["id"])))
+        self.assertEqual(self.ack(self.vasya, cursor=forged)["unread_count"], 1)
+        unknown = KeysetPaginator.encode_cursor("f", (future, uuid.uuid4()))
+        resp = client.post(f"/api/groups/{self.group_id}/ack/", data={"user": self.vasya.id, "cursor": unknown})
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_purged_sender_detached(self):
+        self.send(self.vasya, "Bye")
+        client.post("/api/users/destroy/", data={"user": self.vasya.id})
+
+        call_command("purge_deleted", sleep=0, stdout=StringIO())
+
+        self.assertEqual(list(GroupMessage.objects.values_list("sender_id", flat=True)), [None])
+        self.assertFalse(GroupMember.objects.filter(person_id=self.vasya.id).exists())
+        self.assertTrue(Group.objects.filter(id=self.group_id).exists())
+
+
+class BenchGroupsTest(TestCase):
+    def test_bench_groups(self):
+        out = StringIO()
+        call_command("bench_groups", sizes=[3, 5], messages=2, reads=2, text_length=30, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report["sizes"]), {"3", "5"})
+        for size, result in report["sizes"].items():
+            self.assertEqual(result["fan_out_on_write"]["rows"], 2 * int(size))
+            self.assertEqual(result["fan_out_on_read"]["rows"], 2)
+            self.assertEqual(result["rows_ratio"], int(size))
+        self.assertFalse(Person.objects.exists())
@@ -0,0 +1,53 @@
+import json
+import uuid
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from messenger.models import Message
+from messenger.models.person import Person
+from messenger.utils.ids import uuid7, uuid7_time
+
+
+class Uuid7Test(SimpleTestCase):
+    def test_format(self):
+        value = uuid7()
+
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, uuid.RFC_4122)
+
+    def test_time(self):
+        moment = datetime(2026, 10, 18, 12, 30, 15, 123000, tzinfo=timezone.utc)
+
+        self.assertEqual(uuid7_time(uuid7(int(moment.timestamp() * 1000))), moment)
+        with self.assertRaises(ValueError):
+            uuid7_time(uuid.uuid4())
+
+    def test_increasing(self):
+        ids = [uuid7() for _ in range(10000)]
+
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_explicit_timestamp(self):
+        self.assertLess(uuid7(0), uuid7(1))
+        self.assertLess(uuid7(1), uuid7())
+
+
+class IdsTest(TestCase):
+    def test_default(self):
+        sender = Person.objects.create(name='Petya')
+        message = Message.objects.create(sender=sender, receiver=sender, text="Some text")
+
+        self.assertEqual(sender.id.version, 7)
+        self.assertEqual(message.id.version, 7)
+        self.assertGreater(message.id, sender.id)
+
+    def test_bench_ids(self):
+        out = StringIO()
+        call_command("bench_ids", count=20, batch_size=10, repeat=1, stdout=out)
+
+        self.assertEqual(set(json.loads(out.getvalue())), {"uuid4", "uuid7"})
+        self.assertFalse(Message.objects.exists())
@@ -0,0 +1,217 @@
+import json
+import threading
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.test import AsyncClient, Client, SimpleTestCase, TransactionTestCase, override_settings
+from rest_framework import status
+
+from messenger.models import Message
+from messenger.models.person import Person
+from messenger.services.ingestService import IngestQueue, IngestQueueFull, IngestTimeout, get_ingest_queue, \
+    ingest_message, ingest_message_async, reset_ingest_queue
+
+client = Client()
+
+INGEST = {"ENABLED": True, "QUEUE_SIZE": 100, "BATCH_SIZE": 50, "MAX_DELAY_MS": 5, "TIMEOUT": 5}
+
+
+class IngestQueueTest(SimpleTestCase):
+    def setUp(self):
+        self.batches = []
+
+    def write(self, messages):
+        if any(message.text == "bad" for message in messages):
+            raise ValueError("bad message")
+        self.batches.append([message.text for message in messages])
+        return messages
+
+    def test_batches(self):
+        ingest_queue = IngestQueue(self.write, batch_size=5, max_delay=0.2)
+        futures = [ingest_queue.submit(Message(text=str(i))) for i in range(10)]
+
+        self.assertEqual([future.result(5).text for future in futures], [str(i) for i in range(10)])
+        ingest_queue.stop()
+        self.assertEqual([len(batch) for batch in self.batches], [5, 5])
+        self.assertEqual(ingest_queue.stats(), {"queued": 0, "batches": 2, "written": 10})
+
+    def test_failed_message(self):
+        ingest_queue = IngestQueue(self.write, batch_size=3, max_delay=0.2)
+        futures = [ingest_queue.submit(Message(text=text)) for text in ("first", "bad", "last")]
+
+        with self.assertLogs("messenger.services.ingestService", "WARNING"):
+            self.assertEqual(futures[0].result(5).text, "first")
+        with self.assertRaises(ValueError):
+            futures[1].result(5)
+        self.assertEqual(futures[2].result(5).text, "last")
+        ingest_queue.stop()
+
+    def test_full(self):
+        started, release = threading.Event(), threading.Event()
+
+        def write(messages):
+            started.set()
+            release.wait(5)
+            return messages
+        ingest_queue = IngestQueue(write, queue_size=1, max_delay=0)
+        first = ingest_queue.submit(Message(text="first"))
+        started.wait(5)
+        second = ingest_queue.submit(Message(text="second"))
+
+        with self.assertRaises(IngestQueueFull):
+            ingest_queue.submit(Message(text="third"))
+        release.set()
+        self.assertEqual((first.result(5).text, second.result(5).text), ("first", "second"))
+        ingest_queue.stop()
+
+    def test_failed_batch_rewritten(self):
+        rewritten = []
+
+        def rewrite(messages):
+            rewritten.extend(message.text for message in messages)
+            return messages
+        ingest_queue = IngestQueue(self.write, batch_size=2, max_delay=0.2, rewrite=rewrite)
+        futures = [ingest_queue.submit(Message(text=text)) for text in ("first", "bad")]
+
+        with self.assertLogs("messenger.services.ingestService", "WARNING"):
+            self.assertEqual([future.result(5).text for future in futures], ["first", "bad"])
+        self.assertEqual(rewritten, ["first", "bad"])
+        ingest_queue.stop()
+
+    def test_cancelled_not_written(self):
+        started, release = threading.Event(), threading.Event()
+
+        def write(messages):
+            started.set()
+            release.wait(5)
+            self.batches.append([message.text for message in messages])
+            return messages
+        ingest_queue = IngestQueue(write, max_delay=0)
+        first = ingest_queue.submit(Message(text="first"))
+        started.wait(5)
+        second = ingest_queue.submit(Message(text="second"))
+
+        self.assertTrue(second.cancel())
+        self.assertFalse(first.cancel())
+        release.set()
+        first.result(5)
+        ingest_queue.stop()
+        self.assertEqual(self.batches, [["first"]])
+
+    @override_settings(MESSENGER_INGEST=INGEST)
+    def test_timeout(self):
+        started, release = threading.Event(), threading.Event()
+
+        def write(messages):
+            started.set()
+            release.wait(5)
+            self.batches.append([message.text for message in messages])
+            return messages
+        ingest_queue = IngestQueue(write, max_delay=0)
+        with mock.patch("messenger.services.ingestService.get_ingest_queue", return_value=ingest_queue), \
+                override_settings(MESSENGER_INGEST={**INGEST, "TIMEOUT": 0.05}):
+            ingest_queue.submit(Message(text="blocking"))
+            started.wait(5)
+            with self.assertRaises(IngestTimeout):
+                ingest_message(Message(text="sync"))
+            with self.assertRaises(IngestTimeout):
+                async_to_sync(ingest_message_async)(Message(text="async"))
+        release.set()
+        ingest_queue.stop()
+        self.assertEqual(self.batches, [["blocking"]])
+
+    def test_timeout_while_written(self):
+        release = threading.Event()
+
+        def write(messages):
+            release.wait(5)
+            self.batches.append([message.text for message in messages])
+            return messages
+        # Long enough for the writer to take the message before the request gives up waiting for it
+        with override_settings(MESSENGER_INGEST={**INGEST, "TIMEOUT": 0.2}):
+            for ingest in (ingest_message, async_to_sync(ingest_message_async)):
+                ingest_queue = IngestQueue(write, max_delay=0)
+                with mock.patch("messenger.services.ingestService.get_ingest_queue", return_value=ingest_queue):
+                    with self.assertRaisesMessage(IngestTimeout, "may have been committed"):
+                        ingest(Message(text="taken"))
+                release.set()
+                ingest_queue.stop()
+                release.clear()
+        self.assertEqual(self.batches, [["taken"], ["taken"]])
+
+    def test_stop(self):
+        ingest_queue = IngestQueue(self.write, max_delay=1)
+        future = ingest_queue.submit(Message(text="queued"))
+        ingest_queue.stop()
+
+        self.assertTrue(future.done())
+        with self.assertRaises(RuntimeError):
+            ingest_queue.submit(Message(text="late"))
+
+
+@override_settings(MESSENGER_INGEST=INGEST)
+class IngestViewTest(TransactionTestCase):
+    """
+    Messages are written by the writer thread, so test data has to be committed.
+    """
+    def setUp(self):
+        self.sender = Person.objects.create(name="Petya")
+        self.receiver = Person.objects.create(name="Vanya")
+
+    def tearDown(self):
+        reset_ingest_queue()
+
+    def send(self, text="Hello"):
+        return client.post("/api/messages/", data={"sender": self.sender.id, "receiver": self.receiver.id,
+                                                    "text": text})
+
+    def test_create(self):
+        resp = self.send()
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        message = Message.objects.get()
+        self.assertEqual(resp.json()["id"], str(message.id))
+        self.assertEqual(resp.json()["text"], "Hello")
+        self.assertEqual(get_ingest_queue().stats()["written"], 1)
+
+    def test_create_async(self):
+        resp = async_to_sync(AsyncClient().post)("/api/async/messages/", {
+            "sender": str(self.sender.id), "receiver": str(self.receiver.id), "text": "Hello",
+        }, content_type="application/json")
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.json()["id"], str(Message.objects.get().id))
+        self.assertEqual(get_ingest_queue().stats()["written"], 1)
+
+    def test_timeout(self):
+        with mock.patch("messenger.views.messageView.ingest_message", side_effect=IngestTimeout):
+            resp = self.send()
+
+        self.assertEqual(resp.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(resp["Retry-After"], "1")
+
+    def test_queue_full(self):
+        with mock.patch("messenger.views.messageView.ingest_message", side_effect=IngestQueueFull):
+            resp = self.send()
+
+        self.assertEqual(resp.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(resp["Retry-After"], "1")
+        self.assertFalse(Message.objects.exists())
+
+
+class BenchIngestTest(TransactionTestCase):
+    def test_report(self):
+        call_command("seed_messages", persons=10, messages=10, stdout=StringIO())
+        out = StringIO()
+        # Writers of SQLite in-memory test database fail instead of waiting for each other
+        call_command("bench_ingest", messages=40, senders=1, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report["direct"]["commits"], 40)
+        for mode in ("direct", "ingest", "ingest_async"):
+            self.assertEqual(report[mode]["errors"], 0)
+        self.assertLessEqual(report["ingest"]["commits"], 40)
+        self.assertLessEqual(report["ingest_async"]["commits"], 40)
+        self.assertEqual(Message.objects.count(), 130)
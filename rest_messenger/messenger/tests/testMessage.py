@@ -1,3 +1,4 @@
+import json
 from datetime import timedelta
 from typing import List, Dict, Any
 
@@ -69,13 +70,52 @@ class MessageTest(TestCase):
             timezone.now() - dateparse.parse_datetime(data["created_at"]) < timedelta(seconds=1)
         )
 
+    def test_bulk_send_text(self):
+        receivers = [self.receiver, self.interceptor]
+        with self.assertNumQueries(6):  # persons, savepoint, messages, conversations, versions, release savepoint
+            resp = client.post("/api/messages/bulk/", data={
+                "sender": self.sender.id,
+                "text": self.message_text,
+                "receivers": [receiver.id for receiver in receivers],
+            }, content_type="application/json")
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([r["status"] for r in resp.data], [status.HTTP_201_CREATED] * 2)
+        for receiver, result in zip(receivers, resp.data):
+            msg = Message.objects.get(id=result["message"]["id"])
+            self.assertEqual(str(msg.receiver_id), str(receiver.id))
+            self.assert_messages_equal([msg], [result["message"]])
+
+    def test_bulk_send_messages_to_unknown_receiver(self):
+        resp = client.post("/api/messages/bulk/", data={
+            "sender": self.sender.id,
+            "messages": [
+                {"receiver": str(self.receiver.id), "text": self.message_text},
+                {"receiver": str(self.message.id), "text": self.new_message_text},
+            ],
+        }, content_type="application/json")
+
+        self.assertEqual(resp.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([r["status"] for r in resp.data], [status.HTTP_201_CREATED, status.HTTP_400_BAD_REQUEST])
+        self.assertEqual(Message.objects.filter(sender=self.sender).count(), 2)
+
+    def test_bulk_send_as_nonexisting_user(self):
+        resp = client.post("/api/messages/bulk/", data={
+            "sender": self.message.id,
+            "text": self.message_text,
+            "receivers": [self.receiver.id],
+        }, content_type="application/json")
+
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(resp.data, {"detail": "User with given uuid doesn't exist"})
+
     def test_self_received_message(self):
         resp = client.post("/api/messages/received/", data={
             "user": self.receiver.id,
         })
 
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assert_messages_equal([self.message], resp.data)
+        self.assert_messages_equal([self.message], resp.data["results"])
 
     def test_others_received_message(self):
         resp = client.post("/api/messages/received/", data={
@@ -83,7 +123,7 @@ class MessageTest(TestCase):
         })
 
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(resp.data), 0)
+        self.assertEqual(len(resp.data["results"]), 0)
 
     def test_self_sent_message(self):
         resp = client.post("/api/messages/sent/", data={
@@ -91,7 +131,7 @@ class MessageTest(TestCase):
         })
 
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assert_messages_equal([self.message], resp.data)
+        self.assert_messages_equal([self.message], resp.data["results"])
 
     def test_others_sent_message(self):
         resp = client.post("/api/messages/sent/", data={
@@ -99,7 +139,58 @@ class MessageTest(TestCase):
         })
 
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(resp.data), 0)
+        self.assertEqual(len(resp.data["results"]), 0)
+
+    def test_received_pagination(self):
+        messages = [self.message] + [
+            Message.objects.create(sender=self.sender, receiver=self.receiver, text=f"{self.message_text} {i}")
+            for i in range(4)
+        ]
+
+        first = client.post("/api/messages/received/", data={"user": self.receiver.id, "limit": 2})
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assert_messages_equal(messages[:2], first.data["results"])
+        self.assertIsNone(first.data["previous"])
+
+        second = client.post("/api/messages/received/", data={
+            "user": self.receiver.id, "limit": 2, "cursor": first.data["next"],
+        })
+        self.assert_messages_equal(messages[2:4], second.data["results"])
+
+        last = client.post("/api/messages/received/", data={
+            "user": self.receiver.id, "limit": 2, "cursor": second.data["next"],
+        })
+        self.assert_messages_equal(messages[4:], last.data["results"])
+        self.assertIsNone(last.data["next"])
+
+        back = client.post("/api/messages/received/", data={
+            "user": self.receiver.id, "limit": 2, "cursor": second.data["previous"],
+        })
+        self.assert_messages_equal(messages[:2], back.data["results"])
+        self.assertIsNone(back.data["previous"])
+        self.assertIsNotNone(back.data["next"])
+
+    def test_invalid_cursor(self):
+        resp = client.post("/api/messages/sent/", data={"user": self.sender.id, "cursor": "garbage"})
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(resp.data, {"cursor": "Invalid cursor"})
+
+    def test_export_received_json(self):
+        messages = [self.message, Message.objects.create(sender=self.sender, receiver=self.receiver, text="More")]
+        resp = client.post("/api/messages/received/export/", data={"user": self.receiver.id})
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.streaming)
+        self.assert_messages_equal(messages, json.loads(b"".join(resp.streaming_content)))
+
+    def test_export_sent_ndjson(self):
+        resp = client.post("/api/messages/sent/export/", data={"user": self.sender.id, "format": "ndjson"})
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp["Content-Type"], "application/x-ndjson")
+        lines = b"".join(resp.streaming_content).decode().splitlines()
+        self.assert_messages_equal([self.message], [json.loads(line) for line in lines])
 
     def test_patch_self_message(self):
         resp = client.patch(f"/api/messages/{self.message.id}/", data={
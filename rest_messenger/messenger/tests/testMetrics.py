@@ -0,0 +1,103 @@
+import time
+
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from rest_framework import status
+
+from messenger.middleware import RequestTimings, current_timings, timed_render
+from messenger.models import Message
+from messenger.models.person import Person
+from messenger.utils.metrics import Histogram, get_metrics, reset_metrics
+
+client = Client()
+
+
+class HistogramTest(SimpleTestCase):
+    def test_render(self):
+        histogram = Histogram("latency_seconds", "Latency.", (0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, (("view", "ping"),))
+
+        self.assertEqual(histogram.render(), [
+            "# HELP latency_seconds Latency.",
+            "# TYPE latency_seconds histogram",
+            'latency_seconds_bucket{view="ping",le="0.1"} 1',
+            'latency_seconds_bucket{view="ping",le="1.0"} 2',
+            'latency_seconds_bucket{view="ping",le="+Inf"} 3',
+            'latency_seconds_sum{view="ping"} 5.55',
+            'latency_seconds_count{view="ping"} 3',
+        ])
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        reset_metrics()
+        self.sender = Person.objects.create(id="965c9bf5-be59-40e7-980a-d4008faba9d0", name='Petya')
+        self.receiver = Person.objects.create(id="d7970bd9-2be2-4f8b-8d9f-c2bd31fba483", name='Vanya')
+        Message.objects.create(sender=self.sender, receiver=self.receiver, text="Some text")
+
+    def test_server_timing(self):
+        resp = client.post("/api/messages/received/", data={"user": self.receiver.id})
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertIn("total;dur=", resp["Server-Timing"])
+        self.assertIn("render;dur=", resp["Server-Timing"])
+
+    def test_recorded_by_view(self):
+        client.post("/api/messages/received/", data={"user": self.receiver.id})
+
+        labels = (("view", "messenger.views.messageView.message_get_received"), ("method", "POST"))
+        metrics = get_metrics()
+        self.assertEqual(metrics.duration.count(labels), 1)
+        self.assertEqual(metrics.requests.value(labels + (("status", "200"),)), 1)
+
+    def test_metrics_endpoint(self):
+        client.get("/api/ping/")
+        resp = client.get("/api/metrics/")
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = resp.content.decode()
+        self.assertIn('messenger_requests_total{view="messenger.views.pingView.PingView",method="GET",status="200"} 1',
+                      body)
+        self.assertIn("# TYPE messenger_db_queries histogram", body)
+
+    def test_streamed(self):
+        resp = client.post("/api/messages/received/export/", data={"user": self.receiver.id})
+        labels = (("view", "messenger.views.messageView.message_export_received"), ("method", "POST"))
+        metrics = get_metrics()
+        self.assertEqual(metrics.render_duration.count(labels), 0)
+
+        body = b"".join(resp.streaming_content)
+        resp.close()
+
+        self.assertIn(b"Some text", body)
+        self.assertEqual(metrics.render_duration.count(labels), 1)
+        self.assertEqual(metrics.response_size.count(labels), 1)
+
+    def test_timed_render(self):
+        timings = RequestTimings(None)
+        token = current_timings.set(timings)
+        try:
+            for _ in range(2):
+                with timed_render():
+                    time.sleep(0.001)
+        finally:
+            current_timings.reset(token)
+
+        self.assertGreaterEqual(timings.render_time, 0.002)
+
+    @override_settings(MESSENGER_METRICS={"ENABLED": True, "SERVER_TIMING": False, "SLOW_QUERY_MS": 0})
+    def test_slow_queries(self):
+        with self.assertLogs("messenger.slow_queries", "WARNING") as logs:
+            resp = Client().post("/api/messages/received/", data={"user": self.receiver.id})
+
+        self.assertNotIn("Server-Timing", resp)
+        self.assertIn("message_get_received", logs.output[0])
+        self.assertGreater(get_metrics().slow_queries.value(
+            (("view", "messenger.views.messageView.message_get_received"),)), 0)
+
+    @override_settings(MESSENGER_METRICS={"ENABLED": False, "SERVER_TIMING": True, "SLOW_QUERY_MS": None})
+    def test_disabled(self):
+        resp = Client().get("/api/ping/")
+
+        self.assertNotIn("Server-Timing", resp)
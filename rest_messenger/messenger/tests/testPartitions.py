@@ -0,0 +1,56 @@
+from datetime import date
+
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from messenger.utils.partitions import add_months, months_between, partition_name, partition_month, \
+    plan_maintenance, create_partition_sql, is_before_row_trigger, move_trigger_sql
+
+
+class PartitionPlanTest(SimpleTestCase):
+    def test_months(self):
+        self.assertEqual(add_months(date(2020, 11, 1), 3), date(2021, 2, 1))
+        self.assertEqual(add_months(date(2020, 1, 1), -1), date(2019, 12, 1))
+        self.assertEqual(months_between(date(2020, 11, 15), date(2021, 1, 2)),
+                         [date(2020, 11, 1), date(2020, 12, 1), date(2021, 1, 1)])
+
+    def test_names(self):
+        name = partition_name("messenger_message", date(2020, 4, 1))
+
+        self.assertEqual(name, "messenger_message_p2020_04")
+        self.assertEqual(partition_month("messenger_message", name), date(2020, 4, 1))
+        self.assertIsNone(partition_month("messenger_message", "messenger_message_default"))
+        self.assertIn("FROM ('2020-04-01 00:00:00+00') TO ('2020-05-01 00:00:00+00')",
+                      create_partition_sql("messenger_message", date(2020, 4, 1)))
+
+    def test_plan(self):
+        existing = [date(2020, 1, 1), date(2020, 2, 1), date(2020, 3, 1), date(2020, 4, 1)]
+        to_create, to_detach = plan_maintenance(existing, date(2020, 4, 16), 2, 1)
+
+        self.assertEqual(to_create, [date(2020, 5, 1), date(2020, 6, 1)])
+        self.assertEqual(to_detach, [date(2020, 1, 1), date(2020, 2, 1)])
+
+    def test_plan_without_retention(self):
+        _, to_detach = plan_maintenance([date(2000, 1, 1)], date(2020, 4, 16), 0, None)
+
+        self.assertEqual(to_detach, [])
+
+    def test_trigger_moved_to_partition(self):
+        definition = "CREATE TRIGGER message_search_vector_update BEFORE INSERT OR UPDATE OF text " \
+                     "ON public.messenger_message FOR EACH ROW EXECUTE FUNCTION messenger_message_search_vector()"
+
+        self.assertTrue(is_before_row_trigger(definition))
+        self.assertFalse(is_before_row_trigger(definition.replace("BEFORE", "AFTER")))
+        self.assertEqual(move_trigger_sql(definition, "messenger_message", "messenger_message_p2020_04"),
+                         definition.replace("public.messenger_message", '"messenger_message_p2020_04"'))
+        with self.assertRaises(ValueError):
+            move_trigger_sql(definition, "messenger_conversation", "messenger_conversation_p2020_04")
+
+
+class PartitionCommandTest(TestCase):
+    def test_requires_postgresql(self):
+        if connection.vendor == "postgresql":
+            self.skipTest("Runs against other databases only")
+        with self.assertRaises(CommandError):
+            call_command("partition_messages")
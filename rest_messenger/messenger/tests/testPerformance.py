@@ -0,0 +1,277 @@
+import json
+import os
+
+from asgiref.sync import async_to_sync
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, tag
+from rest_framework import status
+
+from messenger.management.commands.bench_serializers import make_messages, as_rows, measure, SERIALIZERS
+from messenger.middleware import capture_queries
+from messenger.models import GroupMessage, Message
+from messenger.models.person import Person
+from messenger.services.groupService import add_members, create_group
+from messenger.services.messageService import send_messages
+from messenger.tests.runner import BENCHMARK_TAG
+from messenger.utils.cache import reset_lookup_caches
+from messenger.utils.executor import reset_db_executor
+
+client = Client()
+
+# Numbers of messages between the persons the endpoints are requested at
+DATASET_SIZES = (1, 20, 100)
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "serializers.json")
+
+
+class QueryCountMixin:
+    """
+    Pin number of queries of every endpoint, it must not depend on the number of messages.
+    Person lookup cache is cleared before every request, so person is always queried.
+    Queries are counted on every database, so the pins hold with shards and replicas.
+    """
+    def setUp(self):
+        self.sender = Person.objects.create(id="965c9bf5-be59-40e7-980a-d4008faba9d0", name='Petya')
+        self.receiver = Person.objects.create(id="d7970bd9-2be2-4f8b-8d9f-c2bd31fba483", name='Vanya')
+        self.group, _ = create_group("Friends", self.sender.id, [self.receiver.id])
+
+    def grow(self, size: int) -> None:
+        missing = size - Message.objects.count()
+        send_messages([Message(sender=self.sender, receiver=self.receiver, text=f"Message {i}")
+                       for i in range(missing)] +
+                      [Message(sender=self.receiver, receiver=self.sender, text=f"Reply {i}")
+                       for i in range(missing)])
+        GroupMessage.objects.bulk_create([GroupMessage(group=self.group, sender=self.sender, text=f"Message {i}")
+                                          for i in range(size - GroupMessage.objects.count())])
+
+    def assert_queries(self, expected: int, request, expected_status=status.HTTP_200_OK, prepare=None):
+        """
+        :param request: callable doing the request, called once per dataset size
+        :param prepare: callable run before every request and not counted, its result is passed to request
+        """
+        for size in DATASET_SIZES:
+            with self.subTest(size=size):
+                self.grow(size)
+                args = (prepare(),) if prepare is not None else ()
+                reset_lookup_caches()
+                with capture_queries() as queries:
+                    response = request(*args)
+                    if response.streaming:
+                        b"".join(response.streaming_content)
+                self.assertEqual(response.status_code, expected_status)
+                self.assertEqual(len(queries), expected, "\n".join(query["sql"] for query in queries))
+
+
+class QueryCountTest(QueryCountMixin, TestCase):
+    def test_ping(self):
+        self.assert_queries(0, lambda: client.get("/api/ping/"))
+
+    def test_metrics(self):
+        self.assert_queries(0, lambda: client.get("/api/metrics/"))
+
+    def test_user_create(self):
+        self.assert_queries(1, lambda: client.post("/api/users/", {"name": "Sanya"}),
+                            status.HTTP_201_CREATED)
+
+    def test_user_retrieve(self):
+        self.assert_queries(1, lambda: client.get(f"/api/users/{self.sender.id}/"))
+
+    def test_message_create(self):
+        # sender, receiver, savepoint, message, conversations, versions, release savepoint
+        self.assert_queries(7, lambda: client.post("/api/messages/", {
+            "text": "Some text", "sender": self.sender.id, "receiver": self.receiver.id
+        }), status.HTTP_201_CREATED)
+
+    def test_message_update(self):
+        message = Message.objects.create(sender=self.sender, receiver=self.receiver, text="Some text")
+        # message, sender, savepoint, message, conversations, versions, release savepoint
+        self.assert_queries(7, lambda: client.patch(f"/api/messages/{message.id}/", {
+            "sender": self.sender.id, "text": "Some other text"
+        }, content_type="application/json"))
+
+    def test_message_bulk(self):
+        # persons, savepoint, messages, conversations, versions, release savepoint
+        self.assert_queries(6, lambda: client.post("/api/messages/bulk/", {
+            "sender": self.sender.id, "text": "Some text", "receivers": [self.receiver.id]
+        }, content_type="application/json"), status.HTTP_201_CREATED)
+
+    def test_received(self):
+        self.assert_queries(2, lambda: client.post("/api/messages/received/", {"user": self.receiver.id}))
+
+    def test_sent(self):
+        self.assert_queries(2, lambda: client.post("/api/messages/sent/", {"user": self.sender.id}))
+
+    def test_received_export(self):
+        self.assert_queries(2, lambda: client.post("/api/messages/received/export/", {"user": self.receiver.id}))
+
+    def test_sent_export(self):
+        self.assert_queries(2, lambda: client.post("/api/messages/sent/export/", {"user": self.sender.id}))
+
+    def test_sync(self):
+        # person, messages, tombstones
+        self.assert_queries(3, lambda: client.post("/api/messages/sync/", {"user": self.receiver.id}))
+
+    def test_search(self):
+        self.assert_queries(2, lambda: client.post("/api/messages/search/", {
+            "user": self.receiver.id, "query": "message"
+        }))
+
+    def test_destroy(self):
+        def destroy():
+            # The last message of the conversation, so the previous one takes its place
+            message, = send_messages([Message(sender=self.sender, receiver=self.receiver, text="Some text")])
+            reset_lookup_caches()
+            with capture_queries() as queries:
+                response = client.post(f"/api/messages/destroy/{message.id}/", {"user": self.sender.id})
+            return response, [query["sql"] for query in queries]
+
+        for size in DATASET_SIZES:
+            with self.subTest(size=size):
+                self.grow(size)
+                response, queries = destroy()
+                self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+                # person, message, savepoint, tombstone, unread counter, conversations, previous message,
+                # conversations update, versions, delete, release savepoint
+                self.assertEqual(len(queries), 11, "\n".join(queries))
+
+    def test_inbox(self):
+        self.assert_queries(2, lambda: client.post("/api/conversations/", {"user": self.receiver.id}))
+
+    def test_acknowledge(self):
+        # person, savepoint, own side lock, own side, peer side, release savepoint, conversation
+        self.assert_queries(7, lambda: client.post("/api/conversations/ack/", {
+            "user": self.receiver.id, "peer": self.sender.id
+        }))
+
+    def test_user_batch(self):
+        self.assert_queries(1, lambda: client.post("/api/users/batch/", {
+            "ids": [str(self.sender.id), str(self.receiver.id)]
+        }, content_type="application/json"))
+
+    def test_user_search(self):
+        self.assert_queries(1, lambda: client.post("/api/users/search/", {"query": "Va"}))
+
+    def test_dialog(self):
+        self.assert_queries(2, lambda: client.post("/api/messages/dialog/", {
+            "user": self.receiver.id, "peer": self.sender.id
+        }))
+
+    def test_group_create(self):
+        # person, savepoint, group, lock, persons, members, member count, memberships, release savepoint
+        self.assert_queries(9, lambda: client.post("/api/groups/", {
+            "user": self.sender.id, "name": "Others", "members": [str(self.receiver.id)]
+        }, content_type="application/json"), status.HTTP_201_CREATED)
+
+    def test_group_add_members(self):
+        # person, membership, savepoint, lock, persons, members, member count, memberships, release savepoint
+        self.assert_queries(9, lambda person: client.post(f"/api/groups/{self.group.id}/members/", {
+            "user": self.sender.id, "members": [str(person.id)]
+        }, content_type="application/json"), prepare=lambda: Person.objects.create(name="Sanya"))
+
+    def test_group_leave(self):
+        def join():
+            person = Person.objects.create(name="Sanya")
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                add_members(self.group.id, [person.id])
+            return person
+
+        # person, membership delete
+        self.assert_queries(2, lambda person: client.post(f"/api/groups/{self.group.id}/leave/", {
+            "user": person.id
+        }), status.HTTP_204_NO_CONTENT, prepare=join)
+
+    def test_group_send(self):
+        # person, membership, message
+        self.assert_queries(3, lambda: client.post(f"/api/groups/{self.group.id}/messages/", {
+            "user": self.receiver.id, "text": "Some text"
+        }), status.HTTP_201_CREATED)
+
+    def test_group_history(self):
+        # person, membership, messages
+        self.assert_queries(3, lambda: client.post(f"/api/groups/{self.group.id}/history/", {
+            "user": self.receiver.id
+        }))
+
+    def test_group_acknowledge(self):
+        # person, membership, latest message, read cursor update, read cursor, unread count
+        self.assert_queries(6, lambda: client.post(f"/api/groups/{self.group.id}/ack/", {
+            "user": self.receiver.id
+        }))
+
+
+class AsyncQueryCountTest(QueryCountMixin, TransactionTestCase):
+    """
+    Database work of async views runs in other threads, so test data has to be committed.
+    """
+    def tearDown(self):
+        reset_db_executor()
+
+    def test_ping(self):
+        self.assert_queries(0, lambda: async_to_sync(self.async_client.get)("/api/async/ping/"))
+
+    def test_user_retrieve(self):
+        self.assert_queries(1, lambda: async_to_sync(self.async_client.get)(f"/api/async/users/{self.sender.id}/"))
+
+    def test_message_create(self):
+        # sender, receiver, begin, message, conversations, versions
+        self.assert_queries(6, lambda: async_to_sync(self.async_client.post)("/api/async/messages/", {
+            "text": "Some text", "sender": str(self.sender.id), "receiver": str(self.receiver.id)
+        }, content_type="application/json"), status.HTTP_201_CREATED)
+
+    def test_received(self):
+        self.assert_queries(2, lambda: async_to_sync(self.async_client.post)("/api/async/messages/received/", {
+            "user": str(self.receiver.id)
+        }, content_type="application/json"))
+
+    def test_sent(self):
+        self.assert_queries(2, lambda: async_to_sync(self.async_client.post)("/api/async/messages/sent/", {
+            "user": str(self.sender.id)
+        }, content_type="application/json"))
+
+
+def calibration(messages, rows):  # noqa
+    """
+    Plain Python work of the same shape, serializer timings are relative to it,
+    which makes baselines roughly independent of the machine.
+    """
+    return json.dumps([{"id": str(row[0]), "text": row[1], "sender": str(row[2]), "receiver": str(row[3]),
+                        "created_at": row[4].isoformat(), "updated_at": row[5].isoformat()} for row in rows]).encode()
+
+
+@tag(BENCHMARK_TAG)
+class SerializerBaselineTest(SimpleTestCase):
+    """
+    Time of serializer paths relative to calibration must stay within tolerance of the stored baseline.
+    Set MESSENGER_UPDATE_BASELINES=1 to store current ratios instead. Left out unless run with --tag benchmark.
+    """
+    SIZE = 1000
+    REPEAT = 7
+    ROUNDS = 3
+
+    def ratio(self, function, messages, rows) -> float:
+        """
+        Best ratio of rounds, calibration is measured next to the function, so both see the same machine load.
+        """
+        return min(measure(function, messages, rows, self.REPEAT) / measure(calibration, messages, rows, self.REPEAT)
+                   for _ in range(self.ROUNDS))
+
+    def test_serializers(self):
+        with open(BASELINE_PATH) as baseline_file:
+            baseline = json.load(baseline_file)
+        messages = make_messages(self.SIZE)
+        rows = as_rows(messages)
+
+        ratios = {name: self.ratio(function, messages, rows) for name, function in SERIALIZERS.items()}
+
+        if os.getenv("MESSENGER_UPDATE_BASELINES"):
+            baseline["ratios"] = {name: round(ratio, 2) for name, ratio in ratios.items()}
+            with open(BASELINE_PATH, "w") as baseline_file:
+                json.dump(baseline, baseline_file, indent=2)
+                baseline_file.write("\n")
+            return
+
+        for name, ratio in ratios.items():
+            with self.subTest(serializer=name):
+                limit = baseline["ratios"][name] * (1 + baseline["tolerance"])
+                self.assertLessEqual(ratio, limit,
+                                     f"{name} takes {ratio:.2f}x of calibration, baseline allows {limit:.2f}x")
@@ -31,3 +31,14 @@ class PersonTest(TestCase):
 
         self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
         self.assertEqual(resp.data, {"detail": "Not found."})
+
+    def test_delete_not_allowed(self):
+        for path in ("/api/users/", f"/api/users/{self.person.id}/"):
+            resp = client.delete(path, data={"user": str(self.person.id)}, content_type="application/json")
+            self.assertEqual(resp.status_code, status.HTTP_405_METHOD_NOT_ALLOWED, path)
+        self.assertTrue(Person.objects.filter(id=self.person.id).exists())
+
+    def test_schema_summaries(self):
+        paths = client.get("/api/swagger/?format=openapi").json()["paths"]
+        self.assertEqual(paths["/users/"]["post"]["summary"], "Create new Person")
+        self.assertEqual(paths["/users/{id}/"]["get"]["summary"], "Get Person info")
@@ -0,0 +1,105 @@
+import uuid
+
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+
+from messenger.models import Message
+from messenger.models.person import Person
+from messenger.serializers.personSerializers import PersonBatchSerializer
+from messenger.tests.testCache import SHARED_PERSONS
+from messenger.utils.cache import get_lookup_cache
+
+client = Client()
+
+
+class PersonBatchTest(TestCase):
+    def setUp(self):
+        get_lookup_cache("persons").clear()
+        self.petya = Person.objects.create(name="Petya")
+        self.vasya = Person.objects.create(name="Vasya")
+
+    def batch(self, ids):
+        resp = client.post("/api/users/batch/", data={"ids": ids}, content_type="application/json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.json()
+
+    def test_single_query(self):
+        unknown = str(uuid.uuid4())
+
+        with self.assertNumQueries(1):
+            data = self.batch([str(self.vasya.id), unknown, str(self.petya.id)])
+
+        self.assertEqual(data["results"], [{"id": str(self.vasya.id), "name": "Vasya"},
+                                           {"id": str(self.petya.id), "name": "Petya"}])
+        self.assertEqual(data["missing"], [unknown])
+
+    @override_settings(MESSENGER_CACHES=SHARED_PERSONS)
+    def test_cached(self):
+        self.batch([str(self.petya.id)])
+
+        with self.assertNumQueries(0):
+            data = self.batch([str(self.petya.id), str(self.petya.id)])
+        self.assertEqual(data["results"], [{"id": str(self.petya.id), "name": "Petya"}])
+
+    def test_deleted_through_another_worker(self):
+        self.batch([str(self.petya.id)])
+        # Cache of this worker isn't told about the deletion
+        Person.objects.filter(id=self.petya.id).update(deleted_at=timezone.now())
+
+        self.assertEqual(self.batch([str(self.petya.id)])["results"], [])
+
+    def test_limit(self):
+        limit = PersonBatchSerializer().fields["ids"].max_length
+
+        resp = client.post("/api/users/batch/", data={"ids": [str(uuid.uuid4()) for _ in range(limit + 1)]},
+                           content_type="application/json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_embedded_in_messages(self):
+        Message.objects.create(sender=self.petya, receiver=self.vasya, text="Hello")
+
+        resp = client.post("/api/messages/received/", data={"user": self.vasya.id, "persons": True})
+
+        self.assertEqual(resp.json()["persons"], {str(self.petya.id): "Petya", str(self.vasya.id): "Vasya"})
+        resp = client.post("/api/messages/received/", data={"user": self.vasya.id})
+        self.assertNotIn("persons", resp.json())
+
+
+class PersonSearchTest(TestCase):
+    def setUp(self):
+        for name in ("Alexey", "alexandr", "Alina", "Sasha Alexeev"):
+            Person.objects.create(name=name)
+
+    def search(self, **data):
+        resp = client.post("/api/users/search/", data=data)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.json()
+
+    def test_prefix(self):
+        data = self.search(query="ALEX")
+
+        self.assertEqual([person["name"] for person in data["results"]], ["alexandr", "Alexey"])
+        self.assertIsNone(data["next"])
+
+    @override_settings(MESSENGER_PAGE_SIZE=2)
+    def test_pages(self):
+        first = self.search(query="Al")
+        second = self.search(query="Al", offset=first["next"])
+
+        self.assertEqual(first["next"], 2)
+        self.assertEqual([person["name"] for person in first["results"] + second["results"]],
+                         ["alexandr", "Alexey", "Alina"])
+        self.assertIsNone(second["next"])
+
+    def test_fuzzy(self):
+        data = self.search(query="alexe", fuzzy=True)
+
+        names = [person["name"] for person in data["results"]]
+        self.assertIn("Alexey", names)
+        self.assertIn("Sasha Alexeev", names)
+        self.assertNotIn("Alina", names)
+
+    def test_query_required(self):
+        resp = client.post("/api/users/search/", data={})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,240 @@
+import threading
+
+import psycopg2
+from django.test import SimpleTestCase
+from psycopg2 import extensions
+
+from messenger.db.pooled import close_pools, get_pool, pool_stats
+from messenger.db.pooled.pool import ConnectionPool, PoolTimeout
+from messenger.utils.metrics import get_metrics
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql):
+        if self.connection.broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        if sql == "DISCARD ALL" and not self.connection.autocommit:
+            raise psycopg2.InternalError("DISCARD ALL cannot run inside a transaction block")
+        self.connection.queries.append(sql)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.autocommit = False
+        self.broken = False
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.isolation_level = extensions.ISOLATION_LEVEL_READ_COMMITTED
+        self.queries = []
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def get_transaction_status(self):
+        return self.status
+
+    def close(self):
+        self.closed = 1
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def setUp(self):
+        self.opened = []
+        self.timer = FakeTimer()
+
+    def connect(self):
+        connection = FakeConnection()
+        self.opened.append(connection)
+        return connection
+
+    def pool(self, **kwargs):
+        return ConnectionPool(self.connect, timer=self.timer, **kwargs)
+
+    def test_reuse(self):
+        pool = self.pool(max_size=2)
+        first = pool.checkout()
+        second = pool.checkout()
+        pool.checkin(first)
+        pool.checkin(second)
+
+        self.assertIs(pool.checkout(), second)
+        self.assertEqual(len(self.opened), 2)
+
+    def test_min_size(self):
+        pool = self.pool(min_size=3, max_size=5)
+        pool.checkout()
+
+        self.assertEqual(len(self.opened), 3)
+        self.assertEqual(pool.stats()["idle"], 2)
+
+    def test_timeout(self):
+        pool = self.pool(max_size=1, timeout=0)
+        pool.checkout()
+
+        with self.assertRaises(PoolTimeout):
+            pool.checkout()
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+    def test_wait(self):
+        pool = ConnectionPool(self.connect, max_size=1, timeout=5)
+        connection = pool.checkout()
+        threading.Timer(0.05, pool.checkin, [connection]).start()
+
+        self.assertIs(pool.checkout(), connection)
+        self.assertGreater(pool.stats()["wait_seconds"], 0)
+
+    def test_pre_ping(self):
+        pool = self.pool(ping_idle=5)
+        connection = pool.checkout()
+        pool.checkin(connection)
+        connection.broken = True
+        self.timer.now = 5
+
+        fresh = pool.checkout()
+        self.assertIsNot(fresh, connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()["failed_pings"], 1)
+
+    def test_no_pre_ping(self):
+        pool = self.pool(pre_ping=False)
+        pool.checkin(pool.checkout())
+        self.timer.now = 60
+
+        self.assertNotIn("SELECT 1", pool.checkout().queries)
+
+    def test_recently_used_not_pinged(self):
+        pool = self.pool(ping_idle=5)
+        connection = pool.checkout()
+        pool.checkin(connection)
+        self.timer.now = 4
+
+        self.assertIs(pool.checkout(), connection)
+        self.assertNotIn("SELECT 1", connection.queries)
+
+    def test_session_reset(self):
+        pool = self.pool()
+        connection = pool.checkout()
+        pool.checkin(connection)
+
+        self.assertEqual(connection.queries, ["DISCARD ALL"])
+        self.assertFalse(connection.autocommit)
+        connection.broken = True
+        pool.checkin(pool.checkout())
+        self.assertTrue(connection.closed)
+
+    def test_no_session_reset(self):
+        pool = self.pool(reset_sql=None)
+        connection = pool.checkout()
+        pool.checkin(connection)
+
+        self.assertEqual(connection.queries, [])
+
+    def test_recycle(self):
+        pool = self.pool(recycle=60)
+        connection = pool.checkout()
+        pool.checkin(connection)
+        self.timer.now = 61
+
+        self.assertIsNot(pool.checkout(), connection)
+        self.assertTrue(connection.closed)
+
+    def test_max_idle(self):
+        pool = self.pool(min_size=1, max_size=3, max_idle=60)
+        connections = [pool.checkout() for _ in range(3)]
+        for connection in connections:
+            pool.checkin(connection)
+        self.timer.now = 61
+        pool.checkin(pool.checkout())
+
+        self.assertEqual(pool.stats()["size"], 1)
+
+    def test_rollback(self):
+        pool = self.pool()
+        connection = pool.checkout()
+        connection.status = extensions.TRANSACTION_STATUS_INTRANS
+        pool.checkin(connection)
+
+        self.assertEqual(connection.rollbacks, 1)
+        self.assertIs(pool.checkout(), connection)
+
+    def test_closed_checkin(self):
+        pool = self.pool(max_size=1)
+        connection = pool.checkout()
+        connection.closed = 2
+        pool.checkin(connection)
+
+        self.assertIsNot(pool.checkout(), connection)
+        self.assertEqual(pool.stats()["closed"], 1)
+
+    def test_failed_connect(self):
+        def connect():
+            raise psycopg2.OperationalError("could not connect to server")
+        pool = ConnectionPool(connect, max_size=1, timeout=0)
+
+        for _ in range(2):
+            with self.assertRaises(psycopg2.OperationalError):
+                pool.checkout()
+        self.assertEqual(pool.stats()["size"], 0)
+
+    def test_stats(self):
+        pool = self.pool(max_size=4)
+        connection = pool.checkout()
+        pool.checkout()
+        pool.checkin(connection)
+
+        stats = pool.stats()
+        self.assertEqual((stats["size"], stats["idle"], stats["in_use"], stats["max_size"]), (2, 1, 1, 4))
+        self.assertEqual((stats["checkouts"], stats["created"]), (2, 2))
+
+    def test_close(self):
+        pool = self.pool(max_size=2)
+        connection = pool.checkout()
+        pool.checkin(connection)
+        pool.close()
+
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()["size"], 0)
+
+
+class PoolRegistryTest(SimpleTestCase):
+    settings_dict = {"NAME": "messenger", "HOST": "db", "PORT": "5432", "USER": "messenger",
+                     "POOL": {"MIN_SIZE": 1, "MAX_SIZE": 3}}
+
+    def tearDown(self):
+        close_pools()
+
+    def test_registry(self):
+        pool = get_pool("pool-test", self.settings_dict, FakeConnection)
+
+        self.assertIs(get_pool("pool-test", self.settings_dict, None), pool)
+        self.assertIsNot(get_pool("pool-test", {**self.settings_dict, "NAME": "test_messenger"}, None), pool)
+        self.assertEqual((pool.min_size, pool.max_size), (1, 3))
+        self.assertEqual(pool.reset_sql, "DISCARD ALL")
+
+    def test_stats(self):
+        get_pool("pool-test", self.settings_dict, FakeConnection).checkout()
+
+        self.assertEqual(pool_stats()["pool-test"]["in_use"], 1)
+        self.assertIn('messenger_db_pool_connections{database="pool-test"} 1\n', get_metrics().render())
@@ -0,0 +1,192 @@
+import random
+import threading
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, OperationalError
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from rest_framework import status
+
+from messenger.db.replicas import ReplicaRouter, ReplicaSet, check_pins_cache, get_replicas, is_pinned, \
+    pin_to_primary, use_replicas
+from messenger.models import Message
+from messenger.models.person import Person
+from messenger.utils.cache import get_lookup_cache
+
+client = Client()
+
+REPLICAS = {"ALIASES": ["replica1", "replica2"], "MAX_LAG": 2, "CHECK_INTERVAL": 1, "STICKINESS": 10}
+
+
+class ReplicaSetTest(SimpleTestCase):
+    def setUp(self):
+        self.now = 0
+        self.lags = {"replica1": 0.5, "replica2": 0.1}
+        patcher = mock.patch("messenger.db.replicas.measure_lag", side_effect=self.measure)
+        self.measure_lag = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.replicas = ReplicaSet(["replica1", "replica2"], max_lag=2, check_interval=1,
+                                   timer=lambda: self.now, rng=random.Random(0), background=False)
+
+    def measure(self, alias):
+        lag = self.lags[alias]
+        if lag is None:
+            raise OperationalError("could not connect to server")
+        return lag
+
+    def test_balanced(self):
+        chosen = {self.replicas.choose() for _ in range(50)}
+
+        self.assertEqual(chosen, {"replica1", "replica2"})
+
+    def test_lagging_left_out(self):
+        self.lags["replica1"] = 3
+
+        self.assertEqual(self.replicas.healthy(), ["replica2"])
+
+    def test_unavailable_left_out(self):
+        self.lags["replica2"] = None
+
+        with self.assertLogs("messenger.db.replicas", "WARNING"):
+            self.assertEqual(self.replicas.healthy(), ["replica1"])
+        self.assertEqual(self.replicas.stats()["replica2"], {"lag_seconds": None, "healthy": 0})
+
+    def test_primary_fallback(self):
+        self.lags = {"replica1": None, "replica2": 10}
+
+        with self.assertLogs("messenger.db.replicas", "WARNING"):
+            self.assertEqual(self.replicas.choose(), DEFAULT_DB_ALIAS)
+
+    def test_check_interval(self):
+        self.replicas.healthy()
+        self.lags["replica1"] = 3
+        self.replicas.healthy()
+        self.assertEqual(self.measure_lag.call_count, 2)
+
+        self.now = 1
+        self.assertEqual(self.replicas.healthy(), ["replica2"])
+        self.assertEqual(self.measure_lag.call_count, 4)
+
+    def test_age_counts_as_lag(self):
+        self.lags["replica1"] = 1.5
+        self.replicas.healthy()
+
+        self.now = 0.9
+        self.assertEqual(self.replicas.healthy(), ["replica2"])
+
+    def test_background(self):
+        release = threading.Event()
+        measure = self.measure_lag.side_effect
+        self.measure_lag.side_effect = lambda alias: release.wait(5) and measure(alias)
+        replicas = ReplicaSet(["replica1", "replica2"], max_lag=2, check_interval=1, timer=lambda: self.now)
+
+        with mock.patch("messenger.db.replicas.connections") as connections:
+            # Requests don't wait for the measurement
+            self.assertEqual(replicas.choose(), DEFAULT_DB_ALIAS)
+            release.set()
+            for thread in threading.enumerate():
+                if thread.name == "messenger-replica-lag":
+                    thread.join(5)
+        self.assertEqual(connections.__getitem__.return_value.close.call_count, 2)
+        self.assertEqual(replicas.healthy(), ["replica1", "replica2"])
+
+
+@override_settings(MESSENGER_REPLICAS=REPLICAS)
+class ReplicaRouterTest(SimpleTestCase):
+    person_id = "965c9bf5-be59-40e7-980a-d4008faba9d0"
+
+    def setUp(self):
+        get_lookup_cache("primary_pins").clear()
+        patcher = mock.patch("messenger.db.replicas.measure_lag", return_value=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        get_replicas().refresh(wait=True)
+        self.router = ReplicaRouter()
+
+    def test_reads_outside_block(self):
+        self.assertIsNone(self.router.db_for_read(Message))
+
+    def test_reads_within_block(self):
+        with use_replicas(self.person_id) as alias:
+            self.assertIn(alias, REPLICAS["ALIASES"])
+            self.assertEqual(self.router.db_for_read(Message), alias)
+            self.assertEqual(self.router.db_for_write(Message), DEFAULT_DB_ALIAS)
+        self.assertIsNone(self.router.db_for_read(Message))
+
+    def test_pinned(self):
+        pin_to_primary(self.person_id.upper())
+
+        self.assertTrue(is_pinned(self.person_id))
+        with use_replicas(self.person_id) as alias:
+            self.assertEqual(alias, DEFAULT_DB_ALIAS)
+
+    def test_invalid_person(self):
+        pin_to_primary("not uuid")
+
+        with use_replicas("not uuid") as alias:
+            self.assertIn(alias, REPLICAS["ALIASES"])
+
+    def test_no_migrations_on_replicas(self):
+        self.assertFalse(self.router.allow_migrate("replica1", "messenger"))
+        self.assertIsNone(self.router.allow_migrate(DEFAULT_DB_ALIAS, "messenger"))
+
+    @override_settings(MESSENGER_REPLICAS={**REPLICAS, "ALIASES": []})
+    def test_without_replicas(self):
+        pin_to_primary(self.person_id)
+
+        self.assertFalse(is_pinned(self.person_id))
+        with use_replicas(self.person_id) as alias:
+            self.assertEqual(alias, DEFAULT_DB_ALIAS)
+
+
+@override_settings(MESSENGER_REPLICAS=REPLICAS)
+class StickinessTest(TestCase):
+    def setUp(self):
+        get_lookup_cache("primary_pins").clear()
+        self.sender = Person.objects.create(name="Petya")
+        self.receiver = Person.objects.create(name="Vasya")
+
+    def test_pinned_on_create(self):
+        resp = client.post("/api/messages/", data={"sender": self.sender.id, "receiver": self.receiver.id,
+                                                    "text": "Hello"})
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(is_pinned(self.sender.id))
+        self.assertFalse(is_pinned(self.receiver.id))
+
+    def test_pinned_on_destroy(self):
+        message = Message.objects.create(sender=self.sender, receiver=self.receiver, text="Hello")
+
+        resp = client.post(f"/api/messages/destroy/{message.id}/", data={"user": self.sender.id})
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertTrue(is_pinned(self.sender.id))
+
+    def test_pinned_on_person_create(self):
+        resp = client.post("/api/users/", data={"name": "Kolya"})
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(is_pinned(resp.json()["id"]))
+
+
+class PinsCacheCheckTest(SimpleTestCase):
+    @override_settings(MESSENGER_REPLICAS=REPLICAS, MESSENGER_CACHES={
+        "primary_pins": {"BACKEND": "messenger.utils.cache.LocalLookupCache"},
+    })
+    def test_local_pins_refused(self):
+        with self.assertRaises(ImproperlyConfigured):
+            check_pins_cache()
+
+    @override_settings(MESSENGER_REPLICAS=REPLICAS, MESSENGER_CACHES={
+        "primary_pins": {"BACKEND": "messenger.utils.cache.DjangoLookupCache", "OPTIONS": {"alias": "shared"}},
+    }, CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "shared": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": "/tmp/pins"},
+    })
+    def test_shared_pins(self):
+        check_pins_cache()
+
+    @override_settings(MESSENGER_REPLICAS={**REPLICAS, "ALIASES": []}, MESSENGER_CACHES={
+        "primary_pins": {"BACKEND": "messenger.utils.cache.LocalLookupCache"},
+    })
+    def test_without_replicas(self):
+        check_pins_cache()
@@ -0,0 +1,64 @@
+from django.test import Client, TestCase
+from rest_framework import status
+
+from messenger.models import Message
+from messenger.models.person import Person
+
+client = Client()
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.sender = Person.objects.create(id="965c9bf5-be59-40e7-980a-d4008faba9d0", name='Petya')
+        self.receiver = Person.objects.create(id="d7970bd9-2be2-4f8b-8d9f-c2bd31fba483", name='Vanya')
+        self.interceptor = Person.objects.create(id="093474d3-bcb5-4587-b4db-8e63c8a68565", name='Sanya')
+        self.pizza = Message.objects.create(sender=self.sender, receiver=self.receiver, text="Let's order pizza tonight")
+        self.reply = Message.objects.create(sender=self.receiver, receiver=self.sender, text="Pizza sounds great")
+        self.other = Message.objects.create(sender=self.sender, receiver=self.receiver, text="See you tomorrow")
+        self.foreign = Message.objects.create(sender=self.interceptor, receiver=self.sender, text="Pizza is ready")
+
+    def search(self, user, **data):
+        resp = client.post("/api/messages/search/", data={"user": user.id, **data})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.data
+
+    def test_search(self):
+        data = self.search(self.receiver, query="pizza")
+
+        self.assertEqual({m["id"] for m in data["results"]}, {str(self.pizza.id), str(self.reply.id)})
+        self.assertIsNone(data["next"])
+        self.assertEqual(set(data["results"][0]), {"id", "text", "sender", "receiver", "created_at", "updated_at",
+                                                   "rank", "headline"})
+
+    def test_all_words_match(self):
+        data = self.search(self.receiver, query="pizza tonight")
+
+        self.assertEqual([m["id"] for m in data["results"]], [str(self.pizza.id)])
+
+    def test_edited_text(self):
+        self.other.text = "Pizza tomorrow"
+        self.other.save()
+
+        data = self.search(self.receiver, query="pizza")
+
+        self.assertEqual(len(data["results"]), 3)
+
+    def test_pages(self):
+        first = self.search(self.receiver, query="pizza", limit=1)
+        second = self.search(self.receiver, query="pizza", limit=1, offset=first["next"])
+
+        self.assertEqual(first["next"], 1)
+        self.assertIsNone(second["next"])
+        self.assertEqual({first["results"][0]["id"], second["results"][0]["id"]},
+                         {str(self.pizza.id), str(self.reply.id)})
+
+    def test_empty_query(self):
+        resp = client.post("/api/messages/search/", data={"user": self.receiver.id, "query": " "})
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unknown_person(self):
+        resp = client.post("/api/messages/search/", data={"user": "00000000-0000-0000-0000-000000000000",
+                                                          "query": "pizza"})
+
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
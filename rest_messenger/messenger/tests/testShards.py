@@ -0,0 +1,279 @@
+import uuid
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from rest_framework import status
+
+from messenger.db.shards import ShardMap, ShardRouter, bucket_of, fill_buckets, person_shard, plan_moves, use_shard
+from messenger.models import Conversation, GroupMessage, Message, MessageTombstone, ShardBucket
+from messenger.models.person import Person
+from messenger.services.messageService import deliver_messages
+
+client = Client()
+
+SHARDS = {"ALIASES": ["default", "shard1"], "VIRTUAL_SHARDS": 1024, "REFRESH": 0}
+
+
+class ShardMapTest(SimpleTestCase):
+    person_id = "965c9bf5-be59-40e7-980a-d4008faba9d0"
+
+    def setUp(self):
+        self.now = 0
+        self.loads = 0
+        self.assignments = {}
+        self.shard_map = ShardMap(["default", "shard1"], buckets=16, refresh=5, load=self.load,
+                                  timer=lambda: self.now)
+
+    def load(self):
+        self.loads += 1
+        return dict(self.assignments)
+
+    def test_bucket_stable(self):
+        bucket = bucket_of(self.person_id, 16)
+
+        self.assertEqual(bucket_of(self.person_id.upper(), 16), bucket)
+        self.assertEqual(bucket_of(uuid.UUID(self.person_id), 16), bucket)
+        self.assertIsNone(bucket_of("not uuid", 16))
+
+    def test_unassigned_on_first_shard(self):
+        self.assertEqual(self.shard_map.locate(self.person_id), ("default", False))
+        self.assertEqual(self.shard_map.locate("not uuid"), (None, False))
+
+    def test_assigned(self):
+        self.assignments[bucket_of(self.person_id, 16)] = ("shard1", True)
+
+        self.assertEqual(self.shard_map.locate(self.person_id), ("shard1", True))
+
+    def test_refresh(self):
+        self.shard_map.shard_of(self.person_id)
+        self.assignments[bucket_of(self.person_id, 16)] = ("shard1", False)
+        self.assertEqual(self.shard_map.shard_of(self.person_id), "default")
+
+        self.now = 5
+        self.assertEqual(self.shard_map.shard_of(self.person_id), "shard1")
+        self.assertEqual(self.loads, 2)
+
+    def test_plan_even(self):
+        layout = dict.fromkeys(range(16), "default")
+
+        moves = plan_moves(layout, ["default", "shard1", "shard2"])
+        for bucket, _, target in moves:
+            layout[bucket] = target
+
+        self.assertEqual(len(moves), 10)
+        self.assertEqual(sorted(list(layout.values()).count(alias) for alias in ("default", "shard1", "shard2")),
+                         [5, 5, 6])
+
+    def test_plan_balanced(self):
+        layout = {bucket: "default" if bucket % 2 else "shard1" for bucket in range(16)}
+
+        self.assertEqual(plan_moves(layout, ["default", "shard1"]), [])
+
+    def test_plan_removed_shard(self):
+        layout = {bucket: ("default", "shard1", "shard2")[bucket % 3] for bucket in range(15)}
+
+        moves = plan_moves(layout, ["default", "shard1"])
+
+        self.assertEqual({source for _, source, _ in moves}, {"shard2"})
+        self.assertEqual(len(moves), 5)
+
+    def test_router(self):
+        router = ShardRouter()
+
+        self.assertIsNone(router.db_for_read(Message))
+        with use_shard("shard1"):
+            self.assertEqual(router.db_for_read(Message), "shard1")
+            self.assertEqual(router.db_for_write(Person), "shard1")
+            self.assertIsNone(router.db_for_write(ShardBucket))
+        self.assertFalse(router.allow_migrate("shard1", "messenger", "shardbucket"))
+        self.assertIsNone(router.allow_migrate("shard1", "messenger", "message"))
+
+    @override_settings(MESSENGER_SHARDS={**SHARDS, "ALIASES": []})
+    def test_disabled(self):
+        self.assertIsNone(person_shard(self.person_id))
+
+
+@override_settings(MESSENGER_SHARDS=SHARDS)
+class ShardedMessagesTest(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.sender = self.create_person("default", "Petya")
+        self.receiver = self.create_person("shard1", "Vasya")
+
+    @staticmethod
+    def create_person(alias, name):
+        # Persons of a test get buckets of their own
+        while True:
+            person_id = uuid.uuid4()
+            bucket = bucket_of(person_id, SHARDS["VIRTUAL_SHARDS"])
+            if not ShardBucket.objects.filter(bucket=bucket).exists():
+                break
+        ShardBucket.objects.create(bucket=bucket, alias=alias)
+        return Person.objects.create(id=person_id, name=name)
+
+    def send(self, text="Hello"):
+        resp = client.post("/api/messages/", data={"sender": self.sender.id, "receiver": self.receiver.id,
+                                                    "text": text})
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        return resp.json()["id"]
+
+    def test_persons_replicated(self):
+        self.assertTrue(Person.objects.using("shard1").filter(id=self.sender.id, name="Petya").exists())
+
+        self.sender.delete()
+        self.assertFalse(Person.objects.using("shard1").filter(id=self.sender.id).exists())
+
+    def test_persons_deleted(self):
+        self.send()
+        client.post("/api/users/destroy/", data={"user": self.sender.id})
+        self.assertFalse(Person.objects.using("shard1").filter(id=self.sender.id).exists())
+
+        call_command("purge_deleted", sleep=0, stdout=StringIO())
+
+        for alias in ("default", "shard1"):
+            self.assertFalse(Person.all_objects.using(alias).filter(id=self.sender.id).exists())
+        self.assertEqual(list(Message.objects.using("shard1").values_list("sender_id", flat=True)), [None])
+
+    def test_copies(self):
+        message_id = self.send()
+
+        inbox = Message.objects.using("shard1").get(id=message_id)
+        sent = Message.objects.using("default").get(id=message_id)
+        self.assertEqual((inbox.created_at, inbox.text), (sent.created_at, sent.text))
+        self.assertTrue(Conversation.objects.using("shard1").filter(owner=self.receiver, unread_count=1).exists())
+        self.assertFalse(Conversation.objects.using("shard1").filter(owner=self.sender).exists())
+        self.assertTrue(Conversation.objects.using("default").filter(owner=self.sender).exists())
+
+    def test_resumed_delivery(self):
+        message = Message(sender_id=self.sender.id, receiver_id=self.receiver.id, text="Hello")
+        deliver_messages([message])
+        # The delivery failed after the shard of the receiver had committed
+        Message.all_objects.using("default").filter(id=message.id).delete()
+        Conversation.objects.using("default").filter(owner=self.sender).delete()
+
+        deliver_messages([message], resume=True)
+
+        for alias in ("default", "shard1"):
+            self.assertEqual(Message.objects.using(alias).get(id=message.id).created_at, message.created_at)
+        self.assertEqual(Conversation.objects.using("shard1").get(owner=self.receiver).unread_count, 1)
+        self.assertTrue(Conversation.objects.using("default").filter(owner=self.sender).exists())
+
+    def test_read_own_shard(self):
+        message_id = self.send()
+        # Copies differ, so each list shows which shard served it
+        Message.objects.using("shard1").filter(id=message_id).update(text="From shard1")
+
+        received = client.post("/api/messages/received/", data={"user": self.receiver.id}).json()["results"]
+        sent = client.post("/api/messages/sent/", data={"user": self.sender.id}).json()["results"]
+        self.assertEqual([message["text"] for message in received], ["From shard1"])
+        self.assertEqual([message["text"] for message in sent], ["Hello"])
+
+    def test_dialog(self):
+        self.send("Hello")
+        client.post("/api/messages/", data={"sender": self.receiver.id, "receiver": self.sender.id, "text": "Hi"})
+
+        for user, peer in ((self.sender, self.receiver), (self.receiver, self.sender)):
+            resp = client.post("/api/messages/dialog/", data={"user": user.id, "peer": peer.id})
+            self.assertEqual([message["text"] for message in resp.json()["results"]], ["Hi", "Hello"])
+
+    def test_group(self):
+        group_id = client.post("/api/groups/", data={"user": self.sender.id, "name": "Group",
+                                                     "members": [str(self.receiver.id)]},
+                               content_type="application/json").json()["id"]
+
+        client.post(f"/api/groups/{group_id}/messages/", data={"user": self.receiver.id, "text": "Hello"})
+
+        resp = client.post(f"/api/groups/{group_id}/history/", data={"user": self.sender.id})
+        self.assertEqual([message["text"] for message in resp.json()["results"]], ["Hello"])
+        self.assertFalse(GroupMessage.objects.using("shard1").exists())
+
+    def test_not_modified(self):
+        self.send()
+        resp = client.post("/api/messages/received/", data={"user": self.receiver.id})
+
+        resp = client.post("/api/messages/received/", data={"user": self.receiver.id},
+                           HTTP_IF_NONE_MATCH=resp["ETag"])
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_edit(self):
+        message_id = self.send()
+
+        resp = client.patch(f"/api/messages/{message_id}/", data={"sender": self.sender.id, "text": "Edited"},
+                            content_type="application/json")
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        for alias in ("default", "shard1"):
+            self.assertEqual(Message.objects.using(alias).get(id=message_id).text, "Edited")
+        self.assertEqual(Conversation.objects.using("shard1").get(owner=self.receiver).last_message_preview,
+                         "Edited")
+
+    def test_destroy(self):
+        message_id = self.send()
+
+        resp = client.post(f"/api/messages/destroy/{message_id}/", data={"user": self.sender.id})
+
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        for alias in ("default", "shard1"):
+            self.assertFalse(Message.objects.using(alias).filter(id=message_id).exists())
+            self.assertTrue(MessageTombstone.objects.using(alias).filter(id=message_id).exists())
+
+    def test_acknowledge(self):
+        message_id = self.send()
+
+        resp = client.post("/api/conversations/ack/", data={"user": self.receiver.id,
+                                                                    "peer": self.sender.id, "message": message_id})
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json()["unread_count"], 0)
+        self.assertIsNotNone(Conversation.objects.using("default").get(owner=self.sender).peer_read_at)
+
+    def test_acknowledge_frozen(self):
+        message_id = self.send()
+        ShardBucket.objects.filter(alias="default").update(frozen=True)
+
+        resp = client.post("/api/conversations/ack/", data={"user": self.receiver.id,
+                                                            "peer": self.sender.id, "message": message_id})
+
+        self.assertEqual(resp.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(Conversation.objects.using("shard1").get(owner=self.receiver).unread_count, 1)
+
+    def test_frozen(self):
+        ShardBucket.objects.filter(alias="shard1").update(frozen=True)
+
+        resp = client.post("/api/messages/", data={"sender": self.sender.id, "receiver": self.receiver.id,
+                                                    "text": "Hello"})
+
+        self.assertEqual(resp.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(resp["Retry-After"], "1")
+        self.assertFalse(Message.objects.using("default").exists())
+
+    def test_buckets(self):
+        created = Person.objects.bulk_create([Person(name="Kolya")])[0]
+
+        fill_buckets(Person.all_objects.all(), SHARDS["VIRTUAL_SHARDS"], batch_size=1)
+
+        for person in (self.sender, created):
+            self.assertEqual(Person.objects.get(id=person.id).bucket, bucket_of(person.id, SHARDS["VIRTUAL_SHARDS"]))
+
+    def test_rebalance(self):
+        peer = self.create_person("default", "Kolya")
+        client.post("/api/messages/", data={"sender": peer.id, "receiver": self.sender.id, "text": "Hi"})
+        self.send()
+        deleted_id = self.send("Deleted")
+        client.post(f"/api/messages/destroy/{deleted_id}/", data={"user": self.sender.id})
+        bucket = bucket_of(self.sender.id, SHARDS["VIRTUAL_SHARDS"])
+
+        call_command("rebalance_shards", bucket=[bucket], to="shard1", grace=0, stdout=StringIO())
+
+        self.assertEqual(person_shard(self.sender.id), "shard1")
+        self.assertEqual(ShardBucket.objects.get(bucket=bucket).frozen, False)
+        received = client.post("/api/messages/received/", data={"user": self.sender.id}).json()["results"]
+        sent = client.post("/api/messages/sent/", data={"user": self.sender.id}).json()["results"]
+        self.assertEqual([message["text"] for message in received], ["Hi"])
+        self.assertEqual([message["text"] for message in sent], ["Hello"])
+        # The source keeps the sent copy of the peer staying on it only, deleted messages have moved too
+        self.assertEqual(list(Message.all_objects.using("default").values_list("text", flat=True)), ["Hi"])
+        self.assertTrue(Message.all_objects.using("shard1").filter(id=deleted_id).exists())
+        self.assertFalse(Conversation.objects.using("default").filter(owner=self.sender).exists())
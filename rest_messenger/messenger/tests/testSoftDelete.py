@@ -0,0 +1,67 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from rest_framework import status
+
+from messenger.models import Conversation, Message
+from messenger.models.person import Person
+from messenger.services.messageService import send_messages
+from messenger.services.personService import delete_person
+
+client = Client()
+
+
+class SoftDeleteTest(TestCase):
+    def setUp(self):
+        self.sender = Person.objects.create(name="Petya")
+        self.receiver = Person.objects.create(name="Vasya")
+        self.messages = send_messages([Message(sender=self.sender, receiver=self.receiver, text=f"Hello {index}")
+                                       for index in range(3)])
+
+    def test_message_hidden(self):
+        message = self.messages[0]
+
+        resp = client.post(f"/api/messages/destroy/{message.id}/", data={"user": self.sender.id})
+
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Message.objects.filter(id=message.id).exists())
+        self.assertIsNotNone(Message.all_objects.get(id=message.id).deleted_at)
+        received = client.post("/api/messages/received/", data={"user": self.receiver.id}).json()["results"]
+        self.assertNotIn(str(message.id), [item["id"] for item in received])
+
+        resp = client.post(f"/api/messages/destroy/{message.id}/", data={"user": self.sender.id})
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_person_deleted_by_single_update(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(delete_person(self.sender.id))
+
+        self.assertFalse(Person.objects.filter(id=self.sender.id).exists())
+        self.assertEqual(Message.objects.filter(sender_id=self.sender.id).count(), 3)
+        self.assertFalse(delete_person(self.sender.id))
+
+    def test_person_endpoint(self):
+        resp = client.post("/api/users/destroy/", data={"user": self.sender.id})
+
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(client.get(f"/api/users/{self.sender.id}/").status_code, status.HTTP_404_NOT_FOUND)
+        resp = client.post("/api/messages/sent/", data={"user": self.sender.id})
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+        resp = client.post("/api/users/destroy/", data={"user": self.sender.id})
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_purge(self):
+        client.post(f"/api/messages/destroy/{self.messages[0].id}/", data={"user": self.sender.id})
+        delete_person(self.sender.id)
+        version = Person.objects.get(id=self.receiver.id).messages_version
+
+        call_command("purge_deleted", batch_size=1, sleep=0, stdout=StringIO())
+
+        self.assertFalse(Message.all_objects.filter(id=self.messages[0].id).exists())
+        self.assertFalse(Person.all_objects.filter(id=self.sender.id).exists())
+        self.assertEqual(list(Message.objects.values_list("sender_id", flat=True)), [None, None])
+        self.assertFalse(Conversation.objects.filter(owner_id=self.sender.id).exists())
+        self.assertFalse(Conversation.objects.filter(peer_id=self.sender.id).exists())
+        self.assertEqual(Person.objects.get(id=self.receiver.id).messages_version, version + 2)
@@ -0,0 +1,86 @@
+import uuid
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+
+from messenger.models import Message, MessageTombstone
+from messenger.models.person import Person
+from messenger.utils.sync import SyncToken
+
+client = Client()
+
+
+@override_settings(MESSENGER_SYNC_LAG=0)
+class SyncTest(TestCase):
+    def setUp(self):
+        self.sender = Person.objects.create(id="965c9bf5-be59-40e7-980a-d4008faba9d0", name='Petya')
+        self.receiver = Person.objects.create(id="d7970bd9-2be2-4f8b-8d9f-c2bd31fba483", name='Vanya')
+        self.message = Message.objects.create(sender=self.sender, receiver=self.receiver, text="Some text")
+
+    def sync(self, **data):
+        resp = client.post("/api/messages/sync/", data={"user": self.receiver.id, **data})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.data
+
+    def test_initial_sync(self):
+        data = self.sync()
+
+        self.assertEqual([m["id"] for m in data["messages"]], [str(self.message.id)])
+        self.assertEqual(data["deleted"], [])
+        self.assertFalse(data["has_more"])
+
+    def test_no_changes(self):
+        token = self.sync()["token"]
+        data = self.sync(token=token)
+
+        self.assertEqual(data["messages"], [])
+        self.assertEqual(data["deleted"], [])
+
+    def test_edited_and_created(self):
+        token = self.sync()["token"]
+        client.patch(f"/api/messages/{self.message.id}/", data={
+            "text": "Other text",
+            "sender": self.sender.id,
+        }, content_type="application/json")
+        created = Message.objects.create(sender=self.sender, receiver=self.receiver, text="New")
+
+        data = self.sync(token=token)
+        self.assertEqual([m["id"] for m in data["messages"]], [str(self.message.id), str(created.id)])
+        self.assertEqual(data["messages"][0]["text"], "Other text")
+
+    def test_deleted(self):
+        token = self.sync()["token"]
+        client.post(f"/api/messages/destroy/{self.message.id}/", data={
+            "user": self.sender.id
+        }, content_type='application/json')
+
+        data = self.sync(token=token)
+        self.assertEqual(data["messages"], [])
+        self.assertEqual([t["id"] for t in data["deleted"]], [str(self.message.id)])
+
+    def test_paging(self):
+        Message.objects.create(sender=self.sender, receiver=self.receiver, text="Other")
+        first = self.sync(limit=1)
+        second = self.sync(limit=1, token=first["token"])
+
+        self.assertTrue(first["has_more"])
+        self.assertFalse(second["has_more"])
+        self.assertNotEqual(first["messages"][0]["id"], second["messages"][0]["id"])
+
+    def test_expired_token(self):
+        token = SyncToken.initial(timezone.now() - timedelta(days=365)).encode()
+        resp = client.post("/api/messages/sync/", data={"user": self.receiver.id, "token": token})
+
+        self.assertEqual(resp.status_code, status.HTTP_410_GONE)
+
+    def test_purge_tombstones(self):
+        expired = MessageTombstone.objects.create(id=uuid.uuid4(), deleted_at=timezone.now() - timedelta(days=365))
+        recent = MessageTombstone.objects.create(id=uuid.uuid4())
+        call_command("purge_tombstones", stdout=StringIO())
+
+        self.assertEqual(list(MessageTombstone.objects.values_list("id", flat=True)), [recent.id])
+        self.assertFalse(MessageTombstone.objects.filter(id=expired.id).exists())
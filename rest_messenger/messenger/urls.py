@@ -21,10 +21,29 @@ router.register(r'users', PersonViewSet, basename='user')
 router.register(r'messages', MessageView, basename="message")
 
 urlpatterns = [
+    path('async/ping/', ping_async),
+    path('async/users/<uuid:pk>/', person_retrieve_async),
+    path('async/messages/', message_create_async),
+    path('async/messages/received/', message_get_received_async),
+    path('async/messages/sent/', message_get_sent_async),
+    path('messages/received/export/', message_export_received),
+    path('messages/sent/export/', message_export_sent),
+    path('messages/sync/', message_sync),
+    path('messages/search/', message_search),
+    path('messages/dialog/', message_dialog),
+    path('conversations/', conversation_inbox),
+    path('conversations/ack/', conversation_acknowledge),
+    path('groups/', group_create),
+    path('groups/<uuid:pk>/members/', group_add_members),
+    path('groups/<uuid:pk>/leave/', group_leave),
+    path('groups/<uuid:pk>/messages/', group_send),
+    path('groups/<uuid:pk>/history/', group_history),
+    path('groups/<uuid:pk>/ack/', group_acknowledge),
     url('messages/received/', message_get_received),
     url('messages/sent/', message_get_sent),
     url('messages/destroy/(?P<pk>[^/.]+)/', message_destroy),
     path('', include(router.urls)),
     url(r'^swagger/$', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path("ping/", PingView.as_view()),
+    path("metrics/", metrics_view),
 ]
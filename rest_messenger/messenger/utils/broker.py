@@ -0,0 +1,200 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional, Set
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+from rest_framework.utils.encoders import JSONEncoder
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    Events published to a channel, consumed by a coroutine running in the loop which subscribed.
+
+    Events are delivered thread-safely from any thread. When consumer falls behind by max_size
+    events, further events are dropped and the subscription is marked as overflowed.
+    """
+    def __init__(self, broker: "Broker", channel: str, max_size: int):
+        self.broker = broker
+        self.channel = channel
+        self.overflowed = False
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(max_size)
+
+    def deliver(self, event: Dict[str, Any]) -> None:
+        try:
+            self._loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # Loop of the subscriber is already closed, it will never read the event
+            pass
+
+    def _put(self, event: Dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self) -> Dict[str, Any]:
+        return await self._queue.get()
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """
+    Base class of publish/subscribe brokers delivering events to subscribers of a channel.
+
+    Subscribers are kept by the process, backends define how published events reach them.
+    """
+    def __init__(self, queue_size: int = 1000):
+        self.queue_size = queue_size
+        self._subscriptions: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel: str, event: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def subscribe(self, channel: str) -> Subscription:
+        """
+        Subscribe to channel, must be called from a running event loop.
+        """
+        subscription = Subscription(self, channel, self.queue_size)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscriptions.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[subscription.channel]
+
+    def deliver(self, channel: str, event: Dict[str, Any]) -> None:
+        """
+        Deliver event to subscribers of this process.
+        """
+        with self._lock:
+            subscribers = list(self._subscriptions.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+
+class InMemoryBroker(Broker):
+    """
+    Broker delivering events within the process, suitable for tests and single-worker setups.
+    """
+    def publish(self, channel: str, event: Dict[str, Any]) -> None:
+        self.deliver(channel, event)
+
+
+class PostgresBroker(Broker):
+    """
+    Broker delivering events to every worker through PostgreSQL LISTEN/NOTIFY.
+
+    Events are sent with pg_notify on the connection of the publisher. Each process listens
+    on a dedicated connection in a background thread, started with the first subscription,
+    and fans received events out to its subscribers.
+
+    :param channel: name of PostgreSQL notification channel
+    :param database: alias of a database in DATABASES
+    :param poll_interval: seconds between checks of the listening connection
+    """
+    def __init__(self, channel: str = "messenger_events", database: str = "default",
+                 poll_interval: float = 5, **kwargs):
+        super().__init__(**kwargs)
+        self.channel = channel
+        self.database = database
+        self.poll_interval = poll_interval
+        self._listener: Optional[threading.Thread] = None
+
+    def publish(self, channel: str, event: Dict[str, Any]) -> None:
+        payload = json.dumps({"channel": channel, "event": event}, cls=JSONEncoder)
+        with connections[self.database].cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [self.channel, payload])
+
+    def subscribe(self, channel: str) -> Subscription:
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name="messenger-broker", daemon=True)
+                self._listener.start()
+        return super().subscribe(channel)
+
+    def _connect(self):
+        wrapper = connections[self.database]
+        connection = wrapper.Database.connect(**wrapper.get_connection_params())
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}"')
+        return connection
+
+    def _listen(self) -> None:
+        connection = None
+        while True:
+            try:
+                if connection is None:
+                    connection = self._connect()
+                if select.select([connection], [], [], self.poll_interval) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    notification = connection.notifies.pop(0)
+                    message = json.loads(notification.payload)
+                    self.deliver(message["channel"], message["event"])
+            except Exception:  # noqa
+                logger.exception("Listening for events failed, reconnecting")
+                if connection is not None:
+                    connection.close()
+                connection = None
+                threading.Event().wait(self.poll_interval)
+
+
+def person_channel(person_id) -> str:
+    """
+    Name of channel with events addressed to a person.
+    """
+    return f"person.{person_id}"
+
+
+def publish_on_commit(channel: str, event: Dict[str, Any], using: Optional[str] = None) -> None:
+    """
+    Publish event once the current transaction is committed, immediately in autocommit mode.
+
+    :param using: alias of the database of the transaction, the default one if not passed
+    """
+    transaction.on_commit(lambda: get_broker().publish(channel, event), using=using)
+
+
+_broker: Optional[Broker] = None
+_broker_lock = threading.Lock()
+
+
+def get_broker() -> Broker:
+    """
+    Return process-wide broker configured in MESSENGER_BROKER.
+    """
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = settings.MESSENGER_BROKER
+                _broker = import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+    return _broker
+
+
+def reset_broker() -> None:
+    """
+    Forget configured broker, it is rebuilt from settings on the next access.
+    """
+    global _broker
+    with _broker_lock:
+        _broker = None
@@ -0,0 +1,185 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.module_loading import import_string
+
+
+class LookupCache:
+    """
+    Base class for caches of lookups which would otherwise hit the DB.
+
+    Counts hits and misses, backends implement _get, set, delete and clear.
+    None is never cached, it is reserved for a miss.
+    """
+    # Whether entries are seen by every worker process
+    shared = False
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self._get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def _get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class LocalLookupCache(LookupCache):
+    """
+    In-process LRU cache with expiration of entries.
+
+    Entries of other processes are not invalidated, so ttl bounds staleness between workers.
+
+    :param max_size: maximal number of entries, least recently used ones are evicted first
+    :param ttl: lifetime of an entry in seconds
+    :param shared: set when a single process serves requests, its entries are then as good as shared
+    """
+    def __init__(self, max_size: int = 10000, ttl: float = 300, timer: Callable[[], float] = time.monotonic,
+                 shared: bool = False):
+        super().__init__()
+        self.shared = shared
+        self.max_size = max_size
+        self.ttl = ttl
+        self._timer = timer
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= self._timer():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (self._timer() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DjangoLookupCache(LookupCache):
+    """
+    Cache shared between processes through Django's cache framework.
+
+    :param alias: name of cache in CACHES setting
+    :param prefix: prefix of keys, separates lookups stored in the same cache,
+        get_lookup_cache defaults it to "messenger:" and the name of the lookup cache
+    :param ttl: lifetime of an entry in seconds
+    :param max_size: ignored, the size is bounded by the cache in CACHES,
+        accepted so that OPTIONS of LocalLookupCache work unchanged
+    """
+    def __init__(self, alias: str = "default", prefix: str = "messenger", ttl: float = 300,
+                 max_size: Optional[int] = None):
+        super().__init__()
+        self.alias = alias
+        self.prefix = prefix
+        self.ttl = ttl
+
+    @property
+    def _cache(self):
+        return caches[self.alias]
+
+    @property
+    def shared(self) -> bool:
+        return not isinstance(self._cache, (LocMemCache, DummyCache))
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def _get(self, key: str) -> Optional[Any]:
+        return self._cache.get(self._key(key))
+
+    def set(self, key: str, value: Any) -> None:
+        self._cache.set(self._key(key), value, self.ttl)
+
+    def delete(self, key: str) -> None:
+        self._cache.delete(self._key(key))
+
+    def clear(self) -> None:
+        # Shared cache may hold unrelated keys, so nothing is wiped here and entries expire by ttl
+        pass
+
+
+_lookup_caches: Dict[str, LookupCache] = {}
+_lookup_caches_lock = threading.Lock()
+
+
+def get_lookup_cache(name: str) -> LookupCache:
+    """
+    Return process-wide cache configured in MESSENGER_CACHES under given name.
+
+    :param name: key of MESSENGER_CACHES, e.g. "persons"
+    """
+    cache = _lookup_caches.get(name)
+    if cache is None:
+        with _lookup_caches_lock:
+            cache = _lookup_caches.get(name)
+            if cache is None:
+                config = settings.MESSENGER_CACHES[name]
+                backend = import_string(config["BACKEND"])
+                options = dict(config.get("OPTIONS", {}))
+                if issubclass(backend, DjangoLookupCache):
+                    options.setdefault("prefix", f"messenger:{name}")
+                cache = backend(**options)
+                _lookup_caches[name] = cache
+    return cache
+
+
+def reset_lookup_caches() -> None:
+    """
+    Forget configured caches, they are rebuilt from settings on the next access.
+    """
+    with _lookup_caches_lock:
+        _lookup_caches.clear()
+
+
+def lookup_cache_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Hits and misses of caches used so far by this process.
+    """
+    with _lookup_caches_lock:
+        return {name: cache.stats() for name, cache in _lookup_caches.items()}
@@ -0,0 +1,31 @@
+import hashlib
+from typing import Optional
+
+from django.utils.http import parse_etags, quote_etag
+
+"""
+ETags of responses derived from version counters, so a request can be answered by 304 Not Modified
+before the data of its response is read.
+"""
+
+
+def make_etag(*parts) -> str:
+    """
+    Strong ETag of the representation identified by parts, e.g. kind of data, id and version.
+    """
+    digest = hashlib.blake2b(":".join(map(str, parts)).encode(), digest_size=12).hexdigest()
+    return quote_etag(digest)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether If-None-Match header lists the ETag, compared weakly as RFC 7232 requires for If-None-Match.
+    """
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return "*" in etags or _opaque(etag) in {_opaque(value) for value in etags}
+
+
+def _opaque(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
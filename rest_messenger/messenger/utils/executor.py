@@ -0,0 +1,60 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+
+"""
+Bounded pool of threads doing database work of async views.
+
+Django ORM is synchronous, so async views hand their queries over to threads. A fixed number
+of threads bounds database connections of a process to MESSENGER_ASYNC_DB_THREADS, and each thread
+keeps its connection between calls as long as CONN_MAX_AGE allows.
+"""
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.MESSENGER_ASYNC_DB_THREADS,
+                                               thread_name_prefix="messenger-db")
+    return _executor
+
+
+def reset_db_executor() -> None:
+    """
+    Let running calls finish and build the pool from settings on the next call.
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def _call(function: Callable, args, kwargs) -> Any:
+    # Same connection handling as Django does around a request
+    close_old_connections()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_db(function: Callable, *args, **kwargs) -> Any:
+    """
+    Run function doing database work in the pool, context variables of the caller are visible to it.
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        get_db_executor(), functools.partial(context.run, _call, function, args, kwargs)
+    )
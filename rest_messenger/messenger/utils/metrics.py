@@ -0,0 +1,212 @@
+import bisect
+import threading
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+from messenger.db.pooled import pool_stats
+from messenger.db.replicas import get_replicas
+from messenger.services.ingestService import ingest_stats
+from messenger.utils.cache import lookup_cache_stats
+
+"""
+In-process metrics rendered in Prometheus text exposition format.
+
+Every worker process keeps its own registry, so Prometheus has to scrape workers separately
+or aggregate by instance label.
+"""
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Metric name, documentation, type and key of ConnectionPool.stats()
+POOL_METRICS = (
+    ("messenger_db_pool_connections", "Open connections of the pool.", "gauge", "size"),
+    ("messenger_db_pool_idle_connections", "Idle connections of the pool.", "gauge", "idle"),
+    ("messenger_db_pool_max_connections", "Maximal number of connections of the pool.", "gauge", "max_size"),
+    ("messenger_db_pool_waiting", "Threads waiting for a connection.", "gauge", "waiting"),
+    ("messenger_db_pool_checkouts_total", "Connections handed out.", "counter", "checkouts"),
+    ("messenger_db_pool_timeouts_total", "Checkouts which timed out.", "counter", "timeouts"),
+    ("messenger_db_pool_created_total", "Connections opened.", "counter", "created"),
+    ("messenger_db_pool_closed_total", "Connections closed as broken, expired or idle.", "counter", "closed"),
+    ("messenger_db_pool_failed_pings_total", "Connections found broken before checkout.", "counter", "failed_pings"),
+    ("messenger_db_pool_wait_seconds_total", "Time spent waiting for connections.", "counter", "wait_seconds"),
+)
+
+# Metric name, documentation and key of ReplicaSet.stats()
+REPLICA_METRICS = (
+    ("messenger_db_replica_lag_seconds", "Last measured replication lag of a replica.", "lag_seconds"),
+    ("messenger_db_replica_healthy", "Whether a replica serves reads.", "healthy"),
+)
+
+# Metric name, documentation, type and key of IngestQueue.stats()
+INGEST_METRICS = (
+    ("messenger_ingest_queued_messages", "Messages waiting to be written by the ingest queue.", "gauge", "queued"),
+    ("messenger_ingest_batches_total", "Transactions committed by the ingest queue.", "counter", "batches"),
+    ("messenger_ingest_messages_total", "Messages written by the ingest queue.", "counter", "written"),
+)
+
+INF_LABEL = 'le="+Inf"'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[Labels, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] += amount
+
+    def value(self, labels: Labels = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed bucket bounds, observation is a bisect and three additions.
+    """
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._series: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Counts of buckets without +Inf, sum and count of observations
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, labels: Labels = ()) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    bucket_labels = _format_labels(labels, 'le="%s"' % _format_value(bound))
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(labels, INF_LABEL)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class RequestMetrics:
+    """
+    Metrics of requests recorded by messenger.middleware.MetricsMiddleware.
+    """
+    def __init__(self):
+        self.requests = Counter("messenger_requests_total", "Requests by view, method and status code.")
+        self.duration = Histogram("messenger_request_duration_seconds", "Time spent handling a request.",
+                                  DURATION_BUCKETS)
+        self.db_duration = Histogram("messenger_db_duration_seconds", "Time spent in database queries of a request.",
+                                     DURATION_BUCKETS)
+        self.db_queries = Histogram("messenger_db_queries", "Number of database queries of a request.", COUNT_BUCKETS)
+        self.render_duration = Histogram("messenger_render_duration_seconds",
+                                         "Time spent rendering a response body.", DURATION_BUCKETS)
+        self.response_size = Histogram("messenger_response_size_bytes", "Size of a response body.", SIZE_BUCKETS)
+        self.slow_queries = Counter("messenger_slow_queries_total",
+                                    "Queries slower than MESSENGER_METRICS SLOW_QUERY_MS by view.")
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.requests, self.duration, self.db_duration, self.db_queries, self.render_duration,
+                       self.response_size, self.slow_queries):
+            lines.extend(metric.render())
+
+        stats = lookup_cache_stats()
+        for outcome in ("hits", "misses"):
+            name = f"messenger_lookup_cache_{outcome}_total"
+            lines.append(f"# HELP {name} Lookup cache {outcome} of this process.")
+            lines.append(f"# TYPE {name} counter")
+            for cache, cache_stats in sorted(stats.items()):
+                lines.append(f"{name}{_format_labels((('cache', cache),))} {cache_stats[outcome]}")
+
+        pools = sorted(pool_stats().items())
+        for name, documentation, kind, key in POOL_METRICS:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for alias, stats in pools:
+                lines.append(f"{name}{_format_labels((('database', alias),))} {_format_value(stats[key])}")
+
+        replicas = sorted(get_replicas().stats().items())
+        for name, documentation, key in REPLICA_METRICS:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} gauge")
+            for alias, stats in replicas:
+                if stats[key] is not None:
+                    lines.append(f"{name}{_format_labels((('database', alias),))} {_format_value(stats[key])}")
+
+        ingest = ingest_stats()
+        if ingest:
+            for name, documentation, kind, key in INGEST_METRICS:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {ingest[key]}")
+        return "\n".join(lines) + "\n"
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> RequestMetrics:
+    """
+    Return process-wide registry of request metrics.
+    """
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = RequestMetrics()
+    return _metrics
+
+
+def reset_metrics() -> None:
+    """
+    Drop recorded metrics.
+    """
+    global _metrics
+    with _metrics_lock:
+        _metrics = None
@@ -0,0 +1,118 @@
+import base64
+import binascii
+import uuid
+from typing import Any, Callable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Q, QuerySet
+from django.utils import dateparse
+from rest_framework.exceptions import ValidationError
+
+_FORWARD = "f"
+_BACKWARD = "b"
+
+
+class KeysetPage:
+    """
+    Single page of a keyset pagination with opaque cursors to its neighbours.
+    """
+    def __init__(self, items: List[Any], next_cursor: Optional[str], previous_cursor: Optional[str]):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+
+class KeysetPaginator:
+    """
+    Paginate queryset by (created_at, id) key.
+
+    Every page is fetched by a range condition on the key instead of OFFSET,
+    so with a composite index ending with (created_at, id) a page costs
+    one index range scan regardless of its depth.
+
+    Cursor is an opaque url-safe base64 string of "<direction>|<created_at>|<id>".
+    Forward cursor points to the rows after its key, backward cursor to the rows before it.
+
+    :param ordering_field: first field of the key
+    :param descending: whether pages go from the latest key to the earliest one
+    :param key: function returning (ordering_field, id) of an item, attributes of model instance are used by default
+    """
+    def __init__(self, ordering_field: str = "created_at", descending: bool = False,
+                 key: Optional[Callable[[Any], Tuple[Any, uuid.UUID]]] = None):
+        self.ordering_field = ordering_field
+        self.descending = descending
+        if key is not None:
+            self.key_of = key
+
+    @staticmethod
+    def get_limit(limit: Optional[int]) -> int:
+        if not limit:
+            return settings.MESSENGER_PAGE_SIZE
+        return min(limit, settings.MESSENGER_MAX_PAGE_SIZE)
+
+    def key_of(self, item: Any) -> Tuple[Any, uuid.UUID]:
+        return getattr(item, self.ordering_field), item.id
+
+    @staticmethod
+    def encode_cursor(direction: str, key: Tuple[Any, uuid.UUID]) -> str:
+        value, pk = key
+        raw = f"{direction}|{value.isoformat()}|{pk}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[str, Any, uuid.UUID]:
+        """
+        Decode cursor to (direction, created_at, id), ValidationError raised if cursor is malformed.
+        """
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+            direction, value, pk = raw.split("|")
+            parsed = dateparse.parse_datetime(value)
+            if direction not in (_FORWARD, _BACKWARD) or parsed is None:
+                raise ValueError(raw)
+            return direction, parsed, uuid.UUID(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise ValidationError({"cursor": "Invalid cursor"})
+
+    def _seek(self, value: Any, pk: uuid.UUID, descending: bool) -> Q:
+        """
+        Condition selecting rows strictly after (value, pk) in the given order.
+
+        Redundant bound on the ordering field lets the planner start index scan at the key
+        (Django has no row-value comparison to express it directly).
+        """
+        field = self.ordering_field
+        if descending:
+            return Q(**{f"{field}__lte": value}) & (Q(**{f"{field}__lt": value}) | Q(id__lt=pk))
+        return Q(**{f"{field}__gte": value}) & (Q(**{f"{field}__gt": value}) | Q(id__gt=pk))
+
+    def paginate(self, queryset: QuerySet, cursor: Optional[str] = None, limit: Optional[int] = None) -> KeysetPage:
+        """
+        Fetch page of queryset.
+
+        :param queryset: filtered, but not yet ordered queryset
+        :param cursor: cursor from previous page, first page is returned if not passed
+        :param limit: page size, bounded by MESSENGER_MAX_PAGE_SIZE
+        """
+        limit = self.get_limit(limit)
+        backward = False
+        if cursor:
+            direction, value, pk = self.decode_cursor(cursor)
+            backward = direction == _BACKWARD
+            queryset = queryset.filter(self._seek(value, pk, self.descending != backward))
+
+        descending = self.descending != backward
+        prefix = "-" if descending else ""
+        items = list(queryset.order_by(f"{prefix}{self.ordering_field}", f"{prefix}id")[:limit + 1])
+        has_more = len(items) > limit
+        items = items[:limit]
+        if backward:
+            items.reverse()
+
+        next_cursor = previous_cursor = None
+        if items:
+            if has_more or backward:
+                next_cursor = self.encode_cursor(_FORWARD, self.key_of(items[-1]))
+            if (has_more and backward) or (cursor and not backward):
+                previous_cursor = self.encode_cursor(_BACKWARD, self.key_of(items[0]))
+        return KeysetPage(items, next_cursor, previous_cursor)
@@ -0,0 +1,107 @@
+import re
+from datetime import date
+from typing import Iterable, List, Optional, Tuple
+
+"""
+Monthly range partitioning of messages by created_at on PostgreSQL.
+
+Partition of a month is named <table>_pYYYY_MM and holds rows created within the month in UTC.
+Rows outside of all partitions go to <table>_default, which stays empty as long as partitions
+are created ahead of time.
+
+PostgreSQL before 13 rejects BEFORE ROW triggers of partitioned tables, such triggers are put
+on every partition instead, including the ones created later.
+"""
+
+_PARTITION_SUFFIX = re.compile(r"_p(\d{4})_(\d{2})$")
+
+# First version of PostgreSQL running BEFORE ROW triggers of a partitioned table for its partitions
+PARTITIONED_BEFORE_TRIGGERS_VERSION = 130000
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def months_between(first: date, last: date) -> List[date]:
+    """
+    Starts of months from the month of first to the month of last inclusive.
+    """
+    months = []
+    month = month_start(first)
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month.year:04d}_{month.month:02d}"
+
+
+def partition_month(table: str, name: str) -> Optional[date]:
+    """
+    Month of partition named by partition_name, None for other tables.
+    """
+    if not name.startswith(table):
+        return None
+    match = _PARTITION_SUFFIX.fullmatch(name[len(table):])
+    if match is None:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def create_partition_sql(table: str, month: date) -> str:
+    return (
+        f'CREATE TABLE IF NOT EXISTS "{partition_name(table, month)}" PARTITION OF "{table}" '
+        f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+    )
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def is_before_row_trigger(definition: str) -> bool:
+    """
+    :param definition: trigger definition given by pg_get_triggerdef
+    """
+    return " BEFORE " in definition and " FOR EACH ROW " in definition
+
+
+def move_trigger_sql(definition: str, table: str, target: str) -> str:
+    """
+    Definition of trigger of table given by pg_get_triggerdef, changed to create it on target table.
+    Names of triggers are unique per table, so the name is kept.
+    """
+    on_table = re.compile(rf' ON (?:"?[\w$]+"?\.)?"?{re.escape(table)}"? ')
+    if on_table.search(definition) is None:
+        raise ValueError(f"Trigger isn't defined on {table}: {definition}")
+    return on_table.sub(f' ON "{target}" ', definition, count=1)
+
+
+def plan_maintenance(existing: Iterable[date], today: date, premake_months: int,
+                     retention_months: Optional[int]) -> Tuple[List[date], List[date]]:
+    """
+    Decide which monthly partitions to create and which to detach.
+
+    :param existing: months of existing partitions
+    :param today: current date
+    :param premake_months: number of months after the current one which must have partitions
+    :param retention_months: number of past months to keep besides the current one, everything is kept if None
+    :return: months to create and months to detach
+    """
+    existing = set(existing)
+    current = month_start(today)
+    required = [add_months(current, offset) for offset in range(premake_months + 1)]
+    to_create = [month for month in required if month not in existing]
+    to_detach = []
+    if retention_months is not None:
+        oldest_kept = add_months(current, -retention_months)
+        to_detach = sorted(month for month in existing if month < oldest_kept)
+    return to_create, to_detach
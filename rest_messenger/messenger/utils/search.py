@@ -0,0 +1,81 @@
+from django.db import connections
+from django.db.models import BooleanField, CharField, FloatField, QuerySet, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Lower
+
+from messenger.serializers.fastMessageSerializers import MESSAGE_FIELDS
+
+"""
+Full-text search over message text and search of persons by name.
+
+On PostgreSQL messages are matched against search_vector column maintained by a trigger
+and indexed with GIN (migration 0006_message_search), and ranked by ts_rank_cd.
+Other databases scan text with LIKE for every word of the query, results are unranked there.
+
+Persons are found by prefix of lowercased name, which is a range scan of its text_pattern_ops index,
+or by trigram similarity served by GIN index of pg_trgm (migration 0011_person_name_search).
+Without pg_trgm fuzzy search falls back to a substring match.
+"""
+
+# Text search configuration of search_vector, "simple" doesn't stem, so it works for any language
+SEARCH_CONFIG = "simple"
+HEADLINE_OPTIONS = "StartSel=<b>, StopSel=</b>, MaxFragments=2, MaxWords=20, MinWords=5"
+
+SEARCH_FIELDS = MESSAGE_FIELDS + ("rank", "headline")
+
+
+def search_messages(queryset: QuerySet, query: str, highlight: bool = False) -> QuerySet:
+    """
+    Filter messages matching the query, from the most relevant.
+
+    :param queryset: messages to search in
+    :param query: words, "quoted phrases", "or" and -excluded words, as accepted by websearch_to_tsquery
+    :param highlight: whether to build snippets of text with matches wrapped in <b></b>, PostgreSQL only
+    :return: rows of SEARCH_FIELDS, rank and headline are None if unsupported
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        for word in query.split():
+            queryset = queryset.filter(text__icontains=word.strip('"'))
+        return queryset.annotate(
+            rank=Value(None, output_field=FloatField()),
+            headline=Value(None, output_field=CharField()),
+        ).order_by("-created_at", "-id").values_list(*SEARCH_FIELDS)
+
+    table = connection.ops.quote_name(queryset.model._meta.db_table)
+    tsquery = "websearch_to_tsquery(%s, %s)"
+    params = (SEARCH_CONFIG, query)
+    if highlight:
+        headline = RawSQL(f"ts_headline(%s, {table}.text, {tsquery}, %s)",
+                          (SEARCH_CONFIG, SEARCH_CONFIG, query, HEADLINE_OPTIONS), output_field=CharField())
+    else:
+        headline = Value(None, output_field=CharField())
+    return queryset.annotate(
+        matched=RawSQL(f"{table}.search_vector @@ {tsquery}", params, output_field=BooleanField()),
+        rank=RawSQL(f"ts_rank_cd({table}.search_vector, {tsquery})", params, output_field=FloatField()),
+        headline=headline,
+    ).filter(matched=True).order_by("-rank", "-created_at", "-id").values_list(*SEARCH_FIELDS)
+
+
+def search_persons(queryset: QuerySet, query: str, fuzzy: bool = False) -> QuerySet:
+    """
+    Filter persons by name, case-insensitively.
+
+    :param queryset: persons to search in
+    :param query: beginning of the name, or a name with typos if fuzzy
+    :param fuzzy: match names resembling the query, from the most similar one
+    :return: rows of (id, name)
+    """
+    connection = connections[queryset.db]
+    if not fuzzy:
+        return queryset.annotate(lower_name=Lower("name")).filter(lower_name__startswith=query.lower()) \
+            .order_by("lower_name", "id").values_list("id", "name")
+    if connection.vendor != "postgresql":
+        return queryset.filter(name__icontains=query).order_by("name", "id").values_list("id", "name")
+
+    name = f"lower({connection.ops.quote_name(queryset.model._meta.db_table)}.name)"
+    return queryset.annotate(
+        # % is the similarity operator of pg_trgm, escaped for parameter substitution
+        matched=RawSQL(f"{name} %% lower(%s)", (query,), output_field=BooleanField()),
+        similarity=RawSQL(f"similarity({name}, lower(%s))", (query,), output_field=FloatField()),
+    ).filter(matched=True).order_by("-similarity", "id").values_list("id", "name")
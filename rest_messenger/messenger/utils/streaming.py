@@ -0,0 +1,37 @@
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator
+
+from rest_framework.utils.encoders import JSONEncoder
+
+JSON_CONTENT_TYPE = "application/json"
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+
+def encode_json(item: Dict[str, Any]) -> str:
+    return json.dumps(item, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":"))
+
+
+def json_array_stream(items: Iterable[Any], encode: Callable[[Any], str] = encode_json) -> Iterator[str]:
+    """
+    Yield JSON array of items element by element.
+
+    :param items: lazily evaluated items, e.g. queryset iterator
+    :param encode: function converting single item to JSON string
+    """
+    yield "["
+    separator = ""
+    for item in items:
+        yield separator + encode(item)
+        separator = ","
+    yield "]"
+
+
+def ndjson_stream(items: Iterable[Any], encode: Callable[[Any], str] = encode_json) -> Iterator[str]:
+    """
+    Yield items as newline delimited JSON, one line per item.
+
+    :param items: lazily evaluated items, e.g. queryset iterator
+    :param encode: function converting single item to JSON string
+    """
+    for item in items:
+        yield encode(item) + "\n"
@@ -0,0 +1,123 @@
+import base64
+import binascii
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Q, QuerySet
+from django.utils import dateparse, timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+Key = Tuple[datetime, Optional[uuid.UUID]]
+
+
+class SyncTokenExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = "Sync token expired, full resync required"
+    default_code = "sync_token_expired"
+
+
+class SyncToken:
+    """
+    Position of a client in the change feed.
+
+    Holds (updated_at, id) key of the last delivered change and (deleted_at, id) key of the last delivered tombstone.
+    Key without id points right after the moment, i.e. everything up to the moment is delivered.
+    """
+    def __init__(self, changed: Optional[Key], deleted: Key):
+        self.changed = changed
+        self.deleted = deleted
+
+    @classmethod
+    def initial(cls, horizon: datetime) -> "SyncToken":
+        """
+        Token of a client without local state: all messages are pending, tombstones are irrelevant.
+        """
+        return cls(None, (horizon, None))
+
+    @staticmethod
+    def _encode_key(key: Optional[Key]) -> str:
+        if key is None:
+            return "|"
+        moment, pk = key
+        return f"{moment.isoformat()}|{pk or ''}"
+
+    @staticmethod
+    def _decode_key(moment: str, pk: str) -> Optional[Key]:
+        if not moment:
+            return None
+        parsed = dateparse.parse_datetime(moment)
+        if parsed is None:
+            raise ValueError(moment)
+        return parsed, uuid.UUID(pk) if pk else None
+
+    def encode(self) -> str:
+        raw = f"{self._encode_key(self.changed)}|{self._encode_key(self.deleted)}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> "SyncToken":
+        """
+        Decode token, ValidationError raised if token is malformed.
+        """
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+            changed_at, changed_id, deleted_at, deleted_id = raw.split("|")
+            deleted = cls._decode_key(deleted_at, deleted_id)
+            if deleted is None:
+                raise ValueError(raw)
+            return cls(cls._decode_key(changed_at, changed_id), deleted)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise ValidationError({"token": "Invalid sync token"})
+
+
+def _after(field: str, key: Optional[Key]) -> Q:
+    if key is None:
+        return Q()
+    moment, pk = key
+    if pk is None:
+        return Q(**{f"{field}__gt": moment})
+    return Q(**{f"{field}__gte": moment}) & (Q(**{f"{field}__gt": moment}) | Q(id__gt=pk))
+
+
+def _read_feed(queryset: QuerySet, field: str, key: Optional[Key], horizon: datetime,
+               limit: int) -> Tuple[List[Any], Optional[Key], bool]:
+    """
+    Read rows changed after key, but not later than horizon.
+
+    :return: rows, key of the new position and whether more rows are pending
+    """
+    rows = list(
+        queryset.filter(_after(field, key), **{f"{field}__lte": horizon}).order_by(field, "id")[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if has_more:
+        return rows, (getattr(rows[-1], field), rows[-1].id), True
+    return rows, (horizon, None), False
+
+
+def read_changes(messages: QuerySet, tombstones: QuerySet, token: SyncToken,
+                 limit: int) -> Tuple[List[Any], List[Any], SyncToken, bool]:
+    """
+    Read messages created or edited and tombstones of messages deleted since token.
+
+    Changes newer than MESSENGER_SYNC_LAG are postponed to the next call, so rows of transactions
+    which are still in flight with an older timestamp are not skipped.
+
+    :param messages: messages visible to the client
+    :param tombstones: tombstones visible to the client
+    :param token: position of the client, SyncTokenExpired raised if tombstones after it may be purged
+    :param limit: maximal number of messages and of tombstones returned
+    :return: changed messages, tombstones, new token and whether more changes are pending
+    """
+    now = timezone.now()
+    if token.deleted[0] < now - timedelta(seconds=settings.MESSENGER_SYNC_TOMBSTONE_RETENTION):
+        raise SyncTokenExpired()
+
+    horizon = now - timedelta(seconds=settings.MESSENGER_SYNC_LAG)
+    changed, changed_key, more_changed = _read_feed(messages, "updated_at", token.changed, horizon, limit)
+    deleted, deleted_key, more_deleted = _read_feed(tombstones, "deleted_at", token.deleted, horizon, limit)
+    return changed, deleted, SyncToken(changed_key, deleted_key), more_changed or more_deleted
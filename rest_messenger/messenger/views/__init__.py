@@ -1,3 +1,7 @@
 from .messageView import *
 from .personView import *
 from .pingView import *
+from .conversationView import *
+from .groupView import *
+from .metricsView import *
+from .asyncView import *
@@ -0,0 +1,155 @@
+import functools
+import json
+from typing import Dict
+
+from django.conf import settings
+from django.http import HttpResponseNotModified, JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, NotFound, ParseError, \
+    Throttled
+
+from messenger.db.replicas import use_replicas
+from messenger.db.shards import person_shard, use_shard
+from messenger.middleware import timed_render
+from messenger.models import Message
+from messenger.models.person import Person
+from messenger.serializers.messageSerializers import MessageSerializer
+from messenger.serializers.personSerializers import PersonSerializer
+from messenger.services.ingestService import IngestQueueFull, ingest_message_async
+from messenger.services.messageService import deliver_messages
+from messenger.utils.conditional import etag_matches
+from messenger.utils.executor import run_db
+from messenger.views.messageView import person_messages_page
+from messenger.views.personView import person_etag
+
+"""
+Async versions of the hot endpoints served under /api/async/.
+
+DRF views are synchronous, so these are plain Django async views returning the same bodies as their
+DRF counterparts. Under ASGI a request doesn't hold a thread while it waits, database work goes
+to the bounded pool of messenger.utils.executor in a single hop per request.
+"""
+
+
+def async_api_view(methods):
+    """
+    Allow only given methods, exempt from CSRF like DRF views and turn DRF exceptions into JSON responses.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse({"detail": f'Method "{request.method}" not allowed.'},
+                                    status=status.HTTP_405_METHOD_NOT_ALLOWED)
+            try:
+                return await view(request, *args, **kwargs)
+            except APIException as exc:
+                # DRF reports failed authentication as 403 when there is no authentication header to challenge
+                code = status.HTTP_403_FORBIDDEN if isinstance(exc, (NotAuthenticated, AuthenticationFailed)) \
+                    else exc.status_code
+                detail = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+                response = JsonResponse(detail, status=code, safe=False)
+                if getattr(exc, "wait", None):
+                    response["Retry-After"] = str(int(exc.wait))
+                return response
+        # csrf_exempt decorator would hide the coroutine function from Django
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+def request_data(request) -> Dict[str, str]:
+    if request.content_type == "application/json":
+        try:
+            return json.loads(request.body or b"{}")
+        except ValueError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
+    return request.POST
+
+
+def find_person(pk):
+    with use_replicas(pk):
+        return Person.objects.filter(id=pk).first()
+
+
+def received_page(data, if_none_match=None):
+    with use_shard(person_shard(data.get("user"))), use_replicas(data.get("user")):
+        return person_messages_page("receiver", data, if_none_match)
+
+
+def sent_page(data, if_none_match=None):
+    with use_shard(person_shard(data.get("user"))), use_replicas(data.get("user")):
+        return person_messages_page("sender", data, if_none_match)
+
+
+def validate_message(data) -> Message:
+    serializer = MessageSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    return Message(**serializer.validated_data)
+
+
+def conditional_json(data, etag: str):
+    with timed_render():
+        response = HttpResponseNotModified() if data is None else JsonResponse(data)
+    response["ETag"] = etag
+    return response
+
+
+@async_api_view(["GET"])
+async def ping_async(request):  # noqa
+    """
+    Ping the system without touching a thread.
+    """
+    return JsonResponse({"pong": True})
+
+
+@async_api_view(["GET"])
+async def person_retrieve_async(request, pk):  # noqa
+    """
+    Return person with given uuid, async version of GET /api/users/<uuid>/.
+    """
+    person = await run_db(find_person, pk)
+    if person is None:
+        raise NotFound()
+    etag = person_etag(person.id, person.name)
+    return conditional_json(None if etag_matches(request.headers.get("If-None-Match"), etag)
+                            else PersonSerializer(person).data, etag)
+
+
+@async_api_view(["POST"])
+async def message_get_received_async(request):
+    """
+    Async version of message_get_received.
+
+    :param request: user request with {"user": "uuid", "cursor": "string", "limit": int} inside body
+    """
+    return conditional_json(*await run_db(received_page, request_data(request), request.headers.get("If-None-Match")))
+
+
+@async_api_view(["POST"])
+async def message_get_sent_async(request):
+    """
+    Async version of message_get_sent.
+
+    :param request: user request with {"user": "uuid", "cursor": "string", "limit": int} inside body
+    """
+    return conditional_json(*await run_db(sent_page, request_data(request), request.headers.get("If-None-Match")))
+
+
+@async_api_view(["POST"])
+async def message_create_async(request):
+    """
+    Async version of POST /api/messages/. With MESSENGER_INGEST enabled the request waits for its batch
+    on the event loop, so the writer of a worker batches messages of all its concurrent requests.
+
+    :param request: user request with {"sender": "uuid", "receiver": "uuid", "text": "string"} inside body
+    """
+    message = await run_db(validate_message, request_data(request))
+    if settings.MESSENGER_INGEST["ENABLED"]:
+        try:
+            message = await ingest_message_async(message)
+        except IngestQueueFull:
+            raise Throttled(wait=1, detail="Too many messages are being sent, retry later")
+    else:
+        message, = await run_db(deliver_messages, [message])
+    return JsonResponse(MessageSerializer(message).data, status=status.HTTP_201_CREATED)
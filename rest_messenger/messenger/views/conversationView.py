@@ -0,0 +1,90 @@
+from django.db import router, transaction
+from django.utils import timezone
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework.decorators import api_view
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+
+from messenger.db.shards import on_user_shard, person_shard, use_shard
+from messenger.models import Conversation, Message
+from messenger.serializers.conversationSerializers import ConversationSerializer, ConversationPageResponseSerializer, \
+    InboxSerializer, AcknowledgeSerializer
+from messenger.utils.broker import person_channel, publish_on_commit
+from messenger.utils.pagination import KeysetPaginator
+from messenger.views.messageView import validate_person
+
+
+@swagger_auto_schema(
+    method='POST',
+    request_body=InboxSerializer,
+    responses={200: ConversationPageResponseSerializer},
+    operation_id="conversations_inbox",
+)
+@api_view(["POST"])
+@on_user_shard
+def conversation_inbox(request):
+    """
+    Return conversations of person with given in body uuid from the one with the latest message.
+
+    :param request: user request with {"user": "uuid", "cursor": "string", "limit": int} inside body
+    """
+    person = validate_person(request.data)
+    params = InboxSerializer(data=request.data)
+    params.is_valid(raise_exception=True)
+    page = KeysetPaginator(ordering_field="last_message_at", descending=True).paginate(
+        Conversation.objects.filter(owner_id=person.id, last_message_at__isnull=False),
+        cursor=params.validated_data.get("cursor"),
+        limit=params.validated_data.get("limit"),
+    )
+    return Response({
+        "next": page.next_cursor,
+        "previous": page.previous_cursor,
+        "results": ConversationSerializer(page.items, many=True).data,
+    })
+
+
+@swagger_auto_schema(
+    method='POST',
+    request_body=AcknowledgeSerializer,
+    responses={200: ConversationSerializer},
+    operation_id="conversations_acknowledge",
+)
+@api_view(["POST"])
+@on_user_shard
+def conversation_acknowledge(request):
+    """
+    Mark messages received by person from peer as read or delivered up to the given message or cursor.
+    Peer is notified through /api/events/.
+
+    :param request: user request with
+        {"user": "uuid", "peer": "uuid", "message": "uuid", "cursor": "string", "state": "read" | "delivered"}
+        inside body
+    """
+    person = validate_person(request.data)
+    params = AcknowledgeSerializer(data=request.data)
+    params.is_valid(raise_exception=True)
+    peer_id = params.validated_data["peer"]
+
+    until_id = None
+    if "message" in params.validated_data:
+        until_id = params.validated_data["message"]
+        until = Message.objects.filter(id=until_id, receiver_id=person.id, sender_id=peer_id) \
+            .values_list("created_at", flat=True).first()
+        if until is None:
+            raise NotFound(detail="Message with given uuid doesn't exist")
+    elif "cursor" in params.validated_data:
+        _, until, until_id = KeysetPaginator.decode_cursor(params.validated_data["cursor"])
+    else:
+        until = timezone.now()
+
+    state = params.validated_data["state"]
+    # Sides of the conversation are kept by the shards of their owners, neither may be moved meanwhile
+    for alias in dict.fromkeys([person_shard(person.id, write=True), person_shard(peer_id, write=True)]):
+        with use_shard(alias), transaction.atomic(using=router.db_for_write(Conversation)):
+            Conversation.objects.acknowledge(person.id, peer_id, until, until_id, state)
+    publish_on_commit(person_channel(peer_id), {"type": f"message.{state}", "peer": person.id, "until": until})
+
+    conversation = Conversation.objects.filter(owner_id=person.id, peer_id=peer_id).first()
+    if conversation is None:
+        raise NotFound(detail="Conversation with given peer doesn't exist")
+    return Response(ConversationSerializer(conversation).data)
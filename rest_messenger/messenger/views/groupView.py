@@ -0,0 +1,182 @@
+from django.db import DEFAULT_DB_ALIAS, transaction
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.decorators import api_view
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+
+from messenger.db.replicas import use_replicas
+from messenger.models import GroupMember, GroupMessage
+from messenger.serializers.groupSerializers import GroupSerializer, GroupCreateSerializer, \
+    GroupCreateResponseSerializer, GroupMembersSerializer, GroupMembersResponseSerializer, GroupMessageSerializer, \
+    GroupMessageCreateSerializer, GroupHistorySerializer, GroupHistoryResponseSerializer, GroupAcknowledgeSerializer, \
+    GroupReadStateSerializer
+from messenger.serializers.personSerializers import UserAuthenticationSerializer
+from messenger.services.groupService import add_members, check_member, create_group, remove_member, \
+    send_group_message, acknowledge_group, unread_count
+from messenger.services.personService import person_names
+from messenger.utils.pagination import KeysetPaginator
+from messenger.views.messageView import validate_person
+
+
+@swagger_auto_schema(
+    method='POST',
+    request_body=GroupCreateSerializer,
+    responses={201: GroupCreateResponseSerializer},
+    operation_id="groups_create",
+)
+@api_view(["POST"])
+def group_create(request):
+    """
+    Create group of person with given in body uuid and the members, unknown members are reported and skipped.
+
+    :param request: user request with {"user": "uuid", "name": "string", "members": ["uuid"]} inside body
+    """
+    person = validate_person(request.data)
+    params = GroupCreateSerializer(data=request.data)
+    params.is_valid(raise_exception=True)
+    group, missing = create_group(params.validated_data["name"], person.id, params.validated_data["members"])
+    return Response({**GroupSerializer(group).data, "missing": missing}, status=status.HTTP_201_CREATED)
+
+
+@swagger_auto_schema(
+    method='POST',
+    request_body=GroupMembersSerializer,
+    responses={200: GroupMembersResponseSerializer},
+    operation_id="groups_members_add",
+)
+@api_view(["POST"])
+def group_add_members(request, pk):
+    """
+    Add persons to the group, any member may add them.
+
+    :param request: user request with {"user": "uuid", "members": ["uuid"]} inside body
+    :param pk: primary key of Group
+    """
+    person = validate_person(request.data)
+    params = GroupMembersSerializer(data=request.data)
+    params.is_valid(raise_exception=True)
+    check_member(pk, person.id)
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        missing = add_members(pk, params.validated_data["members"])
+    return Response({"missing": missing})
+
+
+@swagger_auto_schema(
+    method='POST',
+    request_body=UserAuthenticationSerializer,
+    responses={204: "Person has left the group"},
+    operation_id="groups_leave",
+)
+@api_view(["POST"])
+def group_leave(request, pk):
+    """
+    Remove person with given in body uuid from the group, their messages stay.
+
+    :param request: user request with {"user": "uuid"} inside body
+    :param pk: primary key of Group
+    """
+    person = validate_person(request.data)
+    if not remove_member(pk, person.id):
+        raise NotFound(detail="Group with given uuid doesn't exist")
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@swagger_auto_schema(
+    method='POST',
+    request_body=GroupMessageCreateSerializer,
+    responses={201: GroupMessageSerializer},
+    operation_id="groups_messages_create",
+)
+@api_view(["POST"])
+def group_send(request, pk):
+    """
+    Send message to every member of the group, it is stored once.
+    Membership is checked against "group_members" lookup cache, so a known member sends by a single insert.
+
+    :param request: user request with {"user": "uuid", "text": "string"} inside body
+    :param pk: primary key of Group
+    """
+    person = validate_person(request.data)
+    params = GroupMessageCreateSerializer(data=request.data)
+    params.is_valid(raise_exception=True)
+    check_member(pk, person.id)
+    message = send_group_message(pk, person.id, params.validated_data["text"])
+    return Response(GroupMessageSerializer(message).data, status=status.HTTP_201_CREATED)
+
+
+@swagger_auto_schema(
+    method='POST',
+    request_body=GroupHistorySerializer,
+    responses={200: GroupHistoryResponseSerializer},
+    operation_id="groups_history",
+)
+@api_view(["POST"])
+def group_history(request, pk):
+    """
+    Return page of messages of the group from the latest one, so "next" cursor leads to earlier messages.
+    Every member reads the same rows, a page is one range scan of group_message_created_idx.
+
+    :param request: user request with {"user": "uuid", "cursor": "string", "limit": int, "persons": bool} inside body
+    :param pk: primary key of Group
+    """
+    person = validate_person(request.data)
+    params = GroupHistorySerializer(data=request.data)
+    params.is_valid(raise_exception=True)
+    check_member(pk, person.id)
+    with use_replicas(person.id):
+        page = KeysetPaginator(descending=True).paginate(
+            GroupMessage.objects.filter(group_id=pk),
+            cursor=params.validated_data.get("cursor"),
+            limit=params.validated_data.get("limit"),
+        )
+        data = {
+            "next": page.next_cursor,
+            "previous": page.previous_cursor,
+            "results": GroupMessageSerializer(page.items, many=True).data,
+        }
+        if params.validated_data["persons"]:
+            data["persons"] = person_names(message.sender_id for message in page.items)
+    return Response(data)
+
+
+@swagger_auto_schema(
+    method='POST',
+    request_body=GroupAcknowledgeSerializer,
+    responses={200: GroupReadStateSerializer},
+    operation_id="groups_acknowledge",
+)
+@api_view(["POST"])
+def group_acknowledge(request, pk):
+    """
+    Move read cursor of the member to the given message or to the message the cursor points at,
+    or to the latest message of the group. The cursor never goes back.
+
+    :param request: user request with {"user": "uuid", "message": "uuid", "cursor": "string"} inside body
+    :param pk: primary key of Group
+    """
+    person = validate_person(request.data)
+    params = GroupAcknowledgeSerializer(data=request.data)
+    params.is_valid(raise_exception=True)
+    check_member(pk, person.id)
+
+    messages = GroupMessage.objects.filter(group_id=pk)
+    if "message" in params.validated_data or "cursor" in params.validated_data:
+        # Key of a cursor is taken from its message, so a forged cursor can't move the read cursor past the group
+        until_id = params.validated_data["message"] if "message" in params.validated_data \
+            else KeysetPaginator.decode_cursor(params.validated_data["cursor"])[2]
+        until = messages.filter(id=until_id).values_list("created_at", "id").first()
+        if until is None:
+            raise NotFound(detail="Message with given uuid doesn't exist")
+    else:
+        until = messages.order_by("-created_at", "-id").values_list("created_at", "id").first()
+    if until is not None:
+        acknowledge_group(pk, person.id, *until)
+
+    last_read_at, last_read_id = GroupMember.objects.filter(group_id=pk, person_id=person.id) \
+        .values_list("last_read_at", "last_read_id").first() or (None, None)
+    return Response(GroupReadStateSerializer({
+        "last_read_at": last_read_at,
+        "last_read_id": last_read_id,
+        "unread_count": unread_count(pk, person.id, last_read_at, last_read_id),
+    }).data)
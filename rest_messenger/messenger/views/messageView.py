@@ -1,17 +1,39 @@
-from typing import Dict
+from typing import Any, Dict, Optional, Tuple
 
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django.utils.decorators import method_decorator
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import mixins, viewsets, status
-from rest_framework.decorators import api_view
-from rest_framework.exceptions import NotAuthenticated, NotFound
+from rest_framework.decorators import api_view, action
+from rest_framework.exceptions import NotAuthenticated, NotFound, Throttled
 from rest_framework.response import Response
 
-from messenger.models import Message
+from messenger.db.replicas import use_replicas
+from messenger.db.shards import message_shards, on_user_shard, person_shard, use_shard
+from messenger.middleware import timed_render
+from messenger.models import Message, MessageTombstone
+from messenger.models.message import dialog_key
 from messenger.models.person import Person
 from messenger.serializers.messageSerializers import MessageUpdateSerializer, MessageDestroySerializer, \
-    MessageSerializer
+    MessageSerializer, MessagePageSerializer, MessagePageResponseSerializer, MessageExportSerializer, \
+    MessageSyncSerializer, MessageSyncResponseSerializer, MessageTombstoneSerializer, MessageBulkCreateSerializer, \
+    MessageBulkResultSerializer, MessageSearchSerializer, MessageSearchResponseSerializer, MessageDialogSerializer
+from messenger.serializers.fastMessageSerializers import FastMessageSerializer, MESSAGE_FIELDS
 from messenger.serializers.personSerializers import UserAuthenticationSerializer
+from messenger.services.ingestService import IngestQueueFull, ingest_message
+from messenger.services.messageService import on_message_updated, delete_message, deliver_messages, \
+    edit_message_copies
+from messenger.services.personService import person_names
+from messenger.utils.cache import get_lookup_cache
+from messenger.utils.conditional import etag_matches, make_etag
+from messenger.utils.pagination import KeysetPaginator
+from messenger.utils.search import search_messages
+from messenger.utils.sync import SyncToken, read_changes
+from messenger.utils.streaming import json_array_stream, ndjson_stream, JSON_CONTENT_TYPE, NDJSON_CONTENT_TYPE
 
 """
 Big problem with messages is a desire to authenticate user by id sent with every request in body.
@@ -27,7 +49,8 @@ by id in cookie or header, so that we get rid of 'hacking' default in-built seri
                           '  "text": "string",'
                           '  "sender": "uuid",'
                           '  "receiver": "uuid"'
-                          '}'
+                          '}. With MESSENGER_INGEST enabled an ASGI worker batches one message at a time here, '
+                          'send bursts by POST /api/async/messages/'
 ))
 class MessageView(mixins.CreateModelMixin,
                   viewsets.GenericViewSet):
@@ -43,6 +66,18 @@ class MessageView(mixins.CreateModelMixin,
 
         return MessageSerializer
 
+    def perform_create(self, serializer):
+        message = Message(**serializer.validated_data)
+        if settings.MESSENGER_INGEST["ENABLED"]:
+            # Waits holding the thread, which sync views of an ASGI worker share, so every batch of the worker
+            # holds a single message sent here. /api/async/messages/ waits on the event loop and batches them all.
+            try:
+                serializer.instance = ingest_message(message)
+            except IngestQueueFull:
+                raise Throttled(wait=1, detail="Too many messages are being sent, retry later")
+            return
+        serializer.instance = deliver_messages([message])[0]
+
     def partial_update(self, request, *args, **kwargs):
         """
         Update message text given uuid of message and uuid of sender
@@ -50,11 +85,19 @@ class MessageView(mixins.CreateModelMixin,
         :param request: body: {"sender": "uuid", "text": "string"}
         :return:
         """
+        # Sender's shard keeps a copy of the message
+        with use_shard(person_shard(request.data.get("sender"))) as alias:
+            return self._partial_update(request, alias)
+
+    def _partial_update(self, request, alias):
         partial = True
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        message_shards(instance.sender_id, instance.receiver_id, write=True)
+        with transaction.atomic(using=alias):
+            on_message_updated(serializer.save())
+        edit_message_copies(instance)
 
         if getattr(instance, '_prefetched_objects_cache', None):
             # If 'prefetch_related' has been applied to a queryset, we need to
@@ -63,61 +106,375 @@ class MessageView(mixins.CreateModelMixin,
 
         return Response(serializer.data)
 
+    @swagger_auto_schema(
+        operation_summary="Send messages to many receivers",
+        request_body=MessageBulkCreateSerializer,
+        responses={201: MessageBulkResultSerializer(many=True), 207: MessageBulkResultSerializer(many=True)},
+    )
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk_create(self, request):
+        """
+        Create messages of a single sender in one transaction.
+
+        Persons are checked by a single query, messages to unknown receivers are reported
+        and skipped, the rest are inserted in batches.
+
+        :param request: body: {"sender": "uuid", "text": "string", "receivers": ["uuid"]}
+            or {"sender": "uuid", "messages": [{"receiver": "uuid", "text": "string"}]}
+        :return: result per message in order of request, 201 if all are created, 207 otherwise
+        """
+        serializer = MessageBulkCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        sender = serializer.validated_data["sender"]
+        items = serializer.validated_data["messages"]
+
+        requested = {sender} | {item["receiver"] for item in items}
+        existing = set(Person.objects.filter(id__in=requested).values_list("id", flat=True))
+        if sender not in existing:
+            raise NotAuthenticated(detail="User with given uuid doesn't exist")
+
+        messages = deliver_messages([
+            Message(sender_id=sender, receiver_id=item["receiver"], text=item["text"])
+            for item in items
+            if item["receiver"] in existing
+        ])
+
+        created = iter(MessageSerializer(messages, many=True).data)
+        results = []
+        for item in items:
+            if item["receiver"] in existing:
+                results.append({"receiver": item["receiver"], "status": status.HTTP_201_CREATED,
+                                "message": next(created)})
+            else:
+                results.append({"receiver": item["receiver"], "status": status.HTTP_400_BAD_REQUEST,
+                                "errors": {"receiver": ["Person with given uuid doesn't exist"]}})
+
+        if len(messages) == len(items):
+            return Response(results, status=status.HTTP_201_CREATED)
+        return Response(results, status=status.HTTP_207_MULTI_STATUS)
 
-def validate_person(request_data: Dict[str, str]) -> Person:
+
+def validate_person(request_data: Dict[str, str], fresh: bool = False) -> Person:
     """
     Return Person object from the DB if exists, otherwise NotAuthenticated raised/
+    Known persons are served from "persons" lookup cache without a query if workers share it,
+    a cache of one worker would still authenticate a person deleted through another one.
 
     :param request_data: {"user": "uuid"}
+    :param fresh: skip the cache, so messages_version of the person is current
     :return: corresponding Person object
     """
     serializer = UserAuthenticationSerializer(data=request_data)
     serializer.is_valid(raise_exception=True)
-    person = Person.objects.filter(id=serializer.validated_data["user"]).first()
+    person_id = serializer.validated_data["user"]
+
+    cache = get_lookup_cache("persons")
+    name = None if fresh or not cache.shared else cache.get(str(person_id))
+    if name is not None:
+        return Person(id=person_id, name=name)
+
+    person = Person.objects.filter(id=person_id).first()
     if person is None:
         raise NotAuthenticated(detail="User with given uuid doesn't exist")
+    cache.set(str(person.id), person.name)
     return person
 
 
+def message_page(queryset, request_data: Dict[str, str], descending: bool = False) -> Dict[str, Any]:
+    """
+    Build page of messages ordered by creation time selected by cursor and limit from request body.
+
+    :param queryset: filtered messages
+    :param request_data: {"cursor": "string", "limit": int, "persons": bool}, all optional
+    :param descending: whether pages go from the latest message to the earliest one
+    :return: {"next": "cursor", "previous": "cursor", "results": [messages]},
+        with {"persons": {"uuid": "name"}} of senders and receivers of the page if requested
+    """
+    params = MessagePageSerializer(data=request_data)
+    params.is_valid(raise_exception=True)
+    serializer = FastMessageSerializer()
+    page = KeysetPaginator(descending=descending, key=serializer.key).paginate(
+        queryset.values_list(*MESSAGE_FIELDS),
+        cursor=params.validated_data.get("cursor"),
+        limit=params.validated_data.get("limit"),
+    )
+    with timed_render():
+        results = serializer.to_list(page.items)
+    data = {
+        "next": page.next_cursor,
+        "previous": page.previous_cursor,
+        "results": results,
+    }
+    if params.validated_data["persons"]:
+        data["persons"] = person_names(person_id for row in page.items for person_id in row[2:4])
+    return data
+
+
+def person_messages_page(field: str, request_data: Dict[str, str],
+                         if_none_match: Optional[str]) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    Build page of messages of the person by message_page unless the client has it already.
+
+    ETag of a page is derived from messages_version of the person and the cursor, so the client's copy
+    is checked by the person lookup alone, without reading messages.
+
+    :param field: "receiver" for received messages, "sender" for sent ones
+    :param request_data: {"user": "uuid", "cursor": "string", "limit": int, "persons": bool}
+    :param if_none_match: If-None-Match header of the request
+    :return: page or None if the ETag matches If-None-Match, and the ETag
+    """
+    person = validate_person(request_data, fresh=True)
+    etag = make_etag("messages", field, person.id, person.messages_version,
+                     request_data.get("cursor"), request_data.get("limit"), request_data.get("persons"))
+    if etag_matches(if_none_match, etag):
+        return None, etag
+    return message_page(Message.objects.filter(**{f"{field}__id__exact": person.id}), request_data), etag
+
+
+def dialog_messages_page(request_data: Dict[str, str],
+                         if_none_match: Optional[str]) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    Build page of messages between the person and the peer, from the latest one, unless the client has it already.
+    Both directions share the dialog key, so the page is a single range scan of message_dialog_idx.
+
+    :param request_data: {"user": "uuid", "peer": "uuid", "cursor": "string", "limit": int, "persons": bool}
+    :param if_none_match: If-None-Match header of the request
+    :return: page or None if the ETag matches If-None-Match, and the ETag
+    """
+    person = validate_person(request_data, fresh=True)
+    params = MessageDialogSerializer(data=request_data)
+    params.is_valid(raise_exception=True)
+    peer_id = params.validated_data["peer"]
+    etag = make_etag("dialog", person.id, peer_id, person.messages_version,
+                     request_data.get("cursor"), request_data.get("limit"), request_data.get("persons"))
+    if etag_matches(if_none_match, etag):
+        return None, etag
+    person_low, person_high = dialog_key(person.id, peer_id)
+    dialog = Message.objects.filter(person_low=person_low, person_high=person_high)
+    return message_page(dialog, request_data, descending=True), etag
+
+
+def conditional_response(data: Optional[Dict[str, Any]], etag: str) -> Response:
+    """
+    Return data with its ETag, or 304 Not Modified if data is None.
+    """
+    if data is None:
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data)
+    response["ETag"] = etag
+    return response
+
+
+def paginate_messages(queryset, request_data: Dict[str, str]) -> Response:
+    """
+    Return page of messages built by message_page.
+    """
+    return Response(message_page(queryset, request_data))
+
+
+def stream_messages(queryset, request_data: Dict[str, str]) -> StreamingHttpResponse:
+    """
+    Stream all messages ordered by creation time without loading them into memory.
+
+    Rows are read through server-side cursor in chunks of MESSENGER_EXPORT_CHUNK_SIZE
+    and written to the response as soon as they are serialized.
+
+    :param queryset: filtered messages
+    :param request_data: {"format": "json" | "ndjson"}
+    :return: JSON array or newline delimited JSON of messages
+    """
+    params = MessageExportSerializer(data=request_data)
+    params.is_valid(raise_exception=True)
+    # Rows are read after the view has returned, out of its use_shard() block
+    rows = queryset.using(queryset.db).order_by("created_at", "id").values_list(*MESSAGE_FIELDS).iterator(
+        chunk_size=settings.MESSENGER_EXPORT_CHUNK_SIZE
+    )
+    serializer = FastMessageSerializer()
+
+    if params.validated_data["format"] == "ndjson":
+        return StreamingHttpResponse(ndjson_stream(rows, serializer.to_json), content_type=NDJSON_CONTENT_TYPE)
+    return StreamingHttpResponse(json_array_stream(rows, serializer.to_json), content_type=JSON_CONTENT_TYPE)
+
+
 @swagger_auto_schema(
     method='POST',
-    request_body=UserAuthenticationSerializer,
-    responses={200: MessageSerializer},
+    request_body=MessagePageSerializer,
+    responses={200: MessagePageResponseSerializer, 304: "Messages haven't changed since If-None-Match ETag"},
     operation_id="messages_receive",
 )
 @api_view(["POST"])
 # Body in GET and DELETE requests should be ignored, I decided to make post request for this and following ops.
+@on_user_shard
 def message_get_received(request):
     """
-    Return all messages received by person with given in body uuid.
+    Return page of messages received by person with given in body uuid.
+    The response has an ETag, the request is answered by 304 Not Modified if it is sent in If-None-Match
+    and no message of the person has changed. The request is safe despite of POST.
 
-    :param request: user request with {"user": "uuid"} inside body
+    :param request: user request with {"user": "uuid", "cursor": "string", "limit": int} inside body
     """
-    person = validate_person(request.data)
-    received = Message.objects.filter(receiver__id__exact=person.id).order_by("created_at")
-    out = MessageSerializer(data=received, many=True)
-    out.is_valid()
-    return Response(out.data)
+    with use_replicas(request.data.get("user")):
+        page, etag = person_messages_page("receiver", request.data, request.META.get("HTTP_IF_NONE_MATCH"))
+    return conditional_response(page, etag)
 
 
 @swagger_auto_schema(
     method='POST',
-    request_body=UserAuthenticationSerializer,
-    responses={200: MessageSerializer},
+    request_body=MessagePageSerializer,
+    responses={200: MessagePageResponseSerializer, 304: "Messages haven't changed since If-None-Match ETag"},
     operation_id="messages_sent",
 )
 @api_view(["POST"])
+@on_user_shard
 def message_get_sent(request):
     """
-    Return all messages sent by person with given in body uuid.
+    Return page of messages sent by person with given in body uuid.
+    Supports If-None-Match like message_get_received.
 
-    :param request: user request with {"user": "uuid"} inside body
+    :param request: user request with {"user": "uuid", "cursor": "string", "limit": int} inside body
+    """
+    with use_replicas(request.data.get("user")):
+        page, etag = person_messages_page("sender", request.data, request.META.get("HTTP_IF_NONE_MATCH"))
+    return conditional_response(page, etag)
+
+
+@swagger_auto_schema(
+    method='POST',
+    request_body=MessageDialogSerializer,
+    responses={200: MessagePageResponseSerializer, 304: "Messages haven't changed since If-None-Match ETag"},
+    operation_id="messages_dialog",
+)
+@api_view(["POST"])
+@on_user_shard
+def message_dialog(request):
+    """
+    Return page of messages sent and received by person with given in body uuid in their dialog with the peer,
+    from the latest one, so "next" cursor leads to earlier messages.
+    Supports If-None-Match like message_get_received.
+
+    :param request: user request with {"user": "uuid", "peer": "uuid", "cursor": "string", "limit": int} inside body
+    """
+    with use_replicas(request.data.get("user")):
+        page, etag = dialog_messages_page(request.data, request.META.get("HTTP_IF_NONE_MATCH"))
+    return conditional_response(page, etag)
+
+
+@swagger_auto_schema(
+    method='POST',
+    request_body=MessageExportSerializer,
+    responses={200: MessageSerializer(many=True)},
+    operation_id="messages_receive_export",
+)
+@api_view(["POST"])
+@on_user_shard
+def message_export_received(request):
+    """
+    Stream the whole history of messages received by person with given in body uuid.
+
+    :param request: user request with {"user": "uuid", "format": "json" | "ndjson"} inside body
+    """
+    person = validate_person(request.data)
+    received = Message.objects.filter(receiver__id__exact=person.id)
+    return stream_messages(received, request.data)
+
+
+@swagger_auto_schema(
+    method='POST',
+    request_body=MessageExportSerializer,
+    responses={200: MessageSerializer(many=True)},
+    operation_id="messages_sent_export",
+)
+@api_view(["POST"])
+@on_user_shard
+def message_export_sent(request):
+    """
+    Stream the whole history of messages sent by person with given in body uuid.
+
+    :param request: user request with {"user": "uuid", "format": "json" | "ndjson"} inside body
+    """
+    person = validate_person(request.data)
+    sent = Message.objects.filter(sender__id__exact=person.id)
+    return stream_messages(sent, request.data)
+
+
+@swagger_auto_schema(
+    method='POST',
+    request_body=MessageSyncSerializer,
+    responses={200: MessageSyncResponseSerializer},
+    operation_id="messages_sync",
+)
+@api_view(["POST"])
+@on_user_shard
+def message_sync(request):
+    """
+    Return messages sent or received by person which were created or edited since the token
+    and ids of such messages deleted since the token.
+    Without token all messages are returned, pass the returned token to the next call.
+
+    :param request: user request with {"user": "uuid", "token": "string", "limit": int} inside body
+    """
+    person = validate_person(request.data)
+    params = MessageSyncSerializer(data=request.data)
+    params.is_valid(raise_exception=True)
+    if params.validated_data.get("token"):
+        token = SyncToken.decode(params.validated_data["token"])
+    else:
+        token = SyncToken.initial(timezone.now())
+
+    changed, deleted, token, has_more = read_changes(
+        Message.objects.filter(Q(receiver__id__exact=person.id) | Q(sender__id__exact=person.id)),
+        MessageTombstone.objects.filter(Q(receiver=person.id) | Q(sender=person.id)),
+        token,
+        KeysetPaginator.get_limit(params.validated_data.get("limit")),
+    )
+    return Response({
+        "messages": MessageSerializer(changed, many=True).data,
+        "deleted": MessageTombstoneSerializer(deleted, many=True).data,
+        "token": token.encode(),
+        "has_more": has_more,
+    })
+
+
+@swagger_auto_schema(
+    method='POST',
+    request_body=MessageSearchSerializer,
+    responses={200: MessageSearchResponseSerializer},
+    operation_id="messages_search",
+)
+@api_view(["POST"])
+@on_user_shard
+def message_search(request):
+    """
+    Return page of messages sent or received by person with given in body uuid which match the query,
+    from the most relevant one. Pass returned "next" as offset to get the next page.
+
+    :param request: user request with
+        {"user": "uuid", "query": "string", "offset": int, "limit": int, "highlight": bool} inside body
     """
     person = validate_person(request.data)
-    sent = Message.objects.filter(sender__id__exact=person.id).order_by("created_at")
-    out = MessageSerializer(data=sent, many=True)
-    out.is_valid()
-    return Response(out.data)
+    params = MessageSearchSerializer(data=request.data)
+    params.is_valid(raise_exception=True)
+    offset = params.validated_data["offset"]
+    limit = KeysetPaginator.get_limit(params.validated_data.get("limit"))
+
+    rows = list(search_messages(
+        Message.objects.filter(Q(receiver__id__exact=person.id) | Q(sender__id__exact=person.id)),
+        params.validated_data["query"],
+        highlight=params.validated_data["highlight"],
+    )[offset:offset + limit + 1])
+
+    serializer = FastMessageSerializer()
+    results = []
+    with timed_render():
+        for row in rows[:limit]:
+            message = serializer.to_representation(row[:len(MESSAGE_FIELDS)])
+            message["rank"], message["headline"] = row[len(MESSAGE_FIELDS):]
+            results.append(message)
+    return Response({
+        "next": offset + limit if len(rows) > limit else None,
+        "results": results,
+    })
 
 
 @swagger_auto_schema(
@@ -127,6 +484,7 @@ def message_get_sent(request):
     operation_id="messages_destroy",
 )
 @api_view(["POST"])
+@on_user_shard
 def message_destroy(request, pk):
     """
     Remove message from the DB if sender requested deletion.
@@ -138,12 +496,13 @@ def message_destroy(request, pk):
     if person is None:
         raise NotAuthenticated(detail="User with given uuid doesn't exist")
 
+    # Sender's shard keeps a copy of the message
     message = Message.objects.filter(id__exact=pk).first()
     if message is None:
         raise NotFound(detail="Message with given uuid doesn't exist")
 
-    if person.id == message.sender.id:
-        message.delete()
+    if person.id == message.sender_id:
+        delete_message(message)
         return Response(status=status.HTTP_204_NO_CONTENT)
     else:
         raise NotAuthenticated(detail="Deleting other's messages is prohibited")
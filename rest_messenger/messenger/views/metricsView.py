@@ -0,0 +1,14 @@
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+from messenger.utils.metrics import get_metrics
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@require_GET
+def metrics_view(request):  # noqa
+    """
+    Expose request metrics of this process in Prometheus text format.
+    """
+    return HttpResponse(get_metrics().render(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,9 +1,25 @@
+import uuid
+
 from django.utils.decorators import method_decorator
 from drf_yasg.utils import swagger_auto_schema
-from rest_framework import mixins, viewsets
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotAuthenticated
+from rest_framework.response import Response
 
+from messenger.db.replicas import pin_to_primary, use_replicas
 from messenger.models.person import Person
-from messenger.serializers.personSerializers import PersonSerializer
+from messenger.serializers.personSerializers import PersonSerializer, UserAuthenticationSerializer, \
+    PersonBatchSerializer, PersonBatchResponseSerializer, PersonSearchSerializer, PersonSearchResponseSerializer
+from messenger.services.personService import delete_person, person_names
+from messenger.utils.cache import get_lookup_cache
+from messenger.utils.conditional import etag_matches, make_etag
+from messenger.utils.pagination import KeysetPaginator
+from messenger.utils.search import search_persons
+
+
+def person_etag(person_id, name: str) -> str:
+    return make_etag("person", person_id, name)
 
 
 @method_decorator(name="create", decorator=swagger_auto_schema(
@@ -26,3 +42,101 @@ class PersonViewSet(mixins.CreateModelMixin,
     """
     serializer_class = PersonSerializer
     queryset = Person.objects.all()
+
+    def perform_create(self, serializer):
+        pin_to_primary(serializer.save().id)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Return person with ETag. Conditional requests for persons known to "persons" lookup cache
+        are answered without a query if workers share it, a cache of one worker would still
+        serve a person deleted through another one.
+        """
+        if_none_match = request.headers.get("If-None-Match")
+        try:
+            person_id = str(uuid.UUID(kwargs["pk"]))
+        except ValueError:
+            person_id = None
+        cache = get_lookup_cache("persons")
+        name = cache.get(person_id) if if_none_match and person_id and cache.shared else None
+        if name is None:
+            with use_replicas(kwargs["pk"]):
+                response = super().retrieve(request, *args, **kwargs)
+            person_id, name = response.data["id"], response.data["name"]
+            cache.set(person_id, name)
+        else:
+            response = Response(self.get_serializer(Person(id=person_id, name=name)).data)
+
+        etag = person_etag(person_id, name)
+        if etag_matches(if_none_match, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        response["ETag"] = etag
+        return response
+
+    @swagger_auto_schema(
+        operation_summary="Delete Person",
+        request_body=UserAuthenticationSerializer,
+        responses={204: "Person is deleted"},
+    )
+    @action(detail=False, methods=["post"], url_path="destroy")
+    def destroy_person(self, request):
+        """
+        Delete person with given in body uuid. Their messages stay with the other side,
+        losing the deleted person as sender or receiver later.
+
+        :param request: body: {"user": "uuid"}
+        """
+        serializer = UserAuthenticationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if not delete_person(serializer.validated_data["user"]):
+            raise NotAuthenticated(detail="User with given uuid doesn't exist")
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @swagger_auto_schema(
+        operation_summary="Get Persons by uuids",
+        request_body=PersonBatchSerializer,
+        responses={200: PersonBatchResponseSerializer},
+    )
+    @action(detail=False, methods=["post"], url_path="batch")
+    def batch(self, request):
+        """
+        Return persons with given uuids in the requested order by a single query at most,
+        persons known to "persons" lookup cache need none. Unknown uuids are listed in "missing".
+
+        :param request: body: {"ids": ["uuid"]}
+        """
+        serializer = PersonBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(str(person_id) for person_id in serializer.validated_data["ids"]))
+        with use_replicas():
+            names = person_names(ids)
+        return Response({
+            "results": [{"id": person_id, "name": names[person_id]} for person_id in ids if person_id in names],
+            "missing": [person_id for person_id in ids if person_id not in names],
+        })
+
+    @swagger_auto_schema(
+        operation_summary="Search Persons by name",
+        request_body=PersonSearchSerializer,
+        responses={200: PersonSearchResponseSerializer},
+    )
+    @action(detail=False, methods=["post"], url_path="search")
+    def search(self, request):
+        """
+        Return page of persons whose name starts with the query, ignoring case, ordered by name.
+        Fuzzy search returns names resembling the query from the most similar one.
+        Pass returned "next" as offset to get the next page.
+
+        :param request: body: {"query": "string", "fuzzy": bool, "offset": int, "limit": int}
+        """
+        serializer = PersonSearchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        offset = serializer.validated_data["offset"]
+        limit = KeysetPaginator.get_limit(serializer.validated_data.get("limit"))
+        with use_replicas():
+            rows = list(search_persons(Person.objects.all(), serializer.validated_data["query"],
+                                       fuzzy=serializer.validated_data["fuzzy"])[offset:offset + limit + 1])
+        return Response({
+            "next": offset + limit if len(rows) > limit else None,
+            "results": [{"id": person_id, "name": name} for person_id, name in rows[:limit]],
+        })
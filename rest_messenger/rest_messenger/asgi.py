@@ -2,6 +2,8 @@
 ASGI config for rest_messenger project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Besides Django it serves the stream of message events at /api/events/,
+streaming responses of Django are iterated off the event loop.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
@@ -9,8 +11,12 @@ https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rest_messenger.settings')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+from messenger.asgi import MessengerASGIHandler, with_event_stream  # noqa: E402  Django must be set up first
+
+application = with_event_stream(MessengerASGIHandler())
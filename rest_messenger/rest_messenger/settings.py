@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -49,6 +50,7 @@ REST_FRAMEWORK = {
 }
 
 MIDDLEWARE = [
+    'messenger.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,15 +86,61 @@ WSGI_APPLICATION = 'rest_messenger.wsgi.application'
 
 DATABASES = {
     'default': {
-        "ENGINE": 'django.db.backends.postgresql',
+        # Pooled PostgreSQL backend, set POSTGRES_ENGINE=django.db.backends.postgresql to connect per request
+        "ENGINE": os.getenv("POSTGRES_ENGINE", 'messenger.db.pooled'),
         "USER": os.getenv("POSTGRES_USER"),
         "PASSWORD": os.getenv("POSTGRES_PASSWORD"),
         'NAME': os.getenv("POSTGRES_DB"),
         "HOST": os.getenv("POSTGRES_HOST"),
         "PORT": os.getenv("POSTGRES_PORT"),
+        # Connections go back to the pool at the end of every request
+        "CONN_MAX_AGE": 0,
+        "POOL": {
+            "MIN_SIZE": int(os.getenv("POSTGRES_POOL_MIN_SIZE", 2)),
+            "MAX_SIZE": int(os.getenv("POSTGRES_POOL_MAX_SIZE", 20)),
+            # Seconds to wait for a free connection
+            "TIMEOUT": float(os.getenv("POSTGRES_POOL_TIMEOUT", 10)),
+            # Seconds after which connections are replaced
+            "RECYCLE": float(os.getenv("POSTGRES_POOL_RECYCLE", 30 * 60)),
+            "PRE_PING": not os.getenv("POSTGRES_POOL_NO_PRE_PING"),
+            # Seconds a connection must have been idle to be checked before reuse
+            "PING_IDLE": float(os.getenv("POSTGRES_POOL_PING_IDLE", 5)),
+            # Seconds after which idle connections above MIN_SIZE are closed
+            "MAX_IDLE": float(os.getenv("POSTGRES_POOL_MAX_IDLE", 10 * 60)),
+            # Statement clearing session state of returned connections, empty to keep it
+            "RESET": os.getenv("POSTGRES_POOL_RESET", "DISCARD ALL") or None,
+        },
     }
 }
 
+# Read replicas of the default database given as comma separated "host" or "host:port" entries,
+# aliased replica1, replica2 and so on. Read-only endpoints are served by them, see messenger.db.replicas.
+for _index, _replica in enumerate(filter(None, os.getenv("POSTGRES_REPLICA_HOSTS", "").split(",")), 1):
+    _host, _, _port = _replica.strip().partition(":")
+    DATABASES[f"replica{_index}"] = {
+        **DATABASES["default"],
+        "HOST": _host,
+        "PORT": _port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+
+# Shards of messages besides the default database given as comma separated "name", "host/name"
+# or "host:port/name" entries, aliased shard1, shard2 and so on, see messenger.db.shards.
+for _index, _shard in enumerate(filter(None, os.getenv("POSTGRES_SHARD_DATABASES", "").split(",")), 1):
+    _address, _, _name = _shard.strip().rpartition("/")
+    _host, _, _port = _address.partition(":")
+    DATABASES[f"shard{_index}"] = {
+        **DATABASES["default"],
+        "NAME": _name,
+        "HOST": _host or DATABASES["default"]["HOST"],
+        "PORT": _port or (DATABASES["default"]["PORT"] if not _host else None),
+    }
+
+DATABASE_ROUTERS = ["messenger.db.shards.ShardRouter", "messenger.db.replicas.ReplicaRouter"]
+
+# Leaves out benchmarks unless run with --tag benchmark
+TEST_RUNNER = "messenger.tests.runner.MessengerTestRunner"
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -128,3 +176,138 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 
 STATIC_URL = '/static/'
+
+# Messenger
+
+# Default and maximal number of messages in a page of message lists
+MESSENGER_PAGE_SIZE = int(os.getenv("MESSENGER_PAGE_SIZE", 50))
+MESSENGER_MAX_PAGE_SIZE = int(os.getenv("MESSENGER_MAX_PAGE_SIZE", 500))
+# Maximal number of persons resolved by POST /api/users/batch/
+MESSENGER_PERSON_BATCH_SIZE = int(os.getenv("MESSENGER_PERSON_BATCH_SIZE", 100))
+# Number of rows fetched from server-side cursor at once while streaming message history
+MESSENGER_EXPORT_CHUNK_SIZE = int(os.getenv("MESSENGER_EXPORT_CHUNK_SIZE", 2000))
+# Seconds for which tombstones of deleted messages are kept, older sync tokens require full resync
+MESSENGER_SYNC_TOMBSTONE_RETENTION = int(os.getenv("MESSENGER_SYNC_TOMBSTONE_RETENTION", 30 * 24 * 60 * 60))
+# Seconds by which sync lags behind the present, so transactions in flight are not skipped
+MESSENGER_SYNC_LAG = float(os.getenv("MESSENGER_SYNC_LAG", 1))
+
+# Number of messages inserted by a single query and maximal number of messages in a bulk send request
+MESSENGER_BULK_BATCH_SIZE = int(os.getenv("MESSENGER_BULK_BATCH_SIZE", 1000))
+MESSENGER_BULK_MAX_MESSAGES = int(os.getenv("MESSENGER_BULK_MAX_MESSAGES", 10000))
+# Maximal number of members of a group
+MESSENGER_GROUP_MAX_MEMBERS = int(os.getenv("MESSENGER_GROUP_MAX_MEMBERS", 1000))
+
+# Write-behind ingestion of messages created by POST /api/messages/ and /api/async/messages/. When ENABLED,
+# messages are queued and inserted by a background thread in batches of up to BATCH_SIZE, collected for at most
+# MAX_DELAY_MS milliseconds. Requests still wait for the commit, they are rejected by 429 when QUEUE_SIZE messages
+# are waiting.
+MESSENGER_INGEST = {
+    "ENABLED": bool(os.getenv("MESSENGER_INGEST_ENABLED")),
+    "QUEUE_SIZE": int(os.getenv("MESSENGER_INGEST_QUEUE_SIZE", 10000)),
+    "BATCH_SIZE": int(os.getenv("MESSENGER_INGEST_BATCH_SIZE", 500)),
+    "MAX_DELAY_MS": float(os.getenv("MESSENGER_INGEST_MAX_DELAY_MS", 5)),
+    # Seconds a request waits for its message to be written before it is answered by 503
+    "TIMEOUT": float(os.getenv("MESSENGER_INGEST_TIMEOUT", 5)),
+}
+
+# Monthly partitions of messages on PostgreSQL, see `manage.py partition_messages`.
+# Partitions are created PREMAKE_MONTHS ahead, ones older than RETENTION_MONTHS are detached
+# and kept as archive tables if ARCHIVE is set, otherwise dropped. Nothing expires if RETENTION_MONTHS is empty.
+MESSENGER_PARTITIONS = {
+    "PREMAKE_MONTHS": int(os.getenv("MESSENGER_PARTITIONS_PREMAKE_MONTHS", 3)),
+    "RETENTION_MONTHS": int(os.getenv("MESSENGER_PARTITIONS_RETENTION_MONTHS")) if os.getenv(
+        "MESSENGER_PARTITIONS_RETENTION_MONTHS") else None,
+    "ARCHIVE": not os.getenv("MESSENGER_PARTITIONS_DROP_EXPIRED"),
+}
+
+# Number of threads doing database work of async views under /api/async/,
+# which is also the maximal number of database connections they hold per process
+MESSENGER_ASYNC_DB_THREADS = int(os.getenv("MESSENGER_ASYNC_DB_THREADS", 10))
+
+# Request metrics served at /api/metrics/ in Prometheus format.
+# SERVER_TIMING adds timings of a request to its Server-Timing header,
+# queries longer than SLOW_QUERY_MS milliseconds are logged by "messenger.slow_queries" logger.
+MESSENGER_METRICS = {
+    "ENABLED": not os.getenv("MESSENGER_METRICS_DISABLED"),
+    "SERVER_TIMING": not os.getenv("MESSENGER_SERVER_TIMING_DISABLED"),
+    "SLOW_QUERY_MS": float(os.getenv("MESSENGER_SLOW_QUERY_MS")) if os.getenv("MESSENGER_SLOW_QUERY_MS") else None,
+}
+
+# Broker delivering message events to receivers connected to /api/events/.
+# Use "messenger.utils.broker.PostgresBroker" when several workers are running.
+MESSENGER_BROKER = {
+    "BACKEND": os.getenv("MESSENGER_BROKER_BACKEND", "messenger.utils.broker.InMemoryBroker"),
+    "OPTIONS": {},
+}
+# Seconds between keepalive comments sent to idle event streams
+MESSENGER_EVENTS_KEEPALIVE = float(os.getenv("MESSENGER_EVENTS_KEEPALIVE", 15))
+
+# Reads of read-only endpoints go to a random replica lagging at most MAX_LAG seconds, lag is checked
+# every CHECK_INTERVAL seconds. A person who wrote reads from the primary for STICKINESS seconds,
+# keep it above MAX_LAG so the write is on replicas once it expires.
+MESSENGER_REPLICAS = {
+    "ALIASES": [alias for alias in DATABASES if alias.startswith("replica")],
+    "MAX_LAG": float(os.getenv("MESSENGER_REPLICA_MAX_LAG", 2)),
+    "CHECK_INTERVAL": float(os.getenv("MESSENGER_REPLICA_CHECK_INTERVAL", 1)),
+    "STICKINESS": float(os.getenv("MESSENGER_REPLICA_STICKINESS", 10)),
+}
+
+# Messages are sharded by person when shards are configured, the default database is the first shard
+# and keeps the shard map. Persons are hashed into VIRTUAL_SHARDS buckets, never change it once there are
+# messages. A message is kept by the shards of its receiver and its sender, so a person reads from one shard.
+# The map is reloaded every REFRESH seconds, rebalance_shards waits that long after freezing.
+MESSENGER_SHARDS = {
+    "ALIASES": ["default", *(alias for alias in DATABASES if alias.startswith("shard"))]
+    if any(alias.startswith("shard") for alias in DATABASES) else [],
+    "VIRTUAL_SHARDS": int(os.getenv("MESSENGER_VIRTUAL_SHARDS", 1024)),
+    "REFRESH": float(os.getenv("MESSENGER_SHARD_REFRESH", 5)),
+}
+
+# Tests of sharding need a second database, ./manage.py test creates one next to the test database.
+# Sharding stays off for the rest of the suite since MESSENGER_SHARDS is taken before it's added.
+if sys.argv[1:2] == ["test"] and "shard1" not in DATABASES:
+    DATABASES["shard1"] = {**DATABASES["default"], "TEST": {"NAME": "test_messenger_shard1"}}
+
+# Cache shared by workers, memcached at MESSENGER_CACHE_LOCATION given as "host:port".
+# Without it every process keeps its own cache.
+CACHE_LOCATION = os.getenv("MESSENGER_CACHE_LOCATION")
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+        "LOCATION": CACHE_LOCATION,
+    } if CACHE_LOCATION else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+}
+
+# Caches of lookups done on every request.
+# "messenger.utils.cache.DjangoLookupCache" with {"alias": ..., "ttl": ...} shares entries between workers
+# through CACHES, keys are prefixed by the name of the lookup cache. It is the default once the shared cache
+# is configured, otherwise every process keeps entries by "messenger.utils.cache.LocalLookupCache".
+LOOKUP_CACHE_BACKEND = "messenger.utils.cache.DjangoLookupCache" if CACHE_LOCATION \
+    else "messenger.utils.cache.LocalLookupCache"
+MESSENGER_CACHES = {
+    "persons": {
+        "BACKEND": os.getenv("MESSENGER_PERSON_CACHE_BACKEND", LOOKUP_CACHE_BACKEND),
+        "OPTIONS": {
+            "max_size": int(os.getenv("MESSENGER_PERSON_CACHE_SIZE", 100000)),
+            "ttl": int(os.getenv("MESSENGER_PERSON_CACHE_TTL", 300)),
+        },
+    },
+    # Persons pinned to the primary after a write, must be shared when there are replicas
+    "primary_pins": {
+        "BACKEND": os.getenv("MESSENGER_PINS_CACHE_BACKEND", LOOKUP_CACHE_BACKEND),
+        "OPTIONS": {
+            "max_size": int(os.getenv("MESSENGER_PINS_CACHE_SIZE", 100000)),
+            "ttl": MESSENGER_REPLICAS["STICKINESS"],
+        },
+    },
+    # Memberships of persons in groups, ttl bounds how long a removed member keeps access in other workers
+    "group_members": {
+        "BACKEND": os.getenv("MESSENGER_GROUP_CACHE_BACKEND", LOOKUP_CACHE_BACKEND),
+        "OPTIONS": {
+            "max_size": int(os.getenv("MESSENGER_GROUP_CACHE_SIZE", 100000)),
+            "ttl": int(os.getenv("MESSENGER_GROUP_CACHE_TTL", 60)),
+        },
+    },
+}